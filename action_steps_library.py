@@ -0,0 +1,203 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import combinations, product
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos, solo la fusión antes de reemplazar
+    fcntl = None
+
+from text_utils import fold_text
+
+DEFAULT_LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "action_steps_library.json")
+
+# Clave del perfil sin parámetros fuera de rango
+HEALTHY_PROFILE_KEY = "saludable"
+DIRECTIONS = ('alto', 'bajo')
+
+HEALTHY_STEPS_INSTRUCTIONS = """Eres un asistente médico virtual. El usuario tiene resultados de laboratorio SALUDABLES.
+
+Genera exactamente 4 pasos BREVES para mantener su buena salud.
+
+Requisitos CRÍTICOS:
+- Máximo 8-10 palabras por paso
+- Lenguaje directo y accionable
+- Sin explicaciones adicionales
+- Formato: lista con guiones (-, -, -, -)
+
+Responde SOLO con los 4 pasos breves."""
+
+UNHEALTHY_STEPS_INSTRUCTIONS = """Eres un asistente médico virtual. El usuario tiene problemas detectados en sus exámenes.
+
+Genera exactamente 4 pasos BREVES para mejorar estos valores específicos.
+
+Requisitos CRÍTICOS:
+- Máximo 8-10 palabras por paso
+- Lenguaje directo y accionable
+- Enfocados en los problemas detectados
+- Formato: lista con guiones (-, -, -, -)
+- Último paso debe ser consulta médica
+
+Responde SOLO con los 4 pasos breves."""
+
+
+def issue_parameter(issue):
+    """Nombre del parámetro en un issue con formato 'X fuera de rango: valor'"""
+    return issue.split(" fuera de rango")[0].strip()
+
+
+def profile_key(profile):
+    """Clave estable de un perfil: 'Glicemia Basal:alto|Hemoglobina:bajo'"""
+    if not profile:
+        return HEALTHY_PROFILE_KEY
+    return "|".join(f"{name}:{direction}" for name, direction in profile)
+
+
+def describe_profile(profile, ranges):
+    """Texto del perfil para el prompt del job batch (sin valores individuales)"""
+    lines = []
+    for name, direction in profile:
+        if name in ranges:
+            low, high = ranges[name]
+            lines.append(f"- {name}: {direction} (rango saludable {low}-{high})")
+        else:
+            lines.append(f"- {name}: fuera de rango")
+    return "\n".join(lines)
+
+
+def enumerate_profiles(parameters, max_params=2):
+    """Perfiles a precalcular: saludable y todas las combinaciones de hasta `max_params` parámetros"""
+    yield ()
+    for size in range(1, max_params + 1):
+        for names in combinations(sorted(parameters), size):
+            for directions in product(DIRECTIONS, repeat=size):
+                yield tuple(zip(names, directions))
+
+
+class ActionStepsLibrary:
+    """
+    Pasos a seguir precalculados por perfil de parámetros fuera de rango.
+
+    El perfil es la lista ordenada de (parámetro canónico, dirección), así que
+    la búsqueda es un acceso a dict. Los perfiles nuevos generados con Bedrock
+    se agregan y se persisten para los siguientes usuarios: cada escritura
+    toma un bloqueo de archivo (`<path>.lock`), vuelve a leer el JSON, suma los
+    perfiles que otros procesos agregaron y lo reemplaza desde un temporal
+    propio.
+    """
+
+    def __init__(self, ranges, path=DEFAULT_LIBRARY_PATH, resolve_name=None):
+        self.ranges = ranges
+        self.path = path
+        self.resolve_name = resolve_name
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def _read(self):
+        """Perfiles guardados en disco; un archivo ausente o corrupto cuenta como vacío"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def load(self):
+        entries = self._read()
+        with self._lock:
+            self._entries = entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _canonical(self, name):
+        if name in self.ranges:
+            return name
+        if self.resolve_name is not None:
+            canonical = self.resolve_name(name)
+            if canonical:
+                return canonical
+        return fold_text(name)
+
+    def profile(self, results, issues):
+        """Perfil normalizado a partir de los resultados y los issues detectados"""
+        entries = set()
+        for issue in issues:
+            raw_name = issue_parameter(issue)
+            name = self._canonical(raw_name)
+            value = results.get(raw_name, results.get(name))
+            direction = 'fuera'
+            if name in self.ranges and isinstance(value, (int, float)):
+                low, high = self.ranges[name]
+                if value < low:
+                    direction = 'bajo'
+                elif value > high:
+                    direction = 'alto'
+            entries.add((name, direction))
+        return tuple(sorted(entries))
+
+    def lookup(self, profile):
+        """Pasos del perfil o None si aún no está en la biblioteca"""
+        key = profile_key(profile)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry['steps']
+
+    def add(self, profile, steps, source='online'):
+        """Agrega un perfil nuevo y persiste la biblioteca"""
+        key = profile_key(profile)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = {'steps': steps, 'source': source, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            if self.path:
+                self.save()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        """Fusiona con lo que hay en disco y reemplaza el JSON de forma atómica (add la llama con el lock tomado)"""
+        with self._file_lock():
+            for key, entry in self._read().items():
+                self._entries.setdefault(key, entry)
+            self._write()
+
+    def _write(self):
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{os.path.basename(self.path)}.", suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.path))
+        )
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def snapshot(self):
+        with self._lock:
+            return {'profiles': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+PRIORITY_HIGH = 'high'
+PRIORITY_NORMAL = 'normal'
+
+# Por número: ráfaga corta permitida, luego ~1 mensaje cada 5 s
+DEFAULT_SENDER_RATE_PER_MINUTE = 12
+DEFAULT_SENDER_BURST = 6
+# Por empresa: todos sus empleados juntos
+DEFAULT_COMPANY_RATE_PER_MINUTE = 300
+DEFAULT_COMPANY_BURST = 60
+# Turnos simultáneos; los últimos cupos quedan reservados para turnos prioritarios
+DEFAULT_MAX_CONCURRENT_TURNS = 32
+DEFAULT_RESERVED_PRIORITY_TURNS = 8
+
+
+class TokenBucket:
+    """Token bucket: `burst` fichas como máximo, repuestas a `rate_per_second`"""
+
+    __slots__ = ('rate_per_second', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class KeyedRateLimiter:
+    """
+    Un token bucket por clave (número de teléfono, empresa). Los buckets se
+    guardan en un LRU acotado: uno olvidado equivale a uno lleno, así que
+    descartar claves inactivas no cambia el resultado.
+    """
+
+    def __init__(self, rate_per_minute, burst, max_keys=10000):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._stats = {'allowed': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate_per_second, self.burst)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            allowed = bucket.try_acquire()
+            self._stats['allowed' if allowed else 'throttled'] += 1
+            return allowed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats, tracked_keys=len(self._buckets))
+
+
+class LoadShedder:
+    """
+    Limita los turnos simultáneos. Con `max_in_flight - reserved` turnos en
+    curso solo se admiten turnos prioritarios (autenticación, agendamiento);
+    con `max_in_flight` se rechaza todo.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_CONCURRENT_TURNS, reserved=DEFAULT_RESERVED_PRIORITY_TURNS):
+        self.max_in_flight = max_in_flight
+        self.reserved = reserved
+        self._in_flight = 0
+        self._stats = {PRIORITY_HIGH: {'admitted': 0, 'shed': 0}, PRIORITY_NORMAL: {'admitted': 0, 'shed': 0}}
+        self._lock = threading.Lock()
+
+    def try_admit(self, priority):
+        """True si el turno puede procesarse; debe cerrarse con `release()`"""
+        limit = self.max_in_flight if priority == PRIORITY_HIGH else self.max_in_flight - self.reserved
+        with self._lock:
+            if self._in_flight >= limit:
+                self._stats[priority]['shed'] += 1
+                return False
+            self._in_flight += 1
+            self._stats[priority]['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'in_flight': self._in_flight, 'max_in_flight': self.max_in_flight,
+                    **{priority: dict(stats) for priority, stats in self._stats.items()}}
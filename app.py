@@ -1,17 +1,42 @@
-import os
-import json
-import re
+import uuid
 import boto3
+from botocore.config import Config
 import streamlit as st
-from datetime import datetime, timedelta
 import requests
+from medical_ranges import RANGES, PARAMETER_ALIASES
+from parameter_normalizer import ParameterNormalizer
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET
+from circuit_breaker import DEFAULT_FAILURE_THRESHOLD, DEFAULT_RECOVERY_SECONDS, CircuitBreaker
+from bedrock_gateway import BedrockGateway
+from model_router import ModelRouter, build_routes
+from action_steps_library import DEFAULT_LIBRARY_PATH, ActionStepsLibrary
+from progressive_reply import DEFAULT_STEPS_DEADLINE_SECONDS, TwoPhaseReply
+from response_cache import DEFAULT_FALLBACK_TTL_SECONDS, ConditionalResponseCache
+from turn_deadline import DEFAULT_TURN_BUDGET_SECONDS
+from appointment_outbox import DEFAULT_CONFIRM_WAIT_SECONDS, DEFAULT_OUTBOX_PATH, AppointmentOutbox
+from slot_index import parse_slot_datetime, SlotAvailabilityIndex
+from business_calendar import BusinessCalendar
+from pdf_precheck import DEFAULT_MAX_PAGES, DEFAULT_MAX_PDF_BYTES, PdfPrecheck
+from local_exam_parser import DEFAULT_MIN_CONFIDENCE, LocalExamParser
+from gomind_api import GoMindApiClient
+from conversation_engine import SHARED_INSTRUCTIONS, ConversationEngine, ConversationSession
+
+# ============================================
+# ADAPTADOR STREAMLIT DEL MOTOR DE CONVERSACIÓN
+# ============================================
+# La lógica conversacional vive en conversation_engine.py; aquí solo se
+# configura desde st.secrets y se dibuja el chat. El motor es uno por proceso
+# (st.cache_resource) y lo comparten todas las sesiones del navegador; cada
+# una guarda su ConversationSession en st.session_state.
 
 # Configurar cliente de Bedrock usando st.secrets
 bedrock_client = boto3.client(
     service_name='bedrock-runtime',
     region_name=st.secrets["aws"]["REGION"],
     aws_access_key_id=st.secrets["aws"]["ACCESS_KEY_ID"],
-    aws_secret_access_key=st.secrets["aws"]["SECRET_ACCESS_KEY"]
+    aws_secret_access_key=st.secrets["aws"]["SECRET_ACCESS_KEY"],
+    # Acota las llamadas que siguen en curso después de vencido el plazo del turno
+    config=Config(connect_timeout=5, read_timeout=30, retries={'max_attempts': 2})
 )
 
 # Configurar API GoMind usando st.secrets
@@ -20,1239 +45,102 @@ API_EMAIL = st.secrets["api"]["EMAIL"]
 API_PASSWORD = st.secrets["api"]["PASSWORD"]
 
 # Constantes centralizadas
-SPANISH_WEEKDAYS = ['Lunes', 'Martes', 'Miercoles', 'Jueves', 'Viernes']
-SPANISH_WEEKDAYS_SHORT = ['Lun', 'Mar', 'Mie', 'Jue', 'Vie']
-SPANISH_MONTHS = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 
-                  'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
-API_TIMEOUT = 30
 BEDROCK_MODEL_ID = "us.anthropic.claude-sonnet-4-5-20250929-v1:0"
-BEDROCK_MAX_TOKENS = 1000
-
-# Función de análisis de intención con Bedrock
-def analyze_user_intent(user_message, context_stage):
-    """
-    Analiza la intención del usuario usando Bedrock en lugar de keywords.
-    
-    Args:
-        user_message: El mensaje del usuario
-        context_stage: El contexto/etapa actual de la conversación
-    
-    Returns:
-        str: 'POSITIVA', 'NEGATIVA', 'AMBIGUA', o tipo específico como 'PRODUCTOS'
-    """
-    try:
-        # Definir el contexto según la etapa
-        context_descriptions = {
-            'analyzing': 'Se le preguntó al usuario si quiere agendar una cita médica',
-            'confirming': 'Se le está pidiendo confirmación final para agendar una cita',
-            'completed': 'La conversación terminó y el usuario podría querer una nueva cita',
-            'showing_products': 'Se pueden mostrar productos de salud disponibles',
-            'waiting_code': 'Se le pidió al usuario un código de verificación enviado a su correo. Determina si el usuario está pidiendo que se le reenvíe el código porque no le llegó',
-            'general': 'Conversación general, detectar cualquier intención'
-        }
-        
-        context_desc = context_descriptions.get(context_stage, 'Conversación general')
-        
-        prompt = f"""Analiza la siguiente respuesta del usuario y determina su intención exacta.
-
-Contexto: {context_desc}
-Mensaje del usuario: "{user_message}"
-
-Analiza si la intención es:
-- POSITIVA: Quiere proceder, acepta, está de acuerdo (incluye respuestas como "podría ser", "tal vez", "me parece bien")
-- NEGATIVA: No quiere proceder, rechaza claramente
-- AMBIGUA: No está claro, necesita clarificación
-- PRODUCTOS: Quiere ver productos o servicios disponibles
-- NUEVA_CITA: Quiere agendar una nueva cita adicional
-
-Responde ÚNICAMENTE con una de estas palabras: POSITIVA, NEGATIVA, AMBIGUA, PRODUCTOS, o NUEVA_CITA"""
-
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 10,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
-        
-        response_body = json.loads(response['body'].read())
-        intent = response_body['content'][0]['text'].strip().upper()
-        
-        # Validar respuesta
-        valid_intents = ['POSITIVA', 'NEGATIVA', 'AMBIGUA', 'PRODUCTOS', 'NUEVA_CITA']
-        if intent in valid_intents:
-            return intent
-        else:
-            return 'AMBIGUA'  # Fallback si la respuesta no es válida
-            
-    except Exception as e:
-        # Fallback simple en caso de error con Bedrock
-        user_lower = user_message.lower()
-        if any(word in user_lower for word in ['no', 'nunca', 'jamás']):
-            return 'NEGATIVA'
-        elif any(word in user_lower for word in ['si', 'sí', 'yes', 'ok', 'claro']):
-            return 'POSITIVA'
-        else:
-            return 'AMBIGUA'
-
-MESSAGES = {
-    'healthy_results_intro': "¡Excelente noticia, tus valores están todos dentro del rango saludable:\n\n{results}\n\nEstos resultados indican que estás llevando un estilo de vida saludable. ¡Felicitaciones! Sigue así con tus buenos hábitos de alimentación y ejercicio.",
-    'unhealthy_results_intro': "He revisado tus valores y me gustaría comentarte lo que veo:\n\n{issues}\n\nAunque no están muy elevados, sería recomendable que un médico los revise más a fondo.",
-    'disclaimer': "\n\nLos resultados obtenidos mediante IA se basan exclusivamente en los indicadores analizados y deben entenderse como una referencia de apoyo.\nLa interpretación final y la toma de decisiones corresponden siempre al criterio profesional de los colaboradores.",
-    'appointment_question': "¿Te gustaría que te ayude a agendar una cita para que puedas discutir estos resultados con un profesional?",
-    'appointment_success': "¡Excelente! Tu cita quedó confirmada para el {day} a las {time} en {clinic}.\n\nLa cita ha sido registrada correctamente en nuestro sistema. Te enviaremos un recordatorio antes de la hora programada.\n\n",
-    'appointment_error': "Lo siento, hubo un problema al agendar tu cita (Error {status}). Por favor, intenta nuevamente en unos minutos o contacta a nuestro soporte técnico.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
-    'connection_error': "Lo siento, hubo un problema de conexión al procesar tu cita. Por favor, verifica tu conexión a internet e intenta nuevamente, o contacta a nuestro soporte técnico.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
-    'clinic_unavailable': "Lo siento, no hay clínicas disponibles en este momento. ¿Te gustaría intentarlo más tarde o tienes alguna otra consulta?",
-    'clinic_error': "Error obteniendo clínicas disponibles: {error}. ¿Te gustaría intentarlo más tarde?",
-    'clinic_not_recognized': "No reconocí esa clínica. ¿Puedes elegir una de las opciones disponibles?",
-    'day_not_recognized': "No reconocí ese día. ¿Puedes elegir uno de los disponibles usando el número (1, 2, 3) o el nombre del día?",
-    'time_unavailable': "Esa opción no está disponible. Por favor, elige un número de las opciones mostradas.",
-    'time_format_error': "Por favor, responde con el número de la opción que prefieres (ejemplo: 1, 2, 3).",
-    'appointment_declined': "Entiendo, no confirmo la cita. ¿Te gustaría reagendar para otro día u horario, o hay algo más en lo que pueda ayudarte?",
-    'appointment_general_declined': "Entiendo. Si cambias de opinión y quieres agendar una cita más tarde, solo dímelo. ¿Hay algo más en lo que pueda ayudarte?",
-    'new_appointment_offer': "¡Perfecto! Te ayudo a agendar una nueva cita. ¿Esta cita es para revisar nuevos resultados médicos o es una consulta de seguimiento?",
-    'new_appointment_start': "Excelente, iniciemos el proceso para tu nueva cita. Tenemos estas clínicas disponibles:",
-    'new_appointment_medical_request': "Entiendo que necesitas una nueva cita. Para brindarte el mejor servicio, ¿podrías compartirme el ID de usuario para revisar tus resultados médicos más recientes? Esto me ayudará a determinar si necesitas una cita médica.",
-    'login_success_menu': "¡Bienvenido/a, {user_name}!\n\n¿Cómo te ayudamos hoy?\n\n- Agendar mi cita\n- Revisa mi examen\n\nEscribe la opción que prefieras.",
-    'products_menu': "Gracias, voy a proceder a ayudarte con tu agendamiento, por favor selecciona alguno de los productos disponibles\n\n{products_list}\n¿Cuál producto te interesa? Escribe el nombre del producto.",
-    'product_selected': "Perfecto ✅ Para agendar tu **{product_name}**, contamos con los siguientes centros médicos:",
-    'invalid_menu_option': "No entendí tu selección. Por favor, escribe:\n- 'Agendar mi cita' para agendar una cita\n- 'Revisa mi examen' para análisis médico",
-    'invalid_product_option': "No reconocí ese producto. Por favor, escribe el nombre de uno de los productos disponibles.",
-    'verification_code_sent': "🔒 Para confirmar tu identidad, te envié un código de verificación a tu correo.\nEscríbelo aquí para continuar",
-    'code_authentication_success': "🎉 ¡Perfecto! Ya verifiqué tu identidad.",
-    'invalid_code': "No pudimos validar el código ingresado. Por favor, revisa el código e inténtalo nuevamente.",
-    'code_error': "No pudimos validar el código ingresado. Por favor, revisa el código e inténtalo nuevamente."
-}
-
-
-def send_verification_code(email):
-    """Envía código de verificación al correo del usuario"""
-    url = f"{API_BASE_URL}/api/auth/login/user-exist"
-    payload = {"email": email}
-    response = requests.post(url, json=payload, timeout=30)
-    
-    if response.status_code == 200:
-        data = response.json()
-        
-        # Validar si el usuario existe
-        user_exists = data.get('user_exist', True)  # Default True para compatibilidad
-        message = data.get('message', '')
-        
-        if not user_exists:
-            # Usuario no existe - lanzar excepción con el mensaje del API
-            raise Exception(message if message else "Usuario no encontrado")
-        
-        # Usuario existe - código enviado exitosamente
-        return True
-    else:
-        raise Exception(f"Error enviando código: {response.text}")
-
-def authenticate_with_code(email, auth_code):
-    """Autentica con código de verificación para obtener token completo"""
-    url = f"{API_BASE_URL}/api/auth/login/wsp"
-    payload = {"email": email, "auth_code": int(auth_code)}
-    
-    response = requests.post(url, json=payload, timeout=30)
-    
-    if response.status_code == 200:
-        data = response.json()
-        
-        # VALIDAR EL CAMPO SUCCESS
-        if not data.get('success', True):  # Si success existe y es false
-            raise Exception(f"Código inválido: {data.get('message', 'Código de verificación incorrecto')}")
-        
-        token = data.get('token')
-        company_id = data.get('company', {}).get('company_id')
-        user_data = data.get('user', {})
-        
-        # VALIDAR QUE TENGAMOS DATOS NECESARIOS
-        if not token or not company_id or not user_data:
-            raise Exception("Error en autenticación: datos incompletos del servidor")
-        
-        return {'token': token, 'company_id': company_id, 'user_data': user_data}
-    else:
-        raise Exception(f"Error autenticando con código: {response.text}")
-
-def extract_parameter(analysis_results):
-    if "VALOR " in analysis_results:
-        start = analysis_results.find("VALOR ") + 6
-        end = analysis_results.find(".", start)
-        if end == -1:
-            end = len(analysis_results)
-        param = analysis_results[start:end].strip()
-        corrections = {
-            "Glisea Basal": "Glicemia Basal",
-            "Recuendo de Eritrocitos": "Recuento de Eritrocitos"
-        }
-        return corrections.get(param, param)
-    elif "Recomendacion" in analysis_results or "recomendacion" in analysis_results:
-        start = analysis_results.find("Recomendacion") + 13 if "Recomendacion" in analysis_results else analysis_results.find("recomendacion") + 13
-        param = analysis_results[start:].strip()
-        return param
-    else:
-        return "Desconocido"
-
-def get_company_products(company_id):
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/companies/{company_id}/products"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        return data.get('products', [])
-    else:
-        raise Exception(f"Error obteniendo productos: {response.status_code} - {response.text}")
-
-def get_health_providers(company_id):
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/companies/{company_id}/health-providers"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        return data.get('healthProviders', [])
-    else:
-        raise Exception(f"Error obteniendo proveedores de salud: {response.status_code} - {response.text}")
-
-# Tabla de mapeo: nombre de clínica → health_provider_id
-CLINIC_MAPPING = {
-    "Inmunomedica Concepción": 1,
-    "Laboratorio Blanco Santiago": 3,
-    "Red Salud Santiago Centro": 4
-}
-
-# Mapeo de nombres largos a nombres cortos para mostrar al usuario
-CLINIC_DISPLAY_NAMES = {
-    "Inmunomedica Concepción": "Inmunomedica Concepción",
-    "Laboratorio Blanco Santiago": "Lab. Blanco Stgo",
-    "Red Salud Santiago Centro": "Red Salud Stgo Centro",
-    "Go Mind": "Go Mind"
+PROMPT_TOKEN_BUDGET = int(st.secrets.get("bedrock", {}).get("PROMPT_TOKEN_BUDGET", DEFAULT_PROMPT_TOKEN_BUDGET))
+BEDROCK_PROMPT_CACHE = bool(st.secrets.get("bedrock", {}).get("PROMPT_CACHE", True))
+# Modelos por tarea: [bedrock] MODELS_<TAREA> = ["modelo", "respaldo"] y LATENCY_BUDGET_MS_<TAREA>
+BEDROCK_ROUTES = build_routes(lambda key, default: st.secrets.get("bedrock", {}).get(key, default))
+# Resultados en dos fases: hallazgos de inmediato y pasos a seguir cuando estén listos
+PROGRESSIVE_EXAM_REPLY = bool(st.secrets.get("bedrock", {}).get("PROGRESSIVE_EXAM_REPLY", True))
+ACTION_STEPS_DEADLINE_SECONDS = float(st.secrets.get("bedrock", {}).get("ACTION_STEPS_DEADLINE_SECONDS", DEFAULT_STEPS_DEADLINE_SECONDS))
+ACTION_STEPS_LIBRARY_PATH = st.secrets.get("bedrock", {}).get("ACTION_STEPS_LIBRARY_PATH", DEFAULT_LIBRARY_PATH)
+RESULTS_CACHE_TTL_SECONDS = int(st.secrets.get("api", {}).get("RESULTS_CACHE_TTL_SECONDS", DEFAULT_FALLBACK_TTL_SECONDS))
+# Circuit breakers: fallos consecutivos para abrir y segundos hasta la llamada de prueba
+API_BREAKER_FAILURE_THRESHOLD = int(st.secrets.get("api", {}).get("BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+API_BREAKER_RECOVERY_SECONDS = float(st.secrets.get("api", {}).get("BREAKER_RECOVERY_SECONDS", DEFAULT_RECOVERY_SECONDS))
+BEDROCK_BREAKER_FAILURE_THRESHOLD = int(st.secrets.get("bedrock", {}).get("BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+BEDROCK_BREAKER_RECOVERY_SECONDS = float(st.secrets.get("bedrock", {}).get("BREAKER_RECOVERY_SECONDS", DEFAULT_RECOVERY_SECONDS))
+# Presupuesto total por turno: cada llamada a la API o Bedrock usa como timeout lo que queda
+TURN_BUDGET_SECONDS = float(st.secrets.get("api", {}).get("TURN_BUDGET_SECONDS", DEFAULT_TURN_BUDGET_SECONDS))
+# Citas: outbox SQLite y cuánto espera el turno la confirmación antes de responder "en proceso"
+APPOINTMENT_OUTBOX_PATH = st.secrets.get("api", {}).get("APPOINTMENT_OUTBOX_PATH", DEFAULT_OUTBOX_PATH)
+APPOINTMENT_CONFIRM_WAIT_SECONDS = float(st.secrets.get("api", {}).get("APPOINTMENT_CONFIRM_WAIT_SECONDS", DEFAULT_CONFIRM_WAIT_SECONDS))
+# Feriados regionales que se suman a los nacionales (ej. ["arica", "nuble"])
+CALENDAR_REGIONS = list(st.secrets.get("calendar", {}).get("REGIONS", []))
+# Límites del chequeo local de exámenes PDF
+PDF_MAX_BYTES = int(float(st.secrets.get("api", {}).get("PDF_MAX_MB", DEFAULT_MAX_PDF_BYTES / (1024 * 1024))) * 1024 * 1024)
+PDF_MAX_PAGES = int(st.secrets.get("api", {}).get("PDF_MAX_PAGES", DEFAULT_MAX_PAGES))
+# Lectura local de exámenes Lab. Blanco con capa de texto; con confianza baja se usa la API
+LOCAL_EXAM_PARSER_ENABLED = str(st.secrets.get("api", {}).get("LOCAL_EXAM_PARSER", "true")).lower() == "true"
+LOCAL_EXAM_PARSER_MIN_CONFIDENCE = float(st.secrets.get("api", {}).get("LOCAL_EXAM_PARSER_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+
+# Textos que dependen del canal: aquí el PDF se sube con el botón de carga y
+# las citas pendientes se confirman en el mismo chat (no hay mensajes proactivos)
+STREAMLIT_MESSAGES = {
+    'file_upload_reminder': "Por favor, sube el archivo PDF de tu examen usando el botón de carga que aparece abajo.",
+    'appointment_queued': "Recibí tu solicitud de cita para el {day} a las {time} en {clinic} ✅\n\nNuestro sistema de agendamiento está respondiendo lento, así que la registraré apenas esté disponible y te mostraré aquí la confirmación.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
+    'exam_processing_error': "Lo siento, hubo un problema subiendo tu examen. Por favor, verifica que el archivo sea un PDF válido e intenta nuevamente.\n\n¿Te gustaría intentarlo nuevamente? Escribe 'Lab. Blanco' para subir otro archivo.",
 }
 
-def get_short_clinic_name(full_name):
-    """Convierte el nombre completo de la clínica a su versión corta para mostrar"""
-    return CLINIC_DISPLAY_NAMES.get(full_name, full_name)
-
-def convert_spanish_date_to_iso(date_str, time_str):
-    try:
-        parts = date_str.split()
-        
-        # Formato nuevo: "Mie 20/05/2026"
-        if len(parts) == 2 and '/' in parts[1]:
-            date_part = parts[1]  # "20/05/2026"
-            day, month, year = map(int, date_part.split('/'))
-            hour, minute = map(int, time_str.split(':'))
-            dt = datetime(year, month, day, hour, minute, 0)
-            return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-        
-        # Formato viejo: "Miercoles 25 de febrero" (retrocompatibilidad)
-        elif len(parts) >= 4 and parts[2] == 'de':
-            day = int(parts[1])
-            month_name = parts[3].lower()
-
-            months = {
-                'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
-                'julio': 7, 'agosto': 8, 'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
-            }
-
-            month = months.get(month_name)
-            if not month:
-                raise ValueError(f"Mes no reconocido: {month_name}")
-
-            current_year = datetime.now().year
-            hour, minute = map(int, time_str.split(':'))
-            dt = datetime(current_year, month, day, hour, minute, 0)
-
-            if dt < datetime.now():
-                dt = datetime(current_year + 1, month, day, hour, minute, 0)
-
-            iso_string = dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-            return iso_string
-        else:
-            raise ValueError(f"Formato de fecha no reconocido: {date_str}")
-
-    except Exception as e:
-        raise ValueError(f"Error convirtiendo fecha: {date_str} {time_str} - {str(e)}")
-
-def prepare_api_appointment_data():
-    clinic_name = st.session_state.selected_clinic
-    
-    # Buscar el health_provider_id en los datos del endpoint
-    health_provider_id = None
-    for clinic in st.session_state.clinics:
-        if clinic['name'] == clinic_name:
-            health_provider_id = clinic['health_provider_id']
-            break
-
-    if not health_provider_id:
-        raise ValueError(f"Clínica no encontrada en datos del endpoint: {clinic_name}")
-
-    # Verificar que user_data tenga el campo 'id'
-    if not hasattr(st.session_state, 'user_data') or not st.session_state.user_data:
-        raise ValueError("user_data no está disponible en session_state")
-    
-    if 'id' not in st.session_state.user_data:
-        raise ValueError(f"Campo 'id' no encontrado en user_data. Campos disponibles: {list(st.session_state.user_data.keys())}")
-
-    try:
-        date_time_iso = convert_spanish_date_to_iso(
-            st.session_state.selected_day,
-            st.session_state.selected_time
-        )
-    except Exception as e:
-        raise ValueError(f"Error procesando fecha y hora: {str(e)}")
-
-    return {
-        "user_id": st.session_state.user_data["id"],
-        "product_id": 2,
-        "health_provider_id": health_provider_id,
-        "date_time": date_time_iso
-    }
-
-def send_appointment_to_api(appointment_api_data):
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/appointments"
-    headers = {"Authorization": f"Bearer {token}"}
-
-    if not token:
-        raise ValueError("Token de autenticación no disponible")
-
-    response = requests.post(url, json=appointment_api_data, headers=headers, timeout=30)
-    return response
-
-def get_user_results(user_id):
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/parameters/results-user"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 401:
-        # Token expirado - limpiar sesión
-        st.session_state.auth_token = None
-        raise Exception("SESSION_EXPIRED")
-    elif response.status_code == 200:
-        data = response.json()
-        if isinstance(data, list):
-            if len(data) == 0:
-                raise Exception("Paciente no identificado o sin resultados disponibles.")
-            results = {}
-            for item in data:
-                param = extract_parameter(item['analysis_results'])
-                value = item['value']
-                results[param] = value
-            return results
-        else:
-            return data
-    else:
-        raise Exception(f"Error obteniendo resultados: {response.status_code} - {response.text}")
-
-# Users database removed - not used in current implementation
-
-# Funciones utilitarias
-
-def is_valid_email(email):
-    """Valida formato básico de email usando regex"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email)) and ' ' not in email
-
-def find_match(prompt, items, key_func=None):
-    """
-    Función consolidada para encontrar coincidencias en listas
-    
-    Args:
-        prompt: Texto del usuario
-        items: Lista de elementos para buscar
-        key_func: Función para extraer el texto a comparar (opcional)
-    """
-    prompt_lower = prompt.lower()
-    
-    for item in items:
-        # Determinar el texto a comparar
-        if key_func:
-            text_to_compare = key_func(item)
-        elif isinstance(item, dict) and 'name' in item:
-            text_to_compare = item['name']
-        else:
-            text_to_compare = str(item)
-        
-        # Buscar coincidencias por palabras
-        text_words = text_to_compare.lower().split()
-        if any(word in prompt_lower for word in text_words):
-            return item  # Devolver el objeto completo
-    
-    return None
-
-def has_user_data():
-    """Verifica si hay datos de usuario disponibles"""
-    return (hasattr(st.session_state, 'user_data') and 
-            st.session_state.user_data and 
-            st.session_state.user_data.get('id'))
-
-def is_authenticated():
-    """Verifica si el usuario está autenticado"""
-    return (hasattr(st.session_state, 'auth_token') and 
-            st.session_state.auth_token)
-
-def get_user_info():
-    """Obtiene información del usuario de manera segura"""
-    if has_user_data():
-        return {
-            'id': st.session_state.user_data.get('id'),
-            'name': st.session_state.user_data.get('name', 'Usuario')
-        }
-    return {'id': None, 'name': 'Usuario'}
-
-def format_spanish_date(date_obj):
-    """Formatea una fecha en español en formato corto: Mie 25/02/2026"""
-    day_name = SPANISH_WEEKDAYS_SHORT[date_obj.weekday()]
-    day_num = date_obj.day
-    month_num = date_obj.month
-    year = date_obj.year
-    return f"{day_name} {day_num:02d}/{month_num:02d}/{year}"
-
-def handle_appointment_error(error, error_type='general'):
-    if error_type == 'clinic_fetch':
-        return MESSAGES['clinic_error'].format(error=str(error)), 'completed'
-    elif error_type == 'api_connection':
-        return MESSAGES['connection_error'], 'completed'
-    elif error_type == 'api_error':
-        return MESSAGES['appointment_error'].format(status=getattr(error, 'status_code', 'Unknown')), 'completed'
-    else:
-        return f"Error inesperado: {str(error)}. ¿Te gustaría intentarlo más tarde?", 'completed'
-
-def validate_appointment_data():
-    required_fields = ['selected_clinic', 'selected_day', 'selected_time']
-    missing_fields = [field for field in required_fields if not hasattr(st.session_state, field) or not getattr(st.session_state, field)]
-    
-    if missing_fields:
-        raise ValueError(f"Faltan datos requeridos: {', '.join(missing_fields)}")
-    
-    if not hasattr(st.session_state, 'user_data') or not st.session_state.user_data.get('id'):
-        raise ValueError("ID de usuario no disponible")
-    
-    return True
-
-def generate_medical_response(results, issues, user_name="Usuario"):
-    if not issues:
-        # Resultados saludables
-        results_text = "\n".join([f"- {k}: {v}" for k, v in results.items()])
-        response = f"{user_name}! Gracias por compartir tus resultados conmigo. Me da gusto poder revisarlos contigo.\n\n"
-        response += MESSAGES['healthy_results_intro'].format(results=results_text)
-        
-        # Generar pasos a seguir con IA
-        action_steps = generate_action_steps_with_ai(results, issues, is_healthy=True)
-        response += action_steps
-        
-        # Agregar disclaimer
-        response += MESSAGES['disclaimer']
-        
-        return response, 'completed'
-    else:
-        # Resultados no saludables
-        issues_text = "\n".join([f"- {issue}" for issue in issues])
-        response = f"{user_name}! Gracias por compartir tus resultados conmigo. "
-        response += MESSAGES['unhealthy_results_intro'].format(issues=issues_text)
-        
-        # Generar pasos a seguir con IA
-        action_steps = generate_action_steps_with_ai(results, issues, is_healthy=False)
-        response += action_steps
-        
-        # Agregar disclaimer
-        response += MESSAGES['disclaimer']
-        
-        # Preguntar sobre cita
-        response += f"\n\n{MESSAGES['appointment_question']}"
-        
-        return response, 'analyzing'
-
-def process_medical_results(user_id, user_name="Usuario"):
-    try:
-        results = get_user_results(user_id)
-        st.session_state.user_data = {"id": user_id, "results": results}
-        
-        issues, needs_appointment = analyze_results(results)
-        
-        return generate_medical_response(results, issues, user_name)
-            
-    except Exception as e:
-        error_msg = str(e)
-        if "SESSION_EXPIRED" in error_msg:
-            st.session_state.auth_token = None
-            return "Tu sesión ha expirado. Por favor, ingresa tu correo electrónico nuevamente para continuar:", 'waiting_email'
-        elif "Paciente no identificado" in error_msg:
-            return f"Lo siento, no se logró identificar al paciente con el ID {user_id}. Verifica que el número sea correcto o contacta a soporte. ¿Hay algo más en lo que pueda ayudarte?", 'completed'
-        else:
-            return f"Error obteniendo resultados de la API: {error_msg}. ¿Puedes compartir tus resultados médicos en formato JSON? Ejemplo: {{\"Glicemia Basal\": 90, \"Hemoglobina\": 13}}", 'waiting_json'
-
-def get_relevant_products(issues):
-    if not st.session_state.company_products:
-        return []
-    
-    relevant_products = []
-    issues_text = " ".join(issues).lower()
-    
-    for product in st.session_state.company_products:
-        product_name = product.get('name', '').lower()
-        if ('colesterol' in issues_text and 'corazón' in product_name) or \
-           ('glucosa' in issues_text and 'diabetes' in product_name):
-            relevant_products.append(product)
-    
-    return relevant_products
-
-def handle_appointment_request():
-    try:
-        # Obtener clínicas directamente del endpoint
-        clinics = get_health_providers(st.session_state.company_id)
-        
-        if not clinics:
-            return MESSAGES['clinic_unavailable'], 'completed'
-            
-        st.session_state.clinics = clinics
-        
-        response = f"Contamos con los siguientes centros médicos:\n\n"
-        for i, clinic in enumerate(clinics):
-            short_name = get_short_clinic_name(clinic['name'])
-            response += f"{i+1}. {short_name} - $$Horario de atención de 9:00 a 18:00 hrs\n"
-        response += "\n¿En cuál clínica prefieres agendar tu cita?\nResponde con el número de tu opción."
-        return response, 'selecting_clinic'
-    except Exception as e:
-        return handle_appointment_error(e, 'clinic_fetch')
-
-def handle_clinic_selection(prompt):
-    clinics = st.session_state.clinics
-    selected_clinic = None
-    
-    try:
-        clinic_num = int(prompt.strip()) - 1
-        if 0 <= clinic_num < len(clinics):
-            selected_clinic = clinics[clinic_num]['name']
-    except ValueError:
-        matched_clinic = find_match(prompt, clinics)
-        if matched_clinic:
-            selected_clinic = matched_clinic['name'] if isinstance(matched_clinic, dict) else matched_clinic
-    
-    if not selected_clinic:
-        return MESSAGES['clinic_not_recognized'], 'selecting_clinic'
-        
-    st.session_state.selected_clinic = selected_clinic
-    next_days = get_next_business_days(3)
-    st.session_state.next_days = next_days
-    response = f"¡Excelente! Has seleccionado {selected_clinic}.\n\nAhora, tengo disponibilidad para agendar una cita en los próximos días hábiles:\n\n"
-    for i, day in enumerate(next_days):
-        response += f"{i+1}. {day}\n"
-    response += "\n¿Para qué día te gustaría agendar? (Selecciona el numero)"
-    return response, 'scheduling'
-
-def handle_day_selection(prompt):
-    next_days = st.session_state.next_days
-    selected_day = None
-    
-    try:
-        day_num = int(prompt.strip()) - 1
-        if 0 <= day_num < len(next_days):
-            selected_day = next_days[day_num]
-    except ValueError:
-        selected_day = find_match(prompt, next_days)
-    
-    if not selected_day:
-        return MESSAGES['day_not_recognized'], 'scheduling'
-        
-    # Crear lista de horarios sin números
-    hours = [f"{h}:00" for h in range(9, 19)]
-    hours_str = "\n".join(f"- {h}" for h in hours)
-    response = f"Genial, el {selected_day} tengo disponibilidad en los siguientes horarios:\n\n{hours_str}\n\n¿A qué hora te gustaría agendar? Escribe la hora que prefieras (ejemplo: 18:00 o 18)."
-    
-    # Guardar tanto el día como los horarios disponibles para referencia
-    st.session_state.selected_day = selected_day
-    st.session_state.available_hours = hours
-    return response, 'selecting_time'
-
-def handle_time_selection(prompt):
-    user_input = prompt.strip()
-    
-    # Obtener los horarios disponibles guardados
-    available_hours = getattr(st.session_state, 'available_hours', [f"{h}:00" for h in range(9, 19)])
-    selected_hour = None
-    
-    # Intentar primero como hora directa (18:00 o 18)
-    try:
-        if ":" in user_input:
-            hour, minute = user_input.split(":")
-            hour_num = int(hour)
-            formatted_hour = f"{hour_num}:00"
-        else:
-            hour_num = int(user_input)
-            formatted_hour = f"{hour_num}:00"
-        
-        # Validar que esté en el rango
-        if 9 <= hour_num <= 18:
-            selected_hour = formatted_hour
-    except ValueError:
-        pass
-    
-    # Si no funcionó, intentar como número de opción (retrocompatibilidad)
-    if not selected_hour:
-        try:
-            option_num = int(user_input)
-            if 1 <= option_num <= len(available_hours):
-                selected_hour = available_hours[option_num - 1]
-        except ValueError:
-            pass
-    
-    # Si encontró la hora
-    if selected_hour:
-        response = f"Perfecto, reservo para el {st.session_state.selected_day} a las {selected_hour}. ¿Confirmo tu cita?"
-        st.session_state.selected_time = selected_hour
-        return response, 'confirming'
-    else:
-        return "No reconocí esa hora. Por favor, escribe una hora entre 9:00 y 18:00 (ejemplo: 18:00 o 18).", 'selecting_time'
-
-def handle_appointment_confirmation():
-    try:
-        validate_appointment_data()
-
-        api_appointment_data = prepare_api_appointment_data()
-        api_response = send_appointment_to_api(api_appointment_data)
-
-        if api_response.status_code in [200, 201]:
-            return MESSAGES['appointment_success'].format(
-                day=st.session_state.selected_day,
-                time=st.session_state.selected_time,
-                clinic=st.session_state.selected_clinic
-            ), 'completed'
-        else:
-            return handle_appointment_error(api_response, 'api_error')
-
-    except requests.exceptions.RequestException:
-        return handle_appointment_error(None, 'api_connection')
-    except ValueError as e:
-        # Si faltan datos de cita, reiniciar el flujo de agendamiento
-        if "Faltan datos requeridos" in str(e):
-            return handle_appointment_request()
-        else:
-            return handle_appointment_error(e, 'general')
-    except Exception as e:
-        return handle_appointment_error(e, 'general')
-
-def get_next_business_days(n=3):
-    """
-    Obtiene los próximos días hábiles excluyendo fines de semana
-    """
-    days = []
-    current = datetime.now()
-
-    while len(days) < n:
-        current += timedelta(days=1)
-
-        # Verificar que sea día de semana (lunes a viernes)
-        if current.weekday() < 5:
-            days.append(format_spanish_date(current))
-
-    return days
-
-def get_holiday_info(date_obj):
-    """
-    Función placeholder para información de festivos (deshabilitada)
-    """
-    return False, None
-
-def get_conversation_context():
-    """
-    Genera un resumen del contexto conversacional actual
-    """
-    context_parts = []
-    
-    # Información del usuario
-    if has_user_data():
-        user_info = get_user_info()
-        context_parts.append(f"Usuario: {user_info['name']}")
-    
-    # Estado actual
-    current_stage = getattr(st.session_state, 'stage', 'inicio')
-    stage_descriptions = {
-        'main_menu': 'en menú principal',
-        'selecting_product': 'seleccionando producto',
-        'analyzing': 'revisando si quiere agendar cita',
-        'selecting_clinic': 'eligiendo clínica',
-        'scheduling': 'eligiendo día',
-        'selecting_time': 'eligiendo hora',
-        'confirming': 'confirmando cita',
-        'completed': 'proceso completado'
-    }
-    stage_desc = stage_descriptions.get(current_stage, current_stage)
-    context_parts.append(f"Estado: {stage_desc}")
-    
-    # Historial reciente (últimos 3 mensajes)
-    if hasattr(st.session_state, 'messages') and st.session_state.messages:
-        recent_messages = st.session_state.messages[-3:]
-        for msg in recent_messages:
-            role = "Usuario" if msg['role'] == 'user' else "Bianca"
-            content = msg['content'][:60] + "..." if len(msg['content']) > 60 else msg['content']
-            context_parts.append(f"{role}: {content}")
-    
-    return " | ".join(context_parts)
-
-def analyze_resend_intent(user_message):
-    """Analiza si el usuario quiere que se le reenvíe el código de verificación"""
-    try:
-        prompt = f"""El usuario está en un proceso de verificación de identidad. Se le envió un código de verificación a su correo electrónico.
-
-El usuario escribió: "{user_message}"
-
-¿El usuario está pidiendo que se le reenvíe el código porque no le llegó, no lo recibió, o necesita uno nuevo?
-
-Responde ÚNICAMENTE con:
-- SI: Si el usuario indica que no recibió el código, no le llegó, quiere que se lo reenvíen, o pide ayuda porque no tiene el código
-- NO: Si el usuario está escribiendo algo que parece ser un intento de código, texto aleatorio, o cualquier otra cosa no relacionada con reenvío
-
-Responde solo con SI o NO."""
-
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 5,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
-        
-        result = json.loads(response['body'].read())
-        answer = result['content'][0]['text'].strip().upper()
-        return 'SI' in answer or 'SÍ' in answer
-        
-    except Exception:
-        return False
-
-def analyze_farewell_intent(message):
-    """
-    Analiza si el usuario se está despidiendo usando Bedrock
-    """
-    try:
-        conversation_context = get_conversation_context()
-        
-        prompt = f"""Analiza si el usuario se está despidiendo o finalizando la conversación.
-
-Contexto de la conversación: {conversation_context}
-Mensaje del usuario: "{message}"
-
-Determina la intención:
-- DESPEDIDA: Se está despidiendo claramente (gracias, adiós, hasta luego, nos vemos, chao, bye, eso es todo, ya terminé)
-- CONTINUANDO: Quiere seguir conversando o hacer algo más
-- AMBIGUO: No está claro
-
-Responde ÚNICAMENTE con: DESPEDIDA, CONTINUANDO, o AMBIGUO"""
-
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 10,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
-        
-        response_body = json.loads(response['body'].read())
-        intent = response_body['content'][0]['text'].strip().upper()
-        
-        return intent if intent in ['DESPEDIDA', 'CONTINUANDO', 'AMBIGUO'] else 'CONTINUANDO'
-        
-    except Exception as e:
-        # Fallback simple si Bedrock falla
-        farewell_keywords = ['gracias', 'adiós', 'hasta luego', 'nos vemos', 'chao', 'bye', 
-                           'eso es todo', 'ya terminé', 'ya está', 'perfecto gracias']
-        message_lower = message.lower()
-        if any(keyword in message_lower for keyword in farewell_keywords):
-            return 'DESPEDIDA'
-        return 'CONTINUANDO'
-
-def generate_farewell_response():
-    """
-    Genera una respuesta de despedida contextual
-    """
-    user_info = get_user_info()
-    user_name = user_info['name'] if user_info['name'] != 'Usuario' else ""
-    
-    # Verificar si hay una cita agendada reciente
-    has_appointment = False
-    appointment_info = ""
-    
-    if hasattr(st.session_state, 'selected_clinic') and st.session_state.selected_clinic:
-        has_appointment = True
-        clinic = getattr(st.session_state, 'selected_clinic', '')
-        day = getattr(st.session_state, 'selected_day', '')
-        time = getattr(st.session_state, 'selected_time', '')
-        if clinic and day and time:
-            appointment_info = f" para tu cita del {day} a las {time} en {clinic}"
-    
-    # Generar respuesta personalizada
-    if has_appointment and appointment_info:
-        if user_name:
-            return f"¡Perfecto, {user_name}! Me alegra haber podido ayudarte{appointment_info}. ¡Que tengas un excelente día y nos vemos pronto!"
-        else:
-            return f"¡Perfecto! Me alegra haber podido ayudarte{appointment_info}. ¡Que tengas un excelente día y nos vemos pronto!"
-    else:
-        if user_name:
-            return f"¡Gracias por usar nuestros servicios, {user_name}! Espero haber podido ayudarte. ¡Que tengas un excelente día!"
-        else:
-            return "¡Gracias por usar nuestros servicios! Espero haber podido ayudarte. ¡Que tengas un excelente día!"
-
-def handle_contextual_conversation(prompt):
-    """
-    Maneja conversación con contexto completo y detección de despedidas
-    """
-    # Detectar si es una despedida
-    farewell_intent = analyze_farewell_intent(prompt)
-    
-    if farewell_intent == 'DESPEDIDA':
-        return generate_farewell_response(), 'conversation_ended'
-    
-    # Si no es despedida, continuar con conversación contextual
-    conversation_context = get_conversation_context()
-    return invoke_bedrock_smart(prompt, 'contextual', conversation_context), 'completed'
-
-def handle_medical_input(prompt):
-    if prompt.strip().isdigit() and len(prompt.strip()) > 0:
-        user_id = prompt.strip()
-        user_name = "Usuario"
-        return process_medical_results(user_id, user_name)
-    
-    try:
-        data = json.loads(prompt)
-        if isinstance(data, dict) and any(key in str(data).lower() for key in ['glicemia', 'hemoglobina', 'colesterol', 'glucosa']):
-            user_name = data.get('nombre_usuario', 'Usuario')
-            results = {k: v for k, v in data.items() if k != 'nombre_usuario'}
-            st.session_state.user_data = {"results": results}
-            
-            issues, needs_appointment = analyze_results(results)
-            return generate_medical_response(results, issues, user_name)
-    except json.JSONDecodeError:
-        pass
-    
-    return None, None
-
-def handle_appointment_flow(stage, prompt):
-    if stage == 'analyzing':
-        intent = analyze_user_intent(prompt, 'analyzing')
-        if intent == 'POSITIVA':
-            return handle_appointment_request()
-        elif intent == 'AMBIGUA':
-            return "¿Te gustaría que te ayude a agendar una cita? Por favor responde sí o no para continuar.", 'analyzing'
-        else:
-            return MESSAGES['appointment_general_declined'], 'completed'
-    
-    elif stage == 'selecting_clinic':
-        return handle_clinic_selection(prompt)
-    
-    elif stage == 'scheduling':
-        return handle_day_selection(prompt)
-    
-    elif stage == 'selecting_time':
-        return handle_time_selection(prompt)
-    
-    elif stage == 'confirming':
-        intent = analyze_user_intent(prompt, 'confirming')
-        if intent == 'POSITIVA':
-            return handle_appointment_confirmation()
-        elif intent == 'AMBIGUA':
-            return "¿Confirmas tu cita? Por favor responde sí o no.", 'confirming'
-        else:
-            # Limpiar datos de cita no confirmada
-            if hasattr(st.session_state, 'selected_time'):
-                del st.session_state.selected_time
-            return MESSAGES['appointment_declined'], 'completed'
-    
-    return None, None
-
-def handle_new_appointment_request(prompt):
-    """Maneja solicitudes de nueva cita con opción híbrida de usuario"""
-    # Reset appointment-related session state
-    appointment_keys = ['selected_clinic', 'selected_day', 'selected_time', 'clinics', 'next_days']
-    for key in appointment_keys:
-        if hasattr(st.session_state, key):
-            delattr(st.session_state, key)
-    
-    # Si ya hay datos de usuario autenticado, ofrecer opciones
-    if (hasattr(st.session_state, 'auth_token') and 
-        st.session_state.auth_token and 
-        hasattr(st.session_state, 'user_data') and 
-        st.session_state.user_data):
-        
-        user_name = st.session_state.user_data.get('name', 'Usuario actual')
-        
-        response = f"""¿Para quién quieres agendar la nueva cita?
-
-1. Mismo usuario ({user_name})
-2. Cambiar de usuario
-
-Por favor, responde con el número de tu opción."""
-        
-        return response, 'selecting_user_for_new_appointment'
-    else:
-        # Si no hay datos, ir directo a autenticación
-        return "Para agendar una nueva cita, necesito que te autentiques. Por favor ingresa tu correo electrónico:", 'waiting_email'
-
-def handle_user_selection_for_new_appointment(prompt):
-    """Maneja la selección del usuario para nueva cita"""
-    user_choice = prompt.strip()
-    
-    if user_choice == '1':
-        # Reutilizar datos existentes - ir directo a selección de clínica
-        return handle_appointment_request()
-    elif user_choice == '2':
-        # Limpiar datos y reiniciar flujo
-        clear_user_session_data()
-        return "Perfecto, vamos a cambiar de usuario. Por favor ingresa tu correo electrónico:", 'waiting_email'
-    else:
-        # Respuesta inválida, pedir clarificación
-        return "Por favor, responde con **1** para el mismo usuario o **2** para cambiar de usuario.", 'selecting_user_for_new_appointment'
-
-def clear_user_session_data():
-    """Limpia los datos de sesión del usuario para permitir cambio de usuario"""
-    keys_to_clear = [
-        'auth_token', 'user_data', 'company_id', 'company_products', 
-        'selected_clinic', 'selected_day', 'selected_time', 'clinics', 
-        'next_days', 'user_email'
-    ]
-    for key in keys_to_clear:
-        if hasattr(st.session_state, key):
-            delattr(st.session_state, key)
-
-def handle_main_menu_selection(prompt):
-    """Maneja la selección del menú principal después del login"""
-    user_choice = prompt.strip().lower()
-    
-    # Palabras clave para agendar cita
-    agendar_keywords = ['agendar', 'cita', 'chequeo', 'preventivo', 'producto']
-    
-    # Palabras clave para revisar examen
-    revisar_keywords = ['revisa', 'revisar', 'examen', 'examenes', 'exámenes', 'analizar', 'resultado', 'médico', 'medico']
-    
-    # Detectar intención por palabras clave
-    if any(keyword in user_choice for keyword in agendar_keywords):
-        return show_products_menu()
-    elif any(keyword in user_choice for keyword in revisar_keywords):
-        return start_medical_analysis()
-    else:
-        return MESSAGES['invalid_menu_option'], 'main_menu'
-
-def show_products_menu():
-    """Muestra el menú de productos disponibles"""
-    if not st.session_state.company_products:
-        return "No hay productos disponibles en este momento. ¿Te gustaría hacer un análisis médico en su lugar?", 'main_menu'
-    
-    products_list = ""
-    for product in st.session_state.company_products:
-        name = product.get('name', 'Producto sin nombre')
-        products_list += f"- {name}\n"
-    
-    response = MESSAGES['products_menu'].format(products_list=products_list)
-    return response, 'selecting_product'
-
-def handle_product_selection(prompt):
-    """Maneja la selección de un producto específico"""
-    selected_product = None
-    
-    # Intentar primero con número (retrocompatibilidad)
-    try:
-        product_num = int(prompt.strip()) - 1
-        if 0 <= product_num < len(st.session_state.company_products):
-            selected_product = st.session_state.company_products[product_num]
-    except ValueError:
-        pass
-    
-    # Si no funcionó con número, buscar por nombre
-    if not selected_product:
-        selected_product = find_match(prompt, st.session_state.company_products)
-    
-    # Si encontró el producto
-    if selected_product:
-        product_name = selected_product.get('name', 'Producto seleccionado')
-        st.session_state.selected_product = selected_product
-        
-        response = MESSAGES['product_selected'].format(product_name=product_name)
-        appointment_response, appointment_stage = handle_appointment_request()
-        return f"{response}\n\n{appointment_response}", appointment_stage
-    else:
-        return MESSAGES['invalid_product_option'], 'selecting_product'
-
-def start_medical_analysis():
-    """Inicia el flujo de análisis médico - selección de laboratorio"""
-    response = "¿Selecciona el laboratorio donde se realizó el examen?\n\n"
-    response += "- Lab. Blanco\n"
-    response += "- Otro\n\n"
-    response += "Escribe la opción que prefieras."
-    return response, 'selecting_lab'
-
-def handle_lab_selection(prompt):
-    """Maneja la selección del laboratorio"""
-    user_choice = prompt.strip().lower()
-    
-    lab_blanco_keywords = ['lab', 'blanco']
-    otro_keywords = ['otro', 'otros', 'diferente']
-    
-    if any(keyword in user_choice for keyword in lab_blanco_keywords):
-        return "Por favor, sube el archivo PDF de tu examen para continuar.", 'waiting_file_upload'
-    elif any(keyword in user_choice for keyword in otro_keywords):
-        return "Para otros laboratorios visita nuestro sitio web: https://bianca.gomind.cl\n\n¿Hay algo más en lo que pueda ayudarte?", 'completed'
-    else:
-        return "No entendí tu selección. Por favor, escribe:\n- 'Lab. Blanco' si tu examen es de Lab. Blanco\n- 'Otro' para otros laboratorios", 'selecting_lab'
-
-def upload_examination(file_bytes, filename):
-    """Sube el PDF al endpoint de examinations"""
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/examinations/upload"
-    headers = {"Authorization": f"Bearer {token}"}
-    files = {"file": (filename, file_bytes, "application/pdf")}
-    
-    response = requests.post(url, headers=headers, files=files, timeout=60)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Error subiendo examen: {response.status_code} - {response.text}")
-
-def check_job_status(job_id):
-    """Consulta el estado del job de procesamiento"""
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/examinations/job/{job_id}"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = requests.get(url, headers=headers, timeout=30)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Error consultando job: {response.status_code} - {response.text}")
-
-def get_examination_analysis(job_id):
-    """Obtiene el análisis del examen procesado"""
-    token = st.session_state.auth_token
-    url = f"{API_BASE_URL}/api/examinations/analysis-job/{job_id}"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = requests.get(url, headers=headers, timeout=30)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Error obteniendo análisis: {response.status_code} - {response.text}")
-
-def process_uploaded_examination(file_bytes, filename):
-    """Orquesta el flujo completo: upload → polling → análisis"""
-    import time
-    
-    # Paso 1: Subir archivo
-    upload_result = upload_examination(file_bytes, filename)
-    job_id = upload_result['job_id']
-    
-    # Paso 2: Polling hasta Completado (max 2 minutos)
-    max_attempts = 120
-    for attempt in range(max_attempts):
-        time.sleep(1)
-        job_status = check_job_status(job_id)
-        
-        status = job_status.get('status', '')
-        if status in ['Completado', 'Completed', 'completed', 'completado']:
-            # Paso 3: Verificar success
-            job_response = job_status.get('response', {})
-            if job_response.get('success', False):
-                # Paso 4: Obtener análisis
-                analysis = get_examination_analysis(job_id)
-                return analysis, None
-            else:
-                error_msg = job_response.get('error_message', 'No se pudo procesar el examen')
-                return None, error_msg
-    
-    return None, "El procesamiento está tardando más de lo esperado. Por favor, intenta nuevamente en unos minutos."
-
-def generate_examination_response(analysis_data):
-    """Genera la respuesta con los resultados del análisis del PDF"""
-    metadata = analysis_data.get('metadata', {})
-    params_found = analysis_data.get('parameters_found', [])
-    params_out_of_range = analysis_data.get('parameters_out_of_range', [])
-    
-    total_params = metadata.get('parameters_found_count', len(params_found))
-    out_of_range_count = metadata.get('parameters_out_of_range_count', len(params_out_of_range))
-    
-    # Si no se encontraron parámetros médicos, no es un examen válido
-    if total_params == 0:
-        return "El documento que subiste no corresponde a un examen de laboratorio o no pudimos identificar parámetros médicos en él.", 'selecting_lab'
-    
-    user_name = "Usuario"
-    if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-        user_name = st.session_state.user_data.get('name', 'Usuario')
-    
-    if out_of_range_count == 0:
-        # Todos los parámetros están bien
-        results_text = ""
-        for p in params_found:
-            value = p['analysis'][0]['value'] if p.get('analysis') else 'N/A'
-            unit = p.get('unit_of_measure', '')
-            results_text += f"- {p['name']}: {value} {unit}\n"
-        
-        response = f"¡{user_name}! Gracias por compartir tu examen. Me da gusto poder revisarlo contigo.\n\n"
-        response += f"¡Excelente noticia! Se encontraron {total_params} parámetros y todos están dentro del rango saludable:\n\n{results_text}"
-        
-        # Generar pasos con IA
-        results_dict = {}
-        for p in params_found:
-            try:
-                val = float(p['analysis'][0]['value']) if p.get('analysis') else 0
-                results_dict[p['name']] = val
-            except (ValueError, IndexError):
-                pass
-        
-        action_steps = generate_action_steps_with_ai(results_dict, [], is_healthy=True)
-        response += action_steps
-        response += MESSAGES['disclaimer']
-        
-        return response, 'completed'
-    else:
-        # Hay parámetros fuera de rango
-        issues_text = ""
-        for p in params_out_of_range:
-            value = p['analysis'][0]['value'] if p.get('analysis') else 'N/A'
-            unit = p.get('unit_of_measure', '')
-            ranges = ', '.join(p['analysis'][0].get('reference_ranges', [])) if p.get('analysis') else 'N/A'
-            issues_text += f"- {p['name']}: {value} {unit} (Rango referencia: {ranges})\n"
-        
-        response = f"¡{user_name}! Gracias por compartir tu examen. He revisado tus resultados.\n\n"
-        response += f"Se encontraron {total_params} parámetros, de los cuales {out_of_range_count} están fuera de rango:\n\n{issues_text}"
-        
-        # Generar pasos con IA
-        results_dict = {}
-        issues_list = []
-        for p in params_out_of_range:
-            try:
-                val = float(p['analysis'][0]['value']) if p.get('analysis') else 0
-                results_dict[p['name']] = val
-                issues_list.append(f"{p['name']} fuera de rango: {p['analysis'][0]['value']}")
-            except (ValueError, IndexError):
-                pass
-        
-        action_steps = generate_action_steps_with_ai(results_dict, issues_list, is_healthy=False)
-        response += action_steps
-        response += MESSAGES['disclaimer']
-        response += f"\n\n{MESSAGES['appointment_question']}"
-        
-        return response, 'analyzing'
-
-def handle_authentication_flow(stage, prompt):
-    if stage == 'waiting_email':
-        email = prompt.strip().lower()
-        if is_valid_email(email):
-            st.session_state.user_email = email
-            
-            # Enviar código de verificación directamente después del email
-            try:
-                send_verification_code(email)
-                return MESSAGES['verification_code_sent'], 'waiting_verification_code'
-            except Exception as e:
-                error_msg = str(e)
-                # Si el mensaje viene del API (usuario no existe), mostrarlo directamente
-                if "Usuario no encontrado" in error_msg or "No encontramos" in error_msg:
-                    return error_msg, 'waiting_email'
-                else:
-                    # Otros errores técnicos
-                    return f"Error enviando código de verificación: {error_msg}. Por favor, intenta nuevamente.", 'waiting_email'
-        else:
-            return "Parece que hay un pequeño error en el dato que ingresaste. Revísalo y vuelve a intentarlo, por favor. Recuerda que necesitamos tu correo electrónico", 'waiting_email'
-    
-    elif stage == 'waiting_verification_code':
-        verification_code = prompt.strip()
-        
-        # CASO 1: Si es numérico → Validar directamente como código (sin IA)
-        if verification_code.isdigit():
-            try:
-                auth_data = authenticate_with_code(st.session_state.user_email, verification_code)
-                
-                st.session_state.auth_token = auth_data['token']
-                st.session_state.company_id = auth_data['company_id']
-                
-                user_data = auth_data['user_data']
-                user_id = user_data.get('user_id') or user_data.get('id') or user_data.get('userId')
-                user_name = user_data.get('name', 'Usuario')
-                
-                st.session_state.user_data = {
-                    'id': user_id,
-                    'name': user_name
-                }
-                
-                try:
-                    products = get_company_products(auth_data['company_id'])
-                    st.session_state.company_products = products
-                except Exception as prod_error:
-                    st.session_state.company_products = []
-                
-                user_name = auth_data['user_data'].get('name', 'Usuario')
-                
-                success_message = MESSAGES['code_authentication_success']
-                menu_message = MESSAGES['login_success_menu'].format(user_name=user_name)
-                
-                return f"{success_message}\n\n{menu_message}", 'main_menu'
-                
-            except Exception as e:
-                error_msg = str(e)
-                if "código" in error_msg.lower() or "inválido" in error_msg.lower():
-                    return MESSAGES['invalid_code'], 'waiting_verification_code'
-                else:
-                    return MESSAGES['code_error'], 'waiting_verification_code'
-        
-        # CASO 2 y 3: No es numérico → ¿Es solicitud de reenvío o texto basura?
-        else:
-            # Primero verificar con keywords rápidas (sin costo)
-            reenvio_keywords = ['no me llegó', 'no me llego', 'no me ha llegado', 'reenviar', 'reenviame',
-                                'reenvíame', 'no recibí', 'no recibi', 'no he recibido',
-                                'enviar de nuevo', 'otro código', 'otro codigo', 'no llegó', 'no llego',
-                                'no ha llegado', 'no me llega', 'mandarlo otra', 'enviarlo de nuevo', 
-                                'volver a enviar', 'no recibido', 'manda otro', 'envia otro', 'envía otro',
-                                'puedes enviar', 'me puedes enviar', 'no tengo el codigo',
-                                'no tengo código', 'codigo nuevo', 'código nuevo', 'enviar otro',
-                                'mandar otro', 'sin codigo', 'sin código']
-            
-            es_reenvio = any(keyword in verification_code.lower() for keyword in reenvio_keywords)
-            
-            # Si no coincide con keywords, usar IA específica como fallback
-            if not es_reenvio:
-                es_reenvio = analyze_resend_intent(prompt)
-            
-            if es_reenvio:
-                # Solicitud de reenvío confirmada
-                if st.session_state.resend_count >= 3:
-                    return "Has alcanzado el límite de reenvíos. Por favor, revisa tu carpeta de spam o correo no deseado. Si necesitas ayuda adicional, contacta a support@gomind.cl", 'waiting_verification_code'
-                
-                try:
-                    st.session_state.resend_count += 1
-                    send_verification_code(st.session_state.user_email)
-                    
-                    if st.session_state.resend_count == 3:
-                        return "Te envié un nuevo código de verificación a tu correo. Escríbelo aquí para continuar.\n\n💡 Si no lo encuentras, revisa tu carpeta de spam o correo no deseado. Si el problema persiste, contacta a support@gomind.cl\n(Último intento disponible)", 'waiting_verification_code'
-                    else:
-                        return f"Te envié un nuevo código de verificación a tu correo. Escríbelo aquí para continuar.\n(Intento {st.session_state.resend_count} de 3)", 'waiting_verification_code'
-                except Exception as e:
-                    return "No pudimos reenviar el código. Por favor, intenta nuevamente en unos minutos o contacta a support@gomind.cl", 'waiting_verification_code'
-            else:
-                # No es reenvío ni código válido → Texto basura
-                return MESSAGES['code_error'], 'waiting_verification_code'
-    
-    elif stage == 'authenticated':
-        user_id = prompt.strip()
-        try:
-            user_name = "Usuario"
-            return process_medical_results(user_id, user_name)
-        except Exception as e:
-            error_msg = str(e)
-            if "Paciente no identificado" in error_msg:
-                response_text = f"Lo siento, no se logró identificar al paciente con el ID {user_id}. Verifica que el número sea correcto o contacta a soporte. ¿Hay algo más en lo que pueda ayudarte?"
-                return response_text, 'completed'
-            else:
-                response_text = f"Error obteniendo resultados de la API: {error_msg}. ¿Puedes compartir tus resultados médicos en formato JSON? Ejemplo: {{\"Glicemia Basal\": 90, \"Hemoglobina\": 13}}"
-                return response_text, 'waiting_json'
-    
-    return None, None
+@st.cache_resource
+def get_engine():
+    """
+    Un solo motor por proceso, aunque el script se re-ejecute en cada interacción:
+    breakers, cachés, calendario, índice de horas y el thread del outbox se
+    comparten entre todas las sesiones del navegador.
+    """
+    parameter_normalizer = ParameterNormalizer(RANGES, PARAMETER_ALIASES)
+
+    # Con una dependencia caída las llamadas fallan de inmediato (sin esperar el timeout)
+    # y cada flujo usa su respaldo: keywords en vez de IA, `connection_error` en citas
+    api_breaker = CircuitBreaker(
+        'API GoMind', failure_threshold=API_BREAKER_FAILURE_THRESHOLD, recovery_seconds=API_BREAKER_RECOVERY_SECONDS,
+        is_failure=lambda response: response.status_code >= 500,
+        open_error=requests.exceptions.ConnectionError
+    )
+    bedrock_breaker = CircuitBreaker(
+        'Bedrock', failure_threshold=BEDROCK_BREAKER_FAILURE_THRESHOLD, recovery_seconds=BEDROCK_BREAKER_RECOVERY_SECONDS
+    )
+
+    # Respuestas de la API GoMind con ETag/Last-Modified (TTL corto si no hay validadores)
+    api = GoMindApiClient(
+        API_BASE_URL, api_breaker, ConditionalResponseCache(fallback_ttl_seconds=RESULTS_CACHE_TTL_SECONDS),
+        parameter_normalizer
+    )
+
+    # Todas las llamadas a Bedrock pasan por aquí (prefijo cacheable + contabilidad de tokens)
+    bedrock = BedrockGateway(
+        bedrock_client, BEDROCK_MODEL_ID,
+        enable_prompt_cache=BEDROCK_PROMPT_CACHE,
+        router=ModelRouter(BEDROCK_ROUTES), breaker=bedrock_breaker,
+        shared_instructions=SHARED_INSTRUCTIONS
+    )
+
+    # Citas pendientes de envío a la API; el resultado se consulta en la siguiente ejecución del script
+    outbox = AppointmentOutbox(
+        APPOINTMENT_OUTBOX_PATH,
+        send=lambda payload, token, key: api.send_appointment(payload, token, idempotency_key=key)
+    )
+    outbox.start()
+
+    # Horas ocupadas por clínica (bitmap por día), cargadas en bloque desde el outbox de citas
+    slot_index = SlotAvailabilityIndex()
+    slot_index.load(
+        (provider_id, parse_slot_datetime(date_time)) for provider_id, date_time in outbox.booked_slots()
+    )
+
+    return ConversationEngine(
+        api, bedrock, parameter_normalizer, BusinessCalendar(regions=CALENDAR_REGIONS), slot_index, outbox,
+        # Pasos a seguir precalculados por perfil fuera de rango (tools/build_action_steps_library.py)
+        ActionStepsLibrary(RANGES, path=ACTION_STEPS_LIBRARY_PATH, resolve_name=parameter_normalizer.canonical_name),
+        pdf_precheck=PdfPrecheck(RANGES.keys(), PARAMETER_ALIASES.keys(), max_bytes=PDF_MAX_BYTES, max_pages=PDF_MAX_PAGES),
+        local_exam_parser=LocalExamParser(
+            parameter_normalizer, RANGES, min_confidence=LOCAL_EXAM_PARSER_MIN_CONFIDENCE
+        ) if LOCAL_EXAM_PARSER_ENABLED else None,
+        messages=STREAMLIT_MESSAGES, offer_user_switch=True, turn_budget_seconds=TURN_BUDGET_SECONDS,
+        confirm_wait_seconds=APPOINTMENT_CONFIRM_WAIT_SECONDS, progressive_exam_reply=PROGRESSIVE_EXAM_REPLY,
+        action_steps_deadline_seconds=ACTION_STEPS_DEADLINE_SECONDS, prompt_token_budget=PROMPT_TOKEN_BUDGET
+    )
 
 def get_input_placeholder(stage):
     """Placeholder completamente estático - elimina todos los cambios dinámicos"""
@@ -1261,411 +149,70 @@ def get_input_placeholder(stage):
         return "Ingresa tus resultados médicos en formato JSON..."
     elif stage == 'waiting_verification_code':
         return "Ingresa el código de verificación..."
-    
+
     # Para TODOS los demás stages, usar placeholder genérico estático
     return "Escribe tu mensaje aquí..."
 
-def dispatch_conversation_stage(stage, prompt):
-    # Handle initial stage (primer mensaje del usuario)
-    if stage == 'initial':
-        # El usuario escribió algo por primera vez - mostrar mensaje de bienvenida
-        welcome_message = """👋 ¡Hola! Soy **Bianca** 😊, tu asistente de salud de GoMind.
-
-Ingresa tu **correo electrónico** para enviarte un código de verificación y así confirmar tu identidad"""
-        return welcome_message, 'waiting_email'
-    
-    # Handle authentication flow stages
-    auth_stages = ['waiting_email', 'waiting_verification_code', 'authenticated']
-    if stage in auth_stages:
-        response, new_stage = handle_authentication_flow(stage, prompt)
-        return response, new_stage
-    
-    # Handle product-related queries
-    if stage == 'showing_products':
-        intent = analyze_user_intent(prompt, 'showing_products')
-        if intent == 'PRODUCTOS':
-            products = st.session_state.company_products
-            if products:
-                response = "Aquí tienes los productos disponibles de tu compañía:\n\n"
-                for product in products:
-                    name = product.get('name', 'Producto sin nombre')
-                    description = product.get('description', 'Sin descripción')
-                    price = product.get('price', 'Precio no disponible')
-                    response += f"**{name}**\n{description}\nPrecio: {price}\n\n"
-                return response, 'showing_products'
-            else:
-                return "No hay productos disponibles en este momento.", 'authenticated'
-        else:
-            return None, 'authenticated'
-    
-    # Handle main menu selection
-    if stage == 'main_menu':
-        return handle_main_menu_selection(prompt)
-    
-    # Handle lab selection for examination
-    if stage == 'selecting_lab':
-        return handle_lab_selection(prompt)
-    
-    # Handle file upload stage (text input while waiting for file)
-    if stage == 'waiting_file_upload':
-        return "Por favor, sube el archivo PDF de tu examen usando el botón de carga que aparece abajo.", 'waiting_file_upload'
-    
-    # Handle product selection
-    if stage == 'selecting_product':
-        return handle_product_selection(prompt)
-    
-    # Handle new appointment user selection
-    if stage == 'selecting_user_for_new_appointment':
-        return handle_user_selection_for_new_appointment(prompt)
-    
-    # Handle appointment flow stages
-    appointment_stages = ['analyzing', 'selecting_clinic', 'scheduling', 'selecting_time', 'confirming']
-    if stage in appointment_stages:
-        response, new_stage = handle_appointment_flow(stage, prompt)
-        if response is not None:
-            return response, new_stage
-    
-    # Handle medical input stages
-    medical_stages = ['waiting_json', 'completed', 'conversation_ended']
-    if stage in medical_stages:
-        response, new_stage = handle_medical_input(prompt)
-        if response is not None:
-            return response, new_stage
-        
-        if stage == 'completed':
-            # Obtener contexto del último mensaje del asistente
-            last_assistant_msg = ""
-            for msg in reversed(st.session_state.messages):
-                if msg["role"] == "assistant":
-                    last_assistant_msg = msg["content"]
-                    break
-            
-            # Verificar si la cita ya fue confirmada recientemente
-            cita_confirmada = "cita quedó confirmada" in last_assistant_msg or "registrada correctamente" in last_assistant_msg
-            
-            if cita_confirmada:
-                # Después de confirmar cita: mostrar menú principal directo
-                user_name = "Usuario"
-                if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-                    user_name = st.session_state.user_data.get('name', 'Usuario')
-                return MESSAGES['login_success_menu'].format(user_name=user_name), 'main_menu'
-            else:
-                # Flujo normal: no hay cita confirmada reciente
-                farewell_intent = analyze_farewell_intent(prompt)
-                if farewell_intent == 'DESPEDIDA':
-                    return generate_farewell_response(), 'conversation_ended'
-                
-                intent = analyze_user_intent(prompt, 'completed')
-                if intent in ['NUEVA_CITA', 'POSITIVA']:
-                    return handle_new_appointment_request(prompt)
-                elif intent == 'NEGATIVA':
-                    return generate_farewell_response(), 'conversation_ended'
-                
-                # En lugar de conversación libre, redirigir al menú principal
-                user_name = "Usuario"
-                if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-                    user_name = st.session_state.user_data.get('name', 'Usuario')
-                return f"No estoy segura de cómo ayudarte con eso. ¿Te gustaría volver al menú principal?\n\n{MESSAGES['login_success_menu'].format(user_name=user_name)}", 'main_menu'
-        
-        if stage == 'conversation_ended':
-            # Verificar si la despedida fue después de una cita confirmada
-            last_assistant_msg = ""
-            for msg in reversed(st.session_state.messages):
-                if msg["role"] == "assistant":
-                    last_assistant_msg = msg["content"]
-                    break
-            
-            # Si la despedida fue post-cita → Mostrar menú principal
-            post_cita = "cita del" in last_assistant_msg or "haber podido ayudarte" in last_assistant_msg
-            
-            if post_cita:
-                user_name = "Usuario"
-                if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-                    user_name = st.session_state.user_data.get('name', 'Usuario')
-                return MESSAGES['login_success_menu'].format(user_name=user_name), 'main_menu'
-            
-            # Si no fue post-cita, verificar saludo para reiniciar
-            saludos = ['hola', 'buenos días', 'buenas tardes', 'buenas noches', 'hey', 'hi', 'buenas']
-            if any(saludo in prompt.lower() for saludo in saludos):
-                if hasattr(st.session_state, 'auth_token') and st.session_state.auth_token:
-                    user_name = "Usuario"
-                    if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-                        user_name = st.session_state.user_data.get('name', 'Usuario')
-                    return MESSAGES['login_success_menu'].format(user_name=user_name), 'main_menu'
-                else:
-                    return "👋 ¡Hola! Soy **Bianca** 😊, tu asistente de salud de GoMind.\n\nIngresa tu **correo electrónico** para enviarte un código de verificación y así confirmar tu identidad", 'waiting_email'
-            
-            # Si no es saludo, mantener conversación cerrada
-            return "¡Que tengas un excelente día! Si necesitas algo más, solo escribe **hola** y te ayudo.", 'conversation_ended'
-        
-        if stage == 'waiting_json':
-            return "El formato JSON no es válido. Por favor, comparte tus resultados en formato JSON válido, ejemplo: {\"Glicemia Basal\": 90, \"Hemoglobina\": 13}", 'waiting_json'
-    
-    # Default fallback - redirigir al menú principal en lugar de conversación libre
-    user_name = "Usuario"
-    if hasattr(st.session_state, 'user_data') and st.session_state.user_data:
-        user_name = st.session_state.user_data.get('name', 'Usuario')
-    
-    if hasattr(st.session_state, 'auth_token') and st.session_state.auth_token:
-        return f"No estoy segura de cómo ayudarte con eso. Te muestro las opciones disponibles:\n\n{MESSAGES['login_success_menu'].format(user_name=user_name)}", 'main_menu'
-    else:
-        return "👋 ¡Hola! Soy **Bianca** 😊, tu asistente de salud de GoMind.\n\nIngresa tu **correo electrónico** para enviarte un código de verificación y así confirmar tu identidad", 'waiting_email'
-
-# Rangos de referencia médica
-RANGES = {
-    "Porcentaje (Protrombina)": (70, 100),
-    "INR": (0.8, 1.2),
-    "TTPK (Tiempo de Tromboplastina)": (25, 40),
-    "Glicemia Basal": (75, 100),
-    "Uremia": (0, 50),
-    "Recuento de Eritrocitos": (3.9, 5.3),
-    "Hemoglobina": (11.5, 14.5),
-    "Hematocrito": (37, 47),
-    "VCM": (80, 100),
-    "HCM": (26, 34),
-    "CHCM": (31, 36),
-    "Recuento de Leucocitos": (4, 10.5),
-    "Linfocitos": (20, 40),
-    "Neutrófilos": (55, 70),
-    "Monocitos": (2, 10),
-    "Eosinófilos": (0, 5),
-    "Basófilos": (0, 2),
-    "Recuento de Neutrófilos (Absoluto)": (2, 7),
-    "Recuento de Linfocitos (Absoluto)": (0.8, 4),
-    "Recuento de Plaquetas": (150, 400),
-    "VHS (Velocidad de sedimentación globular)": (0, 11),
-}
-
-def analyze_results(results_dict):
-    issues = []
-    needs_appointment = False
-
-    for param, value in results_dict.items():
-        if param in RANGES:
-            min_val, max_val = RANGES[param]
-            if not (min_val <= value <= max_val):
-                issues.append(f"{param} fuera de rango: {value}")
-                needs_appointment = True
-
-    return issues, needs_appointment
-
-def generate_action_steps_with_ai(results, issues, is_healthy):
-    """
-    Genera pasos a seguir personalizados usando IA basándose en los resultados médicos
-    
-    Args:
-        results: Dict con parámetros y valores (ej: {"Glicemia": 90, "Hemoglobina": 13})
-        issues: Lista de problemas detectados (ej: ["Glicemia fuera de rango: 120"])
-        is_healthy: Boolean - True si todos los valores están bien
-    
-    Returns:
-        String con los pasos a seguir formateados
-    """
-    try:
-        if is_healthy:
-            # Contexto para resultados saludables
-            results_text = ", ".join([f"{k}: {v}" for k, v in results.items()])
-            prompt = f"""Eres un asistente médico virtual. El usuario tiene estos resultados de laboratorio SALUDABLES:
-{results_text}
-
-Genera exactamente 4 pasos BREVES para mantener su buena salud.
-
-Requisitos CRÍTICOS:
-- Máximo 8-10 palabras por paso
-- Lenguaje directo y accionable
-- Sin explicaciones adicionales
-- Formato: lista con guiones (-, -, -, -)
-
-Responde SOLO con los 4 pasos breves."""
-        else:
-            # Contexto para resultados no saludables
-            issues_text = "\n".join(issues)
-            results_text = ", ".join([f"{k}: {v}" for k, v in results.items()])
-            prompt = f"""Eres un asistente médico virtual. El usuario tiene estos problemas detectados en sus exámenes:
-{issues_text}
-
-Valores completos: {results_text}
-
-Genera exactamente 4 pasos BREVES para mejorar estos valores específicos.
-
-Requisitos CRÍTICOS:
-- Máximo 8-10 palabras por paso
-- Lenguaje directo y accionable
-- Enfocados en los problemas detectados
-- Formato: lista con guiones (-, -, -, -)
-- Último paso debe ser consulta médica
-
-Responde SOLO con los 4 pasos breves."""
-        
-        # Llamar a Bedrock
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 150,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
-        
-        result = json.loads(response['body'].read())
-        steps = result['content'][0]['text'].strip()
-        
-        return f"\n\n**Pasos a Seguir:**\n{steps}"
-        
-    except Exception as e:
-        # Fallback: usar pasos genéricos pre-definidos si Bedrock falla
-        if is_healthy:
-            return "\n\n**Pasos a Seguir:**\n- Mantén tus hábitos saludables actuales\n- Programa tu próximo chequeo preventivo\n- Continúa con actividad física regular\n- Mantén una alimentación balanceada"
-        else:
-            return "\n\n**Pasos a Seguir:**\n- Consulta con tu médico sobre estos resultados\n- Sigue las recomendaciones médicas\n- Monitorea tus valores regularmente\n- Mantén hábitos de vida saludables"
-
-# Optimized Bianca prompt - Reduced from 120+ lines to 15 lines
-BIANCA_PROMPT = """
-Eres "Bianca", asistente virtual de GoMind para salud física y emocional. Ayudas a interpretar resultados médicos y agendar citas con tono empático, claro y profesional.
-
-### Personalidad: Usa expresiones naturales: "Perfecto", "Entiendo", "Excelente". Evita tecnicismos innecesarios y frases repetitivas. Mantén conversación coherente.
-
-### Rangos Médicos (21 parámetros)
-**Coagulación:** Protrombina 70-100%, INR 0.8-1.2, TTPK 25-40 seg
-**Metabolismo:** Glicemia 75-100 mg/dL, Uremia 0-50 mg/dL  
-**Hemograma:** Eritrocitos 3.9-5.3 M/μL, Hemoglobina 11.5-14.5 g/dL, Hematocrito 37-47%, VCM 80-100 fL, HCM 26-34 pg, CHCM 31-36 g/dL
-**Leucocitos:** Total 4-10.5 K/μL, Linfocitos 20-40%, Neutrófilos 55-70%, Monocitos 2-10%, Eosinófilos 0-5%, Basófilos 0-2%, Neutrófilos abs 2-7 K/μL, Linfocitos abs 0.8-4 K/μL
-**Otros:** Plaquetas 150-400 K/μL, VHS 0-11 mm/h
-
-### Flujo: Valores normales → felicita, NO ofrezcas cita. Valores anormales → explica brevemente, recomienda cita. Si acepta cita, muestra 3 días hábiles con horarios 09:00-18:00.
-
-### Intenciones de Agendamiento: Si preguntas sobre cita y responden "sí", "claro", "vamos", "dale", "ok" → procede INMEDIATAMENTE al agendamiento sin pedir más información.
-
-### Contexto: Mantén coherencia conversacional. Si usuario dice "no" → responde empáticamente sin reiniciar. Para consultas generales: redirige amablemente a resultados, citas o productos.
-"""
-
-def invoke_bedrock_smart(user_message, context_type='general', context_data=""):
+def render_assistant_reply(response):
     """
-    Función consolidada para invocar Bedrock con diferentes tipos de contexto
-    
-    Args:
-        user_message: Mensaje del usuario
-        context_type: 'general', 'contextual', 'simple'
-        context_data: Datos de contexto adicionales
+    Muestra la respuesta del asistente y retorna el texto final para el historial.
+    Un TwoPhaseReply muestra primero los hallazgos y completa el mismo mensaje con
+    los pasos a seguir apenas estén listos.
     """
-    if context_type == 'contextual':
-        # Usar contexto conversacional completo
-        conversation_context = context_data or get_conversation_context()
-        full_prompt = f"""{BIANCA_PROMPT}
-
-CONTEXTO CONVERSACIONAL ACTUAL:
-{conversation_context}
-
-INSTRUCCIONES ADICIONALES:
-- Responde de manera coherente con el contexto de la conversación
-- Si el usuario ya completó un proceso, reconócelo en tu respuesta
-- Mantén un tono natural y contextual
-- Si detectas que el usuario podría estar finalizando, ofrece ayuda adicional de manera sutil
+    if not isinstance(response, TwoPhaseReply):
+        st.markdown(response)
+        return response
+    placeholder = st.empty()
+    placeholder.markdown(response.findings + "\n\n⏳ _Preparando tus pasos a seguir..._")
+    text = response.text()
+    placeholder.markdown(text)
+    return text
 
-Usuario: {user_message}
-
-Bianca:"""
-    else:
-        # Formato simple/general
-        full_prompt = f"{BIANCA_PROMPT}\n\nContexto de conversación: {context_data}\n\nUsuario: {user_message}\n\nBianca:"
-
-    try:
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": BEDROCK_MAX_TOKENS,
-                "messages": [{"role": "user", "content": full_prompt}]
-            })
-        )
-        result = json.loads(response['body'].read())
-        return result['content'][0]['text']
-    except Exception as e:
-        return f"Error al invocar Bedrock: {str(e)}"
+engine = get_engine()
 
 # Título de la aplicación
 st.title("Chat con Bianca - Asistente de Salud GoMind")
 
-if 'stage' not in st.session_state:
-    st.session_state.stage = 'initial'
+# Una sesión de conversación por sesión del navegador
+# Chat empieza vacío - el mensaje de bienvenida se mostrará cuando el usuario escriba algo
+if 'session' not in st.session_state:
+    st.session_state.session = ConversationSession(str(uuid.uuid4()))
+session = st.session_state.session
 
-if 'user_data' not in st.session_state:
-    st.session_state.user_data = None
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-    # Chat empieza vacío - el mensaje de bienvenida se mostrará cuando el usuario escriba algo
-if 'context' not in st.session_state:
-    st.session_state.context = ""
-if 'company_id' not in st.session_state:
-    st.session_state.company_id = None
-if 'clinics' not in st.session_state:
-    st.session_state.clinics = None
-if 'user_email' not in st.session_state:
-    st.session_state.user_email = None
-if 'auth_token' not in st.session_state:
-    st.session_state.auth_token = None
-if 'company_products' not in st.session_state:
-    st.session_state.company_products = None
-if 'user_profile' not in st.session_state:
-    st.session_state.user_profile = None
-if 'resend_count' not in st.session_state:
-    st.session_state.resend_count = 0
+# Cita que quedó en el outbox: se informa el resultado apenas se resuelve
+engine.record_reply(session, engine.check_pending_appointment(session))
 
 # Mostrar mensajes del chat
-for message in st.session_state.messages:
+for message in session.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Unified conversation flow using dispatcher pattern
-if prompt := st.chat_input(get_input_placeholder(st.session_state.stage), key="chat_widget"):
+if prompt := st.chat_input(get_input_placeholder(session.stage), key="chat_widget"):
     # Prevenir procesamiento duplicado básico
     if prompt and prompt.strip():
         # Handle password masking for display
-        display_prompt = "••••••••" if st.session_state.stage in ['waiting_verification_code'] else prompt
-        
-        st.session_state.messages.append({"role": "user", "content": display_prompt})
+        display_prompt = "••••••••" if session.stage in ['waiting_verification_code'] else prompt
+
         with st.chat_message("user"):
             st.markdown(display_prompt)
 
-        # Use dispatcher pattern to handle all conversation stages
-        response, new_stage = dispatch_conversation_stage(st.session_state.stage, prompt)
-        
-        # Update stage if it changed
-        if new_stage != st.session_state.stage:
-            st.session_state.stage = new_stage
+        response, _ = engine.handle_message(session, prompt, display_message=display_prompt)
 
         # Solo agregar mensaje si hay respuesta
         if response:
-            st.session_state.messages.append({"role": "assistant", "content": response})
             with st.chat_message("assistant"):
-                st.markdown(response)
+                response = render_assistant_reply(response)
+            engine.record_reply(session, response)
 
 # File uploader para subida de exámenes PDF (aparece después del chat como parte de la conversación)
-if st.session_state.stage == 'waiting_file_upload':
+if session.stage == 'waiting_file_upload':
     with st.chat_message("assistant"):
         st.markdown("📎 **Sube tu archivo aquí:**")
         uploaded_file = st.file_uploader("Sube tu examen en PDF", type=['pdf'], key="exam_upload")
-        
+
         if uploaded_file is not None:
             with st.spinner("⏳ Estoy procesando tu examen, un momento por favor..."):
-                try:
-                    analysis, error = process_uploaded_examination(
-                        uploaded_file.getvalue(),
-                        uploaded_file.name
-                    )
-                    
-                    if analysis:
-                        response, new_stage = generate_examination_response(analysis)
-                        st.session_state.stage = new_stage
-                        st.session_state.messages.append({"role": "assistant", "content": response})
-                    else:
-                        error_response = f"Lo siento, no pudimos procesar tu examen: {error}\n\n¿Te gustaría intentarlo nuevamente? Escribe 'Lab. Blanco' para subir otro archivo."
-                        st.session_state.stage = 'selecting_lab'
-                        st.session_state.messages.append({"role": "assistant", "content": error_response})
-                    
-                    st.rerun()
-                except Exception as e:
-                    error_response = "Lo siento, hubo un problema subiendo tu examen. Por favor, verifica que el archivo sea un PDF válido e intenta nuevamente.\n\n¿Te gustaría intentarlo nuevamente? Escribe 'Lab. Blanco' para subir otro archivo."
-                    st.session_state.stage = 'selecting_lab'
-                    st.session_state.messages.append({"role": "assistant", "content": error_response})
-                    st.rerun()
\ No newline at end of file
+                response, _ = engine.process_examination(session, uploaded_file.getvalue(), uploaded_file.name)
+                engine.record_reply(session, render_assistant_reply(response))
+            st.rerun()
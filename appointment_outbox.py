@@ -0,0 +1,429 @@
+import hashlib
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import closing
+
+DEFAULT_OUTBOX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "appointment_outbox.db")
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_BACKOFF_SECONDS = 2.0
+DEFAULT_MAX_BACKOFF_SECONDS = 300.0
+# Cuánto espera el turno del usuario la confirmación antes de responder "en proceso"
+DEFAULT_CONFIRM_WAIT_SECONDS = 4.0
+# Si un proceso de otra máquina muere con citas tomadas, otro las retoma pasado este plazo
+# (las de un proceso muerto en esta misma máquina se liberan apenas arranca el siguiente)
+CLAIM_LEASE_SECONDS = 600
+
+STATUS_PENDING = 'pending'
+STATUS_IN_FLIGHT = 'in_flight'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+# Respuestas 4xx que sí vale la pena reintentar
+RETRYABLE_CLIENT_ERRORS = frozenset({408, 425, 429})
+
+OutboxStatus = namedtuple('OutboxStatus', ['key', 'status', 'status_code', 'last_error'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointment_outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    recipient TEXT,
+    payload TEXT NOT NULL,
+    context TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    status_code INTEGER,
+    last_error TEXT,
+    claimed_by TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS appointment_outbox_due ON appointment_outbox (status, next_attempt_at);
+"""
+
+
+def process_owner_id():
+    """Identifica a este proceso en la columna claimed_by: máquina, pid y un token de arranque"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Sin permiso para señalarlo (u otro SO): se asume vivo y se espera el plazo
+        return True
+    return True
+
+
+def appointment_idempotency_key(payload):
+    """La misma cita (usuario, producto, clínica, fecha y hora) siempre da la misma clave"""
+    identity = {field: payload.get(field) for field in ('user_id', 'product_id', 'health_provider_id', 'date_time')}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+class AppointmentOutbox:
+    """
+    Outbox durable (SQLite) para crear citas en la API GoMind.
+
+    La cita se guarda antes de enviarse y un thread en segundo plano reintenta
+    las pendientes con backoff exponencial ante errores de red, 5xx o 429. Los
+    demás 4xx son definitivos. El thread toma un lote de citas vencidas en una
+    sola transacción y luego las envía una a una. La clave de idempotencia
+    identifica la cita en la tabla: una confirmación repetida no se vuelve a
+    enviar. También viaja como header `Idempotency-Key`, pero la API no
+    documenta soportarlo, así que no protege contra un POST repetido que ya
+    haya creado la cita.
+
+    `submit()` guarda la cita ya tomada por el proceso que la confirma y hace
+    el primer envío en un thread propio, así el drenador de otro proceso que
+    comparte la base no la toma mientras el turno espera. La espera dura solo
+    unos segundos: si la API está lenta o caída el turno responde "en proceso"
+    y, al resolverse, se llama a `notify(recipient, outcome, context)` en este
+    mismo proceso. Si la espera alcanzó a ver el resultado, no se notifica (el
+    usuario ya lo recibió en el turno).
+
+    El token del usuario solo se guarda en memoria, nunca en la base. Si el
+    proceso se reinicia (o muere y otro retoma la cita), las citas que quedaron
+    sin enviar se marcan como fallidas y el usuario recibe el aviso para volver
+    a agendar. Cada cita guarda qué proceso la tomó (`claimed_by`): al arrancar,
+    el thread de envío libera de inmediato las de procesos de esta máquina que
+    ya no existen; las de otras máquinas esperan CLAIM_LEASE_SECONDS.
+    """
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH, send=None, notify=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, base_backoff_seconds=DEFAULT_BASE_BACKOFF_SECONDS,
+                 max_backoff_seconds=DEFAULT_MAX_BACKOFF_SECONDS, poll_seconds=5.0):
+        self.path = path
+        self.send = send
+        self.notify = notify
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_seconds = poll_seconds
+        self._cond = threading.Condition()
+        self._waiting = set()
+        self._resolved = {}
+        self._tokens = {}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._senders = set()
+        self.owner = process_owner_id()
+        self._stats = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'notified': 0, 'released': 0}
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Bases creadas por versiones anteriores guardaban el token: se borra
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(appointment_outbox)")}
+            if 'token' in columns:
+                conn.execute("UPDATE appointment_outbox SET token = NULL WHERE token IS NOT NULL")
+            if 'claimed_by' not in columns:
+                conn.execute("ALTER TABLE appointment_outbox ADD COLUMN claimed_by TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _count(self, field):
+        with self._cond:
+            self._stats[field] += 1
+
+    def _insert(self, conn, key, payload, recipient, context, status, next_attempt_at):
+        """Guarda la cita; retorna True si quedó en `status` (nueva o fallida que se reintenta)"""
+        now = time.time()
+        # Una cita fallida se puede reintentar; una pendiente o enviada queda como está
+        cursor = conn.execute(
+            """INSERT INTO appointment_outbox
+                   (idempotency_key, recipient, payload, context, status, next_attempt_at, claimed_by,
+                    created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (idempotency_key) DO UPDATE SET
+                   recipient = excluded.recipient, context = excluded.context,
+                   status = excluded.status, attempts = 0, next_attempt_at = excluded.next_attempt_at,
+                   status_code = NULL, last_error = NULL, claimed_by = excluded.claimed_by,
+                   updated_at = excluded.updated_at
+               WHERE appointment_outbox.status = 'failed'""",
+            (key, recipient, json.dumps(payload), json.dumps(context or {}), status, next_attempt_at, self.owner,
+             now, now)
+        )
+        return cursor.rowcount == 1
+
+    def enqueue(self, payload, token, recipient=None, context=None, idempotency_key=None):
+        """Guarda la cita para envío y retorna su estado actual (una cita ya enviada no se reencola)"""
+        key = idempotency_key or appointment_idempotency_key(payload)
+        with closing(self._connect()) as conn:
+            if self._insert(conn, key, payload, recipient, context, STATUS_PENDING, time.time()):
+                self._remember_token(key, token)
+        self._count('enqueued')
+        self.start()
+        self._wake.set()
+        return self.status(key)
+
+    def submit(self, payload, token, recipient=None, context=None, wait_seconds=DEFAULT_CONFIRM_WAIT_SECONDS):
+        """Guarda la cita tomada por este proceso, la envía y espera hasta `wait_seconds` el resultado"""
+        key = appointment_idempotency_key(payload)
+        with self._cond:
+            self._waiting.add(key)
+        try:
+            with closing(self._connect()) as conn:
+                claimed = self._insert(
+                    conn, key, payload, recipient, context, STATUS_IN_FLIGHT, time.time() + CLAIM_LEASE_SECONDS
+                )
+                row = conn.execute(
+                    "SELECT * FROM appointment_outbox WHERE idempotency_key = ?", (key,)
+                ).fetchone() if claimed else None
+            self._count('enqueued')
+            self.start()
+            if row is None:
+                # Ya estaba enviada o en curso (confirmación repetida): se informa su estado actual
+                return self.status(key)
+            self._remember_token(key, token)
+            sender = threading.Thread(target=self._send_claimed, args=(row,), name="appointment-submit", daemon=True)
+            with self._cond:
+                self._senders.add(sender)
+            sender.start()
+
+            deadline = time.monotonic() + wait_seconds
+            with self._cond:
+                while key not in self._resolved:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                outcome = self._resolved.pop(key, None)
+                # Desde aquí, si se resuelve después, el aviso va por `notify`
+                self._waiting.discard(key)
+            return outcome or self.status(key)
+        finally:
+            with self._cond:
+                self._waiting.discard(key)
+
+    def _remember_token(self, key, token):
+        with self._cond:
+            self._tokens[key] = token
+
+    def _send_claimed(self, row):
+        try:
+            self._attempt(row)
+        finally:
+            with self._cond:
+                self._senders.discard(threading.current_thread())
+
+    def status(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT status, status_code, last_error FROM appointment_outbox WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return OutboxStatus(key, row['status'], row['status_code'], row['last_error'])
+
+    def record_sent(self, payload, recipient=None, context=None, status_code=None, idempotency_key=None):
+        """Registra como enviada una cita creada fuera del outbox (campañas), para que cuente como hora tomada"""
+        key = idempotency_key or appointment_idempotency_key(payload)
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """INSERT INTO appointment_outbox
+                       (idempotency_key, recipient, payload, context, status, attempts, next_attempt_at, status_code,
+                        created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+                   ON CONFLICT (idempotency_key) DO UPDATE SET
+                       status = excluded.status, status_code = excluded.status_code, last_error = NULL,
+                       updated_at = excluded.updated_at""",
+                (key, recipient, json.dumps(payload), json.dumps(context or {}), STATUS_SENT, now, status_code, now, now)
+            )
+        return key
+
+    def upcoming_user_ids(self, product_id, after):
+        """user_id con una cita enviada del producto desde la fecha `after` ('YYYY-MM-DD') en adelante"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT payload FROM appointment_outbox WHERE status = ?", (STATUS_SENT,)).fetchall()
+        user_ids = set()
+        for row in rows:
+            payload = json.loads(row['payload'])
+            if payload.get('product_id') == product_id and str(payload.get('date_time') or '') >= after:
+                user_ids.add(payload.get('user_id'))
+        return user_ids
+
+    def booked_slots(self):
+        """(health_provider_id, date_time) de las citas enviadas o por enviar, para cargar la disponibilidad"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT payload FROM appointment_outbox WHERE status != ?", (STATUS_FAILED,)).fetchall()
+        for row in rows:
+            payload = json.loads(row['payload'])
+            yield payload.get('health_provider_id'), payload.get('date_time')
+
+    def _claim_batch(self):
+        """
+        Toma un lote de citas vencidas en una sola transacción. Solo toma las
+        de este proceso (las que tienen token en memoria) o las abandonadas por
+        un proceso que murió, que se marcarán como fallidas.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            due = conn.execute(
+                """SELECT * FROM appointment_outbox
+                   WHERE status IN (?, ?) AND next_attempt_at <= ?
+                   ORDER BY next_attempt_at""",
+                (STATUS_PENDING, STATUS_IN_FLIGHT, now)
+            ).fetchall()
+            with self._cond:
+                rows = [row for row in due
+                        if row['idempotency_key'] in self._tokens
+                        or row['updated_at'] <= now - CLAIM_LEASE_SECONDS][:self.batch_size]
+            conn.executemany(
+                """UPDATE appointment_outbox SET status = ?, next_attempt_at = ?, claimed_by = ?, updated_at = ?
+                   WHERE idempotency_key = ?""",
+                [(STATUS_IN_FLIGHT, now + CLAIM_LEASE_SECONDS, self.owner, now, row['idempotency_key']) for row in rows]
+            )
+            conn.execute("COMMIT")
+        return rows
+
+    def _is_dead_owner(self, owner):
+        """True si `owner` es un proceso de esta máquina que ya terminó (o un arranque anterior de este pid)"""
+        parts = owner.rsplit(':', 2)
+        if owner == self.owner or len(parts) != 3 or parts[0] != socket.gethostname() or not parts[1].isdigit():
+            return False
+        pid = int(parts[1])
+        return pid == os.getpid() or not _pid_alive(pid)
+
+    def release_dead_claims(self):
+        """
+        Marca como fallidas las citas pendientes o en curso de procesos de esta máquina
+        que ya no existen (su token se perdió con ellos) y avisa al usuario sin esperar
+        el plazo. Retorna cuántas liberó.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = [row for row in conn.execute(
+                "SELECT * FROM appointment_outbox WHERE status IN (?, ?) AND claimed_by IS NOT NULL",
+                (STATUS_PENDING, STATUS_IN_FLIGHT)
+            ).fetchall() if self._is_dead_owner(row['claimed_by'])]
+            error = "token no disponible (proceso reiniciado)"
+            conn.executemany(
+                """UPDATE appointment_outbox SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                   WHERE idempotency_key = ?""",
+                [(STATUS_FAILED, now, error, now, row['idempotency_key']) for row in rows]
+            )
+            conn.execute("COMMIT")
+        for row in rows:
+            self._count('released')
+            self._resolve(row, OutboxStatus(row['idempotency_key'], STATUS_FAILED, None, error))
+        return len(rows)
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _attempt(self, row):
+        key = row['idempotency_key']
+        with self._cond:
+            token = self._tokens.get(key)
+        if token is None:
+            # El token solo vive en memoria del proceso que recibió la cita
+            status_code, error = None, "token no disponible (proceso reiniciado)"
+        else:
+            try:
+                response = self.send(json.loads(row['payload']), token, key)
+                status_code, error = response.status_code, None
+                if status_code not in (200, 201):
+                    error = f"HTTP {status_code}"
+            except Exception as e:
+                status_code, error = None, str(e)
+
+        attempts = row['attempts'] + 1
+        now = time.time()
+        if error is None:
+            status = STATUS_SENT
+        elif token is None or attempts >= self.max_attempts or \
+                (status_code is not None and 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS):
+            status = STATUS_FAILED
+        else:
+            status = STATUS_PENDING
+        next_attempt_at = now + self._backoff(attempts) if status == STATUS_PENDING else now
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """UPDATE appointment_outbox
+                   SET status = ?, attempts = ?, next_attempt_at = ?, status_code = ?, last_error = ?, updated_at = ?
+                   WHERE idempotency_key = ?""",
+                (status, attempts, next_attempt_at, status_code, error, now, key)
+            )
+        self._count({STATUS_SENT: 'sent', STATUS_FAILED: 'failed', STATUS_PENDING: 'retried'}[status])
+        if status != STATUS_PENDING:
+            with self._cond:
+                self._tokens.pop(key, None)
+            self._resolve(row, OutboxStatus(key, status, status_code, error))
+
+    def _resolve(self, row, outcome):
+        with self._cond:
+            waiting = outcome.key in self._waiting
+            if waiting:
+                self._resolved[outcome.key] = outcome
+                self._cond.notify_all()
+        if waiting or self.notify is None:
+            return
+        try:
+            self.notify(row['recipient'], outcome, json.loads(row['context'] or '{}'))
+            self._count('notified')
+        except Exception:
+            pass
+
+    def drain_once(self):
+        """Envía un lote de citas pendientes; retorna cuántas se intentaron"""
+        rows = self._claim_batch()
+        for row in rows:
+            self._attempt(row)
+        return len(rows)
+
+    def start(self):
+        """Inicia el thread que vacía el outbox (idempotente)"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="appointment-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Detiene el thread de envío y espera los envíos de `submit` en curso (las pendientes quedan en la base)"""
+        self._stopping.set()
+        self._wake.set()
+        with self._cond:
+            threads = list(self._senders) + ([self._thread] if self._thread is not None else [])
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.release_dead_claims()
+        except sqlite3.Error:
+            pass
+        while not self._stopping.is_set():
+            try:
+                attempted = self.drain_once()
+            except sqlite3.Error:
+                attempted = 0
+            if not attempted:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def snapshot(self):
+        """Contadores y citas por estado"""
+        with closing(self._connect()) as conn:
+            by_status = dict(conn.execute("SELECT status, COUNT(*) FROM appointment_outbox GROUP BY status").fetchall())
+        with self._cond:
+            return dict(self._stats, by_status=by_status)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from prompt_budget import estimate_tokens
+from turn_deadline import run_within_deadline
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+# Claude solo cachea prefijos desde cierto tamaño y el mínimo depende del modelo; es el
+# mínimo real, no se puede bajar. Ninguna instrucción del bot llega sola a 1024 tokens (van
+# de ~70 a ~490), por eso el gateway acepta `shared_instructions`: todas juntas en un solo
+# prefijo que supera el mínimo de Sonnet, pero no el de Haiku.
+DEFAULT_CACHE_MIN_TOKENS = 1024
+# (fragmento del model id, mínimo); gana el primero que aparece en el id
+CACHE_MIN_TOKENS_BY_MODEL = (
+    ('haiku-4-5', 4096),
+    ('opus-4-5', 4096),
+    ('haiku', 2048),
+)
+# Bloque no cacheado que va después del prefijo compartido e indica qué sección aplica
+SECTION_SELECTOR = "Para esta solicitud aplica únicamente las instrucciones de la SECCIÓN {number}.\n\n"
+# Duración del caché efímero de Bedrock
+PROMPT_CACHE_TTL_SECONDS = 300
+
+CallUsage = namedtuple('CallUsage', ['model_id', 'prefix_tokens', 'suffix_tokens', 'cached_tokens', 'uncached_tokens', 'cache_marker'])
+
+
+def build_request_body(system_prefix, user_suffix, max_tokens, cache_prefix=False, system_suffix=None):
+    """
+    Cuerpo de invoke_model con prefijo estable en `system` y parte variable en
+    `messages`. `system_suffix` va como segundo bloque de `system`, después del
+    marcador de caché (no forma parte del prefijo cacheado).
+    """
+    body = {
+        "anthropic_version": ANTHROPIC_VERSION,
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": user_suffix}]
+    }
+    if system_prefix:
+        system_block = {"type": "text", "text": system_prefix}
+        if cache_prefix:
+            system_block["cache_control"] = {"type": "ephemeral"}
+        body["system"] = [system_block]
+        if system_suffix:
+            body["system"].append({"type": "text", "text": system_suffix})
+    return body
+
+
+def cache_min_tokens(model_id, table=CACHE_MIN_TOKENS_BY_MODEL):
+    """Mínimo de tokens que el modelo exige para cachear un prefijo"""
+    for fragment, min_tokens in table:
+        if fragment in model_id:
+            return min_tokens
+    return DEFAULT_CACHE_MIN_TOKENS
+
+
+def build_shared_prefix(sections):
+    """Un solo prefijo con todas las instrucciones estáticas, numeradas por sección"""
+    return "\n\n".join(f"### SECCIÓN {number}\n{text}" for number, text in enumerate(sections, 1))
+
+
+class PromptCacheAccounting:
+    """
+    Contabilidad local de tokens de entrada cacheados vs. no cacheados.
+
+    Si Bedrock devuelve `usage` se usan sus cifras; si no, se estima: el primer
+    envío de un prefijo (o tras expirar el TTL) se cuenta como escritura y los
+    siguientes como lecturas de caché.
+    """
+
+    def __init__(self, ttl_seconds=PROMPT_CACHE_TTL_SECONDS, history_size=200):
+        self.ttl_seconds = ttl_seconds
+        self.history_size = history_size
+        self.calls = []
+        self.cached_tokens = 0
+        self.uncached_tokens = 0
+        self._prefix_seen_at = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_id, system_prefix, user_suffix, cache_marker, usage=None):
+        prefix_tokens = estimate_tokens(system_prefix)
+        suffix_tokens = estimate_tokens(user_suffix)
+        now = time.monotonic()
+        key = (model_id, hashlib.sha1(system_prefix.encode('utf-8')).hexdigest())
+
+        with self._lock:
+            if usage and 'input_tokens' in usage:
+                cached = usage.get('cache_read_input_tokens', 0)
+                uncached = usage['input_tokens'] + usage.get('cache_creation_input_tokens', 0)
+            else:
+                seen_at = self._prefix_seen_at.get(key)
+                hit = cache_marker and seen_at is not None and now - seen_at < self.ttl_seconds
+                cached = prefix_tokens if hit else 0
+                uncached = suffix_tokens + (0 if hit else prefix_tokens)
+            if cache_marker:
+                # Cada lectura renueva el TTL del prefijo
+                self._prefix_seen_at[key] = now
+
+            call = CallUsage(model_id, prefix_tokens, suffix_tokens, cached, uncached, cache_marker)
+            self.calls.append(call)
+            if len(self.calls) > self.history_size:
+                del self.calls[:len(self.calls) - self.history_size]
+            self.cached_tokens += cached
+            self.uncached_tokens += uncached
+        return call
+
+    def snapshot(self):
+        """Totales acumulados para monitoreo"""
+        with self._lock:
+            total = self.cached_tokens + self.uncached_tokens
+            return {
+                'cached_input_tokens': self.cached_tokens,
+                'uncached_input_tokens': self.uncached_tokens,
+                'cached_ratio': round(self.cached_tokens / total, 3) if total else 0.0,
+            }
+
+
+class BedrockGateway:
+    """
+    Punto único de llamadas a Bedrock: arma el cuerpo, marca el prefijo cacheable y contabiliza.
+
+    Con `router` (ModelRouter) el modelo se elige por tarea y se registra la latencia de cada llamada.
+    Con `breaker` (CircuitBreaker) las llamadas fallan de inmediato mientras Bedrock está caído.
+    Con `shared_instructions`, una llamada cuyo `system_prefix` es una de ellas envía el
+    prefijo compartido (todas, cacheado) y un selector de sección fuera del caché, solo si
+    el modelo elegido puede cachearlo; si no, va la instrucción propia de la tarea.
+    """
+
+    def __init__(self, client, default_model_id, enable_prompt_cache=True,
+                 cache_min_tokens_table=CACHE_MIN_TOKENS_BY_MODEL, accounting=None, router=None, breaker=None,
+                 shared_instructions=()):
+        self.client = client
+        self.default_model_id = default_model_id
+        self.enable_prompt_cache = enable_prompt_cache
+        self.cache_min_tokens_table = cache_min_tokens_table
+        self.accounting = accounting or PromptCacheAccounting()
+        self.router = router
+        self.breaker = breaker
+        self.shared_prefix = build_shared_prefix(shared_instructions) if shared_instructions else None
+        self._section_of = {text: number for number, text in enumerate(shared_instructions, 1)}
+
+    def _model_for(self, model_id, task):
+        """(modelo, si la llamada se enruta por tarea)"""
+        routed = model_id is None and task is not None and self.router is not None
+        if routed:
+            model_id = self.router.select(task)
+        return model_id or self.default_model_id, routed
+
+    def _system_blocks(self, system_prefix, model_id):
+        """(prefijo, selector de sección o None, marcador de caché) que se envían para el modelo"""
+        if not self.enable_prompt_cache:
+            return system_prefix, None, False
+        min_tokens = cache_min_tokens(model_id, self.cache_min_tokens_table)
+        section = self._section_of.get(system_prefix)
+        if section is not None and estimate_tokens(self.shared_prefix) >= min_tokens:
+            return self.shared_prefix, SECTION_SELECTOR.format(number=section), True
+        return system_prefix, None, estimate_tokens(system_prefix) >= min_tokens
+
+    def system_text(self, system_prefix, model_id=None, task=None):
+        """Texto de `system` que se enviaría ahora para esta instrucción (para presupuestar prompts)"""
+        model_id, _ = self._model_for(model_id, task)
+        prefix, selector, _ = self._system_blocks(system_prefix, model_id)
+        return prefix + (selector or "")
+
+    def invoke_text(self, system_prefix, user_suffix, max_tokens, model_id=None, task=None, budget_tokens=None):
+        """
+        Invoca el modelo (explícito, el de la tarea o el por defecto) y retorna el texto de la respuesta.
+        Con `budget_tokens`, si el prefijo compartido dejaría el prompt sobre el presupuesto se
+        envía la instrucción propia de la tarea.
+        """
+        model_id, routed = self._model_for(model_id, task)
+        prefix, selector, cache_marker = self._system_blocks(system_prefix, model_id)
+        if selector is not None and budget_tokens is not None \
+                and estimate_tokens(prefix) + estimate_tokens(selector + user_suffix) > budget_tokens:
+            prefix, selector = system_prefix, None
+            cache_marker = estimate_tokens(prefix) >= cache_min_tokens(model_id, self.cache_min_tokens_table)
+        body = build_request_body(prefix, user_suffix, max_tokens, cache_prefix=cache_marker, system_suffix=selector)
+
+        # Dentro de un turno con plazo se espera solo lo que le queda (DeadlineExceeded → respaldo)
+        result = run_within_deadline(self._guarded_invoke, model_id, body, task if routed else None)
+        self.accounting.record(model_id, prefix, (selector or "") + user_suffix, cache_marker, result.get('usage'))
+        return result['content'][0]['text']
+
+    def _guarded_invoke(self, model_id, body, task):
+        if self.breaker is not None:
+            # Con el circuito abierto falla de inmediato y el llamador usa su respaldo
+            return self.breaker.call(self._invoke_model, model_id, body, task)
+        return self._invoke_model(model_id, body, task)
+
+    def _invoke_model(self, model_id, body, task):
+        started = time.perf_counter()
+        try:
+            response = self.client.invoke_model(modelId=model_id, body=json.dumps(body))
+            return json.loads(response['body'].read())
+        finally:
+            # Los errores lentos (timeouts) también cuentan para el p95
+            if task is not None:
+                self.router.record(task, model_id, time.perf_counter() - started)
@@ -0,0 +1,58 @@
+"""
+Benchmark: búsqueda en la biblioteca de pasos a seguir (perfil + lookup) con
+una biblioteca sintética de todos los perfiles de hasta 2 parámetros.
+
+Uso: python benchmarks/bench_action_steps_library.py [n_consultas]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from action_steps_library import ActionStepsLibrary, enumerate_profiles, profile_key  # noqa: E402
+from medical_ranges import RANGES, PARAMETER_ALIASES  # noqa: E402
+from parameter_normalizer import ParameterNormalizer  # noqa: E402
+
+
+def random_results(rng):
+    results = {}
+    issues = []
+    for name in rng.sample(sorted(RANGES), rng.randint(1, 2)):
+        low, high = RANGES[name]
+        value = round(low - rng.uniform(0.1, 5), 1) if rng.random() < 0.5 else round(high + rng.uniform(0.1, 5), 1)
+        results[name] = value
+        issues.append(f"{name} fuera de rango: {value}")
+    return results, issues
+
+
+def run(n_queries):
+    rng = random.Random(9)
+    normalizer = ParameterNormalizer(RANGES, PARAMETER_ALIASES)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "library.json")
+        library = ActionStepsLibrary(RANGES, path=None, resolve_name=normalizer.canonical_name)
+        profiles = list(enumerate_profiles(RANGES, 2))
+        start = time.perf_counter()
+        for profile in profiles:
+            library.add(profile, f"- pasos para {profile_key(profile)}", source='batch')
+        library.path = path
+        library.save()
+        print(f"biblioteca: {len(library)} perfiles, {os.path.getsize(path) / 1024:,.0f} KB, "
+              f"armada en {time.perf_counter() - start:.2f} s")
+
+        library = ActionStepsLibrary(RANGES, path=path, resolve_name=normalizer.canonical_name)
+        queries = [random_results(rng) for _ in range(n_queries)]
+        start = time.perf_counter()
+        for results, issues in queries:
+            library.lookup(library.profile(results, issues))
+        elapsed = time.perf_counter() - start
+
+    print(f"consultas: {n_queries:,}, {elapsed / n_queries * 1e6:.1f} µs por perfil + lookup")
+    print(f"estadísticas: {library.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,55 @@
+"""
+Simulación de carga sobre el webhook: un número inunda con mensajes mientras
+otros usuarios conversan; después se satura el pool con turnos simultáneos
+(mitad prioritarios, mitad conversación libre) para ver qué se descarta.
+
+Uso: python benchmarks/bench_admission_control.py [n_mensajes_flood]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission_control import PRIORITY_HIGH, PRIORITY_NORMAL, KeyedRateLimiter, LoadShedder  # noqa: E402
+
+TURN_SECONDS = 0.2
+
+
+def run(n_flood):
+    senders = KeyedRateLimiter(rate_per_minute=12, burst=6)
+    flooded = sum(senders.allow('whatsapp:+56900000000') for _ in range(n_flood))
+    normal = sum(senders.allow(f'whatsapp:+5691000000{i}') for i in range(10) for _ in range(3))
+    print(f"flood: {flooded}/{n_flood} mensajes admitidos; usuarios normales: {normal}/30 admitidos")
+    print(f"contadores por número: {senders.snapshot()}")
+
+    shedder = LoadShedder(max_in_flight=16, reserved=4)
+    barrier = threading.Barrier(64)
+    admitted = {PRIORITY_HIGH: 0, PRIORITY_NORMAL: 0}
+    lock = threading.Lock()
+
+    def turn(priority):
+        barrier.wait()
+        if not shedder.try_admit(priority):
+            return
+        try:
+            with lock:
+                admitted[priority] += 1
+            time.sleep(TURN_SECONDS)
+        finally:
+            shedder.release()
+
+    # Llegan todos a la vez: los libres no pasan de max - reservados, así los prioritarios siempre tienen cupo
+    threads = [threading.Thread(target=turn, args=(PRIORITY_NORMAL,)) for _ in range(32)]
+    threads += [threading.Thread(target=turn, args=(PRIORITY_HIGH,)) for _ in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"pool saturado (64 turnos simultáneos, máx 16, 4 reservados): admitidos {admitted}")
+    print(f"contadores de descarte: {shedder.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,86 @@
+"""
+Simulación: la API de citas cae durante un rato mientras los usuarios
+confirman. Sin outbox cada confirmación fallida se pierde; con el outbox el
+turno responde en pocos segundos y todas las citas se registran (una sola vez)
+cuando la API vuelve.
+
+Uso: python benchmarks/bench_appointment_outbox.py [n_citas]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_outbox import STATUS_PENDING, STATUS_SENT, AppointmentOutbox  # noqa: E402
+
+OUTAGE_SECONDS = 1.0
+WAIT_SECONDS = 0.2
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FlakyAppointmentsApi:
+    """Responde 503 durante la caída; después crea la cita (deduplicando por Idempotency-Key)"""
+
+    def __init__(self):
+        self.recovers_at = time.monotonic() + OUTAGE_SECONDS
+        self.created = Counter()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def post(self, payload, token, idempotency_key):
+        with self._lock:
+            self.requests += 1
+            if time.monotonic() < self.recovers_at:
+                return FakeResponse(503)
+            self.created[idempotency_key] += 1
+            return FakeResponse(201)
+
+
+def appointment(i):
+    return {"user_id": i, "product_id": 2, "health_provider_id": 3, "date_time": f"2026-11-{1 + i % 28:02d}T10:00:00.000Z"}
+
+
+def run(n_appointments):
+    api = FlakyAppointmentsApi()
+    lost = sum(api.post(appointment(i), "token", None).status_code != 201 for i in range(n_appointments))
+    print(f"sin outbox:  {lost}/{n_appointments} citas perdidas durante la caída")
+
+    api = FlakyAppointmentsApi()
+    notified = Counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = AppointmentOutbox(
+            os.path.join(tmp, "outbox.db"), send=api.post,
+            notify=lambda recipient, outcome, context: notified.update([outcome.status]),
+            base_backoff_seconds=0.1, max_backoff_seconds=0.4, poll_seconds=0.05
+        )
+        start = time.perf_counter()
+        answers = Counter(outbox.submit(appointment(i), "token", recipient=f"user-{i}", wait_seconds=WAIT_SECONDS).status
+                          for i in range(min(n_appointments, 5)))
+        turn_ms = (time.perf_counter() - start) / min(n_appointments, 5) * 1000
+        for i in range(5, n_appointments):
+            outbox.enqueue(appointment(i), "token", recipient=f"user-{i}")
+        # Una confirmación repetida no crea una segunda cita
+        outbox.enqueue(appointment(0), "token", recipient="user-0")
+
+        while outbox.snapshot()['by_status'].get(STATUS_PENDING) or outbox.snapshot()['by_status'].get('in_flight'):
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        snapshot = outbox.snapshot()
+
+    duplicated = sum(1 for count in api.created.values() if count > 1)
+    print(f"con outbox:  turnos de confirmación ~{turn_ms:.0f} ms (respuestas {dict(answers)}), "
+          f"{snapshot['by_status'].get(STATUS_SENT, 0)}/{n_appointments} citas registradas en {elapsed:.1f} s, "
+          f"{api.requests} POSTs, {duplicated} duplicadas, avisos {dict(notified)}")
+    print(f"contadores:  {snapshot}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
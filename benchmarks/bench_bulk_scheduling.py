@@ -0,0 +1,79 @@
+"""
+Benchmark: campaña de N empleados repartidos entre clínicas con capacidad por
+hora, contra una API de citas falsa (latencia fija y algunos 503).
+
+Mide la asignación (greedy con capacidad) y el envío con paralelismo acotado,
+y lo compara con el envío de a una cita (como hoy, un turno a la vez).
+
+Uso: python benchmarks/bench_bulk_scheduling.py [n_empleados] [workers]
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_scheduling import CampaignEmployee, CampaignSlotAssigner, submit_appointments  # noqa: E402
+
+N_PROVIDERS = 25
+N_DAYS = 20
+SLOT_CAPACITY = 4
+API_LATENCY_SECONDS = 0.03
+
+
+class FakeAppointmentsApi:
+    def __init__(self, rng):
+        self.rng = rng
+        self.created = set()
+        self._lock = threading.Lock()
+
+    def post(self, payload, idempotency_key):
+        time.sleep(API_LATENCY_SECONDS)
+        with self._lock:
+            if self.rng.random() < 0.03:
+                return type('Response', (), {'status_code': 503})
+            self.created.add(idempotency_key)
+        return type('Response', (), {'status_code': 201})
+
+
+def synthetic_employees(n, rng, days):
+    employees = []
+    for i in range(n):
+        providers = rng.sample(range(N_PROVIDERS), rng.choice([1, 2, 3])) if rng.random() < 0.7 else []
+        earliest = days[rng.randrange(len(days) // 2)] if rng.random() < 0.3 else None
+        hours = rng.choice([[], list(range(9, 13)), list(range(14, 19))])
+        employees.append(CampaignEmployee(i, f"Empleado {i}", providers, earliest, None, hours))
+    return employees
+
+
+def run(n_employees, workers):
+    rng = random.Random(3)
+    days, current = [], date.today()
+    while len(days) < N_DAYS:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days.append(current)
+    providers = [{'health_provider_id': pid, 'name': f"Clínica {pid}"} for pid in range(N_PROVIDERS)]
+    employees = synthetic_employees(n_employees, rng, days)
+
+    start = time.perf_counter()
+    assignments, unassigned = CampaignSlotAssigner(providers, days, capacity=SLOT_CAPACITY).assign_all(employees)
+    print(f"asignación: {n_employees:,} empleados en {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(assignments):,} con hora, {len(unassigned):,} sin hora "
+          f"(capacidad {N_PROVIDERS * N_DAYS * 10 * SLOT_CAPACITY:,})")
+
+    api = FakeAppointmentsApi(rng)
+    start = time.perf_counter()
+    results = submit_appointments(assignments, api.post, workers=workers, base_backoff_seconds=0.05)
+    elapsed = time.perf_counter() - start
+    print(f"envío con {workers} workers: {elapsed:.1f} s, {dict(Counter(r.status for r in results))}, "
+          f"{len(api.created):,} citas creadas")
+    print(f"de a una cita (estimado): {len(assignments) * API_LATENCY_SECONDS:.0f} s")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -0,0 +1,67 @@
+"""
+Benchmark: calendario de días hábiles precalculado vs. recorrer `datetime`
+día a día (y formatear/parsear la etiqueta en cada consulta).
+
+Uso: python benchmarks/bench_business_calendar.py [n_consultas]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business_calendar import SHORT_WEEKDAYS, BusinessCalendar, format_short_date  # noqa: E402
+
+
+def naive_next_business_days(after, n):
+    days, current = [], after
+    while len(days) < n:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days.append(f"{SHORT_WEEKDAYS[current.weekday()]} {current.day:02d}/{current.month:02d}/{current.year}")
+    return days
+
+
+def naive_parse(label):
+    day, month, year = map(int, label.split()[1].split('/'))
+    return datetime(year, month, day).date()
+
+
+def run(n_queries):
+    start = time.perf_counter()
+    calendar = BusinessCalendar()
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"precálculo: {build_ms:.1f} ms, {calendar.snapshot()}")
+
+    rng = random.Random(7)
+    first = date(date.today().year, 1, 1)
+    afters = [first + timedelta(days=rng.randint(0, 700)) for _ in range(n_queries)]
+    labels = [format_short_date(day) for day in afters]
+
+    start = time.perf_counter()
+    for after in afters:
+        [calendar.label(day) for day in calendar.next_business_days(3, after=after)]
+    cached_next = (time.perf_counter() - start) / n_queries
+    start = time.perf_counter()
+    for after in afters:
+        naive_next_business_days(after, 3)
+    naive_next = (time.perf_counter() - start) / n_queries
+
+    start = time.perf_counter()
+    for label in labels:
+        calendar.parse_label(label)
+    cached_parse = (time.perf_counter() - start) / n_queries
+    start = time.perf_counter()
+    for label in labels:
+        naive_parse(label)
+    naive_parse_cost = (time.perf_counter() - start) / n_queries
+
+    print(f"próximos 3 días hábiles + etiqueta: calendario {cached_next * 1e6:.2f} µs vs. día a día {naive_next * 1e6:.2f} µs "
+          f"(el día a día además ofrece feriados)")
+    print(f"parseo de etiqueta:                calendario {cached_parse * 1e6:.2f} µs vs. split + datetime {naive_parse_cost * 1e6:.2f} µs")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
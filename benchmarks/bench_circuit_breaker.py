@@ -0,0 +1,69 @@
+"""
+Simulación: la dependencia cae (cada llamada espera el timeout y falla) y luego
+se recupera. Compara el tiempo total de N turnos con y sin circuit breaker, y
+muestra la recuperación vía llamada de prueba (half-open).
+
+Uso: python benchmarks/bench_circuit_breaker.py [n_turnos]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError  # noqa: E402
+
+# Escala: 1 s real del timeout de la API = 10 ms aquí
+SCALE = 100
+TIMEOUT_SECONDS = 30 / SCALE
+RECOVERY_SECONDS = 30 / SCALE
+
+
+class FlakyDependency:
+    def __init__(self):
+        self.down = True
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        if self.down:
+            time.sleep(TIMEOUT_SECONDS)
+            raise TimeoutError("timeout")
+        return "ok"
+
+
+def turn(call):
+    """Un turno: intenta la dependencia y, si falla, usa el respaldo"""
+    try:
+        return call()
+    except (TimeoutError, CircuitOpenError):
+        return "respaldo"
+
+
+def run(n_turns):
+    dependency = FlakyDependency()
+    start = time.perf_counter()
+    for _ in range(n_turns):
+        turn(dependency.call)
+    elapsed = time.perf_counter() - start
+    print(f"sin breaker: {n_turns} turnos con la dependencia caída, {dependency.calls} llamadas, "
+          f"{elapsed * SCALE:,.0f} s equivalentes")
+
+    dependency = FlakyDependency()
+    breaker = CircuitBreaker('dependencia', failure_threshold=5, recovery_seconds=RECOVERY_SECONDS)
+    start = time.perf_counter()
+    for _ in range(n_turns):
+        turn(lambda: breaker.call(dependency.call))
+    elapsed = time.perf_counter() - start
+    print(f"con breaker: {n_turns} turnos con la dependencia caída, {dependency.calls} llamadas, "
+          f"{elapsed * SCALE:,.0f} s equivalentes; {breaker.snapshot()}")
+
+    # La dependencia se recupera: tras recovery_seconds una llamada de prueba cierra el circuito
+    dependency.down = False
+    time.sleep(RECOVERY_SECONDS)
+    answers = [turn(lambda: breaker.call(dependency.call)) for _ in range(3)]
+    print(f"recuperación: {answers}, estado {breaker.state}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,131 @@
+"""
+Benchmark: conversaciones completas (login → producto → clínica → día → hora →
+confirmación) atendidas por el motor de conversación en serie y con threads
+que comparten un motor, como los atiende appv1 (un proceso, un motor).
+
+La API GoMind y Bedrock son falsos con latencias simuladas por sleep (valores
+de referencia divididos por SCALE, reportados ya reescalados); el calendario,
+el índice de horas y el outbox SQLite son los reales. Una cita cuenta como
+confirmada solo si quedó enviada (`sent`) en el outbox.
+
+Uso: python benchmarks/bench_conversation_engine.py [usuarios] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from action_steps_library import ActionStepsLibrary  # noqa: E402
+from appointment_outbox import STATUS_SENT, AppointmentOutbox  # noqa: E402
+from business_calendar import BusinessCalendar  # noqa: E402
+from conversation_engine import FAREWELL_INTENT_INSTRUCTIONS, ConversationEngine, ConversationSession  # noqa: E402
+from medical_ranges import PARAMETER_ALIASES, RANGES  # noqa: E402
+from parameter_normalizer import ParameterNormalizer  # noqa: E402
+from slot_index import SlotAvailabilityIndex  # noqa: E402
+
+BEDROCK_MS = 900    # clasificación de intención
+API_MS = 150        # llamadas a la API GoMind
+SCALE = 10
+CLINICS = [
+    {'name': 'Inmunomedica Concepción', 'health_provider_id': 1},
+    {'name': 'Laboratorio Blanco Santiago', 'health_provider_id': 3},
+    {'name': 'Red Salud Santiago Centro', 'health_provider_id': 4},
+]
+
+
+def simulated(ms):
+    time.sleep(ms / 1000 / SCALE)
+
+
+class FakeApi:
+    def send_verification_code(self, email):
+        simulated(API_MS)
+        return True
+
+    def authenticate_with_code(self, email, code):
+        simulated(API_MS)
+        return {'token': f"token-{email}", 'company_id': 7, 'user_data': {'id': email, 'name': email.split('@')[0]}}
+
+    def get_company_products(self, company_id, token):
+        simulated(API_MS)
+        return [{'name': 'Chequeo preventivo'}]
+
+    def get_health_providers(self, company_id, token):
+        simulated(API_MS)
+        return list(CLINICS)
+
+    def send_appointment(self, payload, token, idempotency_key=None):
+        simulated(API_MS)
+        return SimpleNamespace(status_code=201)
+
+
+class FakeBedrock:
+    def system_text(self, system_prefix, model_id=None, task=None):
+        return system_prefix
+
+    def invoke_text(self, system_prefix, user_suffix, max_tokens, task=None, budget_tokens=None):
+        simulated(BEDROCK_MS)
+        return 'CONTINUANDO' if system_prefix == FAREWELL_INTENT_INSTRUCTIONS else 'POSITIVA'
+
+
+def build_engine(outbox_path, library_path):
+    api = FakeApi()
+    outbox = AppointmentOutbox(
+        outbox_path, send=lambda payload, token, key: api.send_appointment(payload, token, idempotency_key=key),
+        poll_seconds=0.5
+    )
+    normalizer = ParameterNormalizer(RANGES, PARAMETER_ALIASES)
+    return ConversationEngine(
+        api, FakeBedrock(), normalizer, BusinessCalendar(), SlotAvailabilityIndex(), outbox,
+        ActionStepsLibrary(RANGES, path=library_path, resolve_name=normalizer.canonical_name)
+    )
+
+
+def converse(engine, user):
+    """Una conversación completa; retorna (stage final, turnos)"""
+    session = ConversationSession(f"user-{user}")
+    script = ['hola', f"usuario{user}@empresa.cl", '123456', 'Agendar mi cita', 'Chequeo preventivo',
+              str(user % 3 + 1), str(user // 3 % 3 + 1)]
+    for text in script:
+        engine.handle_message(session, text)
+    turns = len(script)
+    # La hora puede tomarla otro usuario entre el listado y la elección: se elige la siguiente libre
+    while session.stage == 'selecting_time' and session.available_hours:
+        engine.handle_message(session, session.available_hours[0])
+        turns += 1
+    _, stage = engine.handle_message(session, 'sí')
+    return stage, turns + 1
+
+
+def report(label, engine, results, elapsed):
+    # Las citas aún en envío al terminar se esperan antes de contar las enviadas
+    engine.outbox.stop()
+    turns = sum(t for _, t in results)
+    sent = engine.outbox.snapshot()['by_status'].get(STATUS_SENT, 0)
+    print(f"{label:26s} {elapsed * SCALE:8.2f} s  {turns / elapsed / SCALE:7.1f} turnos/s  "
+          f"citas confirmadas {sent}/{len(results)}")
+
+
+def run(users, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        library_path = os.path.join(tmp, 'steps.json')
+
+        engine = build_engine(os.path.join(tmp, 'serial.db'), library_path)
+        start = time.perf_counter()
+        results = [converse(engine, user) for user in range(users)]
+        report("en serie", engine, results, time.perf_counter() - start)
+
+        engine = build_engine(os.path.join(tmp, 'threads.db'), library_path)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(lambda user: converse(engine, user), range(users)))
+        report(f"{workers} threads, 1 motor", engine, results, time.perf_counter() - start)
+        print(f"outbox compartido: {engine.outbox.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 24, int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,72 @@
+"""
+Benchmark: carga masiva de exámenes contra la API falsa local.
+
+Compara el flujo actual (process_uploaded_examination: subir, consultar cada
+1 s, un archivo a la vez) con BulkExamIngestor, y verifica la reanudación:
+una segunda corrida con el mismo manifest no vuelve a subir nada.
+
+Uso: python benchmarks/bench_exam_ingestion.py [n_pdfs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from exam_ingestion import JOB_COMPLETED_STATUSES, BulkExamIngestor, ExaminationsClient, IngestionManifest  # noqa: E402
+from fake_examinations_api import FakeExaminationsApi  # noqa: E402
+
+SEQUENTIAL_SAMPLE = 5
+
+
+def sequential_ingest(client, files):
+    """El flujo de process_uploaded_examination, archivo por archivo"""
+    for _, path in files:
+        with open(path, 'rb') as f:
+            job_id = client.upload(os.path.basename(path), f.read())
+        for _ in range(120):
+            time.sleep(1)
+            status = client.job_status(job_id)
+            if status.get('status', '').lower() in JOB_COMPLETED_STATUSES:
+                if status.get('response', {}).get('success'):
+                    client.analysis(job_id)
+                break
+
+
+def run(n_pdfs):
+    fake = FakeExaminationsApi(min_seconds=1.0, max_seconds=4.0)
+    base_url = fake.start()
+    client = ExaminationsClient(base_url, "token")
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(n_pdfs):
+            path = os.path.join(tmp, "pdfs", f"examen_{i:05d}.pdf")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"%PDF-1.4\n" + os.urandom(20000) + b"\n%%EOF\n")
+            files.append((os.path.basename(path), path))
+
+        start = time.perf_counter()
+        sequential_ingest(client, files[:SEQUENTIAL_SAMPLE])
+        per_file = (time.perf_counter() - start) / SEQUENTIAL_SAMPLE
+        print(f"secuencial (muestra de {SEQUENTIAL_SAMPLE}): {60 / per_file:.1f} archivos/min")
+
+        output = os.path.join(tmp, "analisis")
+        manifest = IngestionManifest(os.path.join(tmp, "manifest.jsonl"))
+        report = BulkExamIngestor(client, manifest, output, log=lambda message: None).run(files)
+        manifest.close()
+        print(f"en tubería: {report['files_per_minute']} archivos/min, {report}")
+
+        uploads_before = fake.requests['upload']
+        manifest = IngestionManifest(os.path.join(tmp, "manifest.jsonl"))
+        report = BulkExamIngestor(client, manifest, output, log=lambda message: None).run(files)
+        manifest.close()
+        print(f"reanudación: {report['skipped']} saltados, {fake.requests['upload'] - uploads_before} subidas nuevas, "
+              f"{report['failed']} con error al reintentar")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,79 @@
+"""
+Benchmark: KeywordMatcher (Aho-Corasick, una pasada) vs. los escaneos
+`any(k in texto for k in lista)` por categoría.
+
+Uso: python benchmarks/bench_keyword_matcher.py [n_mensajes]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KEYWORD_CATEGORIES, KeywordMatcher  # noqa: E402
+
+SAMPLE_MESSAGES = [
+    "Hola, no me llegó el código",
+    "Quiero agendar una cita para un chequeo preventivo",
+    "revisa mi examen por favor",
+    "Lab. Blanco",
+    "otro laboratorio",
+    "muchas gracias, eso es todo",
+    "sí, claro",
+    "no, gracias",
+    "Buenas tardes, ¿me puedes enviar otro código? Revisé el spam y no aparece nada",
+    "123456",
+    "Me gustaría saber qué significan mis resultados de hemoglobina y si debo preocuparme por algo",
+]
+
+
+def legacy_scan(text):
+    """Una pasada por palabra clave, como en los handlers originales"""
+    text_lower = text.lower()
+    return frozenset(
+        category for category, keywords in KEYWORD_CATEGORIES.items()
+        if any(keyword in text_lower for keyword in keywords)
+    )
+
+
+def run(n_messages):
+    rng = random.Random(11)
+    # Mensajes únicos para medir el recorrido del autómata sin el efecto de la caché
+    messages = [f"{rng.choice(SAMPLE_MESSAGES)} #{i}" for i in range(n_messages)]
+    matcher = KeywordMatcher(KEYWORD_CATEGORIES, cache_size=0)
+    cached = KeywordMatcher(KEYWORD_CATEGORIES)
+    n_keywords = sum(len(k) for k in KEYWORD_CATEGORIES.values())
+
+    start = time.perf_counter()
+    for message in messages:
+        legacy_scan(message)
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        matcher.match(message)
+    ac_s = time.perf_counter() - start
+
+    # En un turno real el mismo mensaje se consulta varias veces (reenvío, despedida, saludo...)
+    start = time.perf_counter()
+    for message in messages:
+        for _ in range(3):
+            cached.match(message)
+    cached_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        for _ in range(3):
+            legacy_scan(message)
+    legacy3_s = time.perf_counter() - start
+
+    print(f"mensajes: {n_messages}, palabras clave: {n_keywords}, categorías: {len(KEYWORD_CATEGORIES)}")
+    print(f"escaneo lineal (todas las categorías): {legacy_s / n_messages * 1e6:.2f} µs/mensaje")
+    print(f"Aho-Corasick con normalización:        {ac_s / n_messages * 1e6:.2f} µs/mensaje")
+    print(f"3 consultas por turno, lineal:         {legacy3_s / n_messages * 1e6:.2f} µs/turno")
+    print(f"3 consultas por turno, con caché:      {cached_s / n_messages * 1e6:.2f} µs/turno")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,103 @@
+"""
+Benchmark: latencia de punta a punta de un examen, lectura local vs pipeline remoto.
+
+Replica process_uploaded_examination (chequeo local, lectura local de Lab.
+Blanco y, si no es confiable, subida + consulta cada 1 s + análisis) contra
+la API falsa local, y lo compara con enviar siempre el PDF al pipeline
+remoto. Incluye informes que deben derivarse a la API (parámetro no
+reconocido, PDF escaneado) para medir el costo del intento local fallido.
+
+Uso: python benchmarks/bench_local_exam_parser.py [repeticiones_remotas]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pdf_precheck import build_pdf  # noqa: E402
+from exam_ingestion import JOB_COMPLETED_STATUSES, ExaminationsClient  # noqa: E402
+from fake_examinations_api import FakeExaminationsApi  # noqa: E402
+from local_exam_parser import LocalExamParser  # noqa: E402
+from medical_ranges import PARAMETER_ALIASES, RANGES  # noqa: E402
+from parameter_normalizer import ParameterNormalizer  # noqa: E402
+from pdf_precheck import PdfPrecheck  # noqa: E402
+
+LOCAL_REPETITIONS = 200
+HEADER = ["Laboratorio Blanco - Informe de resultados", "Paciente: Juan Perez", "Edad: 45 años",
+          "Examen|Resultado|Unidad|Valor de referencia"]
+UNITS = {"INR": "", "Hematocrito": "%", "Linfocitos": "%", "Neutrófilos": "%", "Monocitos": "%",
+         "Eosinófilos": "%", "Basófilos": "%", "Porcentaje (Protrombina)": "%"}
+
+
+def report_rows():
+    """Una fila por parámetro de RANGES; Hemoglobina y Glicemia fuera de rango"""
+    rows = []
+    for name, (low, high) in RANGES.items():
+        value = high * 1.2 if name in ("Hemoglobina", "Glicemia Basal") else (low + high) / 2
+        rows.append(f"{name}|{value:.1f}".replace('.', ',') + f"|{UNITS.get(name, 'mg/dL')}|{low} - {high}")
+    return rows
+
+
+def remote_analysis(client, data):
+    """Pipeline remoto como en process_uploaded_examination: subir, consultar cada 1 s, análisis"""
+    job_id = client.upload('examen.pdf', data)
+    for _ in range(120):
+        time.sleep(1)
+        status = client.job_status(job_id)
+        if status.get('status', '').lower() in JOB_COMPLETED_STATUSES:
+            return client.analysis(job_id) if status.get('response', {}).get('success') else None
+    return None
+
+
+def end_to_end(precheck, parser, client, data):
+    """(camino usado, análisis) siguiendo el orden de process_uploaded_examination"""
+    if not precheck.check(data).ok:
+        return 'rechazado', None
+    local = parser.parse(data)
+    if local.analysis is not None:
+        return 'local', local.analysis
+    return f"remoto ({local.fallback_reason})", remote_analysis(client, data)
+
+
+def run(remote_repetitions):
+    fake = FakeExaminationsApi(min_seconds=1.0, max_seconds=4.0, fail_rate=0.0)
+    client = ExaminationsClient(fake.start(), "token")
+    precheck = PdfPrecheck(RANGES.keys(), PARAMETER_ALIASES.keys())
+    parser = LocalExamParser(ParameterNormalizer(RANGES, PARAMETER_ALIASES), RANGES)
+
+    rows = report_rows()
+    samples = {
+        'Lab. Blanco, tabla 2 págs.': build_pdf([HEADER + rows[:11], HEADER + rows[11:]], table=True),
+        'Lab. Blanco, líneas': build_pdf([[HEADER[0]] + [row.replace('|', ' ') for row in rows]]),
+        'parámetro no reconocido': build_pdf([HEADER + rows + ["Colesterol HDL|45|mg/dL|> 40"]], table=True),
+        'escaneado (sin texto)': build_pdf([[]] * 2, image_only=True),
+    }
+    for name, data in samples.items():
+        path, analysis = end_to_end(precheck, parser, client, data)
+        repetitions = LOCAL_REPETITIONS if path == 'local' else remote_repetitions
+        latencies = []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            end_to_end(precheck, parser, client, data)
+            latencies.append(time.perf_counter() - start)
+        metadata = (analysis or {}).get('metadata', {})
+        print(f"{name:28s} {path:28s} mediana {statistics.median(latencies) * 1000:9.2f} ms  "
+              f"parámetros={metadata.get('parameters_found_count')} "
+              f"fuera de rango={metadata.get('parameters_out_of_range_count')}")
+
+    data = samples['Lab. Blanco, tabla 2 págs.']
+    latencies = []
+    for _ in range(remote_repetitions):
+        start = time.perf_counter()
+        remote_analysis(client, data)
+        latencies.append(time.perf_counter() - start)
+    print(f"{'Lab. Blanco, solo remoto':28s} {'remoto':28s} mediana {statistics.median(latencies) * 1000:9.2f} ms")
+    print(f"parser: {parser.snapshot()}")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,93 @@
+"""
+Benchmark: enrutamiento de modelos por tarea con degradación por p95.
+
+Usa un cliente Bedrock falso con latencias simuladas por modelo (escaladas a
+milisegundos reales con sleep). Compara una mezcla de turnos atendida:
+  - siempre por el modelo grande (comportamiento anterior),
+  - con ModelRouter (clasificación y generación corta en modelos rápidos),
+y luego simula que el modelo de chat se pone lento para mostrar la
+degradación automática al modelo de respaldo.
+
+Uso: python benchmarks/bench_model_router.py [n_turnos]
+"""
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_gateway import BedrockGateway  # noqa: E402
+from model_router import (DEFAULT_ROUTES, TASK_CLASSIFICATION, TASK_CONTEXTUAL_CHAT,  # noqa: E402
+                          TASK_SHORT_GENERATION, ModelRoute, ModelRouter, p95)
+
+LARGE_MODEL = DEFAULT_ROUTES[TASK_CONTEXTUAL_CHAT].models[0]
+# Latencia simulada (ms) por modelo; se divide por SCALE para que el benchmark sea rápido
+SIMULATED_MS = {
+    LARGE_MODEL: 2400,
+    "us.anthropic.claude-haiku-4-5-20251001-v1:0": 900,
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0": 600,
+    "anthropic.claude-3-haiku-20240307-v1:0": 400,
+}
+SCALE = 200
+
+# Mezcla típica de llamadas por turno
+TURN_MIX = [TASK_CLASSIFICATION, TASK_CLASSIFICATION, TASK_SHORT_GENERATION, TASK_CONTEXTUAL_CHAT]
+
+
+class FakeBedrockClient:
+    def __init__(self, rng, slowdown=None):
+        self.rng = rng
+        self.slowdown = slowdown or {}
+
+    def invoke_model(self, modelId, body):
+        base = SIMULATED_MS[modelId] * self.slowdown.get(modelId, 1)
+        time.sleep(base * self.rng.uniform(0.7, 1.4) / 1000 / SCALE)
+        result = {'content': [{'type': 'text', 'text': 'POSITIVA'}]}
+        return {'body': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+
+def run_mix(gateway, n_turns, routed):
+    latencies = {task: [] for task in set(TURN_MIX)}
+    for _ in range(n_turns):
+        for task in TURN_MIX:
+            start = time.perf_counter()
+            if routed:
+                gateway.invoke_text("instrucciones", "mensaje", 10, task=task)
+            else:
+                gateway.invoke_text("instrucciones", "mensaje", 10)
+            latencies[task].append((time.perf_counter() - start) * 1000 * SCALE)
+    return latencies
+
+
+def report(title, latencies):
+    print(title)
+    for task in (TASK_CLASSIFICATION, TASK_SHORT_GENERATION, TASK_CONTEXTUAL_CHAT):
+        print(f"  {task:<17} p95 {p95(latencies[task]):>6,.0f} ms (simulados)")
+
+
+def run(n_turns):
+    rng = random.Random(11)
+    baseline = BedrockGateway(FakeBedrockClient(rng), LARGE_MODEL)
+    report("modelo grande para todo:", run_mix(baseline, n_turns, routed=False))
+
+    routed = BedrockGateway(FakeBedrockClient(rng), LARGE_MODEL, router=ModelRouter(DEFAULT_ROUTES))
+    report("con enrutamiento por tarea:", run_mix(routed, n_turns, routed=True))
+
+    # El modelo de chat se pone 3x más lento: p95 > presupuesto → baja al respaldo
+    # (los presupuestos se escalan igual que las latencias simuladas)
+    routes = {task: ModelRoute(route.models, route.latency_budget_ms / SCALE) for task, route in DEFAULT_ROUTES.items()}
+    router = ModelRouter(routes, min_samples=10)
+    degraded = BedrockGateway(FakeBedrockClient(rng, slowdown={LARGE_MODEL: 3}), LARGE_MODEL, router=router)
+    latencies = run_mix(degraded, n_turns, routed=True)
+    chat = latencies[TASK_CONTEXTUAL_CHAT]
+    print("chat con modelo grande lento (3x):")
+    print(f"  primeras {router.min_samples} llamadas p95 {p95(chat[:router.min_samples]):>6,.0f} ms (simulados)")
+    print(f"  resto                   p95 {p95(chat[router.min_samples:]):>6,.0f} ms (simulados)")
+    print(f"  chat degradado a {router.snapshot()[TASK_CONTEXTUAL_CHAT]['model']}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
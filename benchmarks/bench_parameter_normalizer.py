@@ -0,0 +1,73 @@
+"""
+Benchmark: normalizador precompilado vs. extract_parameter original.
+
+Uso: python benchmarks/bench_parameter_normalizer.py [n_items]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ranges import RANGES, PARAMETER_ALIASES  # noqa: E402
+from parameter_normalizer import ParameterNormalizer  # noqa: E402
+
+
+def legacy_extract_parameter(analysis_results):
+    """Copia de la implementación anterior, usada como línea base"""
+    if "VALOR " in analysis_results:
+        start = analysis_results.find("VALOR ") + 6
+        end = analysis_results.find(".", start)
+        if end == -1:
+            end = len(analysis_results)
+        param = analysis_results[start:end].strip()
+        corrections = {
+            "Glisea Basal": "Glicemia Basal",
+            "Recuendo de Eritrocitos": "Recuento de Eritrocitos"
+        }
+        return corrections.get(param, param)
+    elif "Recomendacion" in analysis_results or "recomendacion" in analysis_results:
+        start = analysis_results.find("Recomendacion") + 13 if "Recomendacion" in analysis_results else analysis_results.find("recomendacion") + 13
+        param = analysis_results[start:].strip()
+        return param
+    else:
+        return "Desconocido"
+
+
+def build_corpus(n_items, seed=7):
+    rng = random.Random(seed)
+    names = list(RANGES) + list(PARAMETER_ALIASES) + ["Colesterol Total", "Parametro Raro"]
+    filler = " El valor se encuentra dentro del rango esperado para la edad del paciente." * 3
+    items = []
+    for _ in range(n_items):
+        name = rng.choice(names)
+        text = f"VALOR {name}.{filler}" if rng.random() < 0.9 else f"Sin datos.{filler}"
+        items.append({"analysis_results": text, "value": round(rng.uniform(0, 200), 1)})
+    return items
+
+
+def run(n_items):
+    items = build_corpus(n_items)
+    normalizer = ParameterNormalizer(RANGES, PARAMETER_ALIASES)
+
+    start = time.perf_counter()
+    legacy = {}
+    for item in items:
+        legacy[legacy_extract_parameter(item['analysis_results'])] = item['value']
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = normalizer.build_results(items)
+    new_s = time.perf_counter() - start
+
+    canonical_hits = sum(1 for k in results if k in RANGES)
+    print(f"items: {n_items}")
+    print(f"legacy extract_parameter: {n_items / legacy_s:,.0f} items/s ({legacy_s * 1000:.1f} ms)")
+    print(f"ParameterNormalizer:      {n_items / new_s:,.0f} items/s ({new_s * 1000:.1f} ms)")
+    print(f"parámetros canónicos reconocidos: {canonical_hits}/{len(RANGES)}")
+    print(f"etiquetas no reconocidas: {normalizer.report_unmatched()[:5]}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,100 @@
+"""
+Benchmark: chequeo local de PDFs antes de subirlos al pipeline de exámenes.
+
+Genera PDFs sintéticos (examen de laboratorio, documento que no es examen,
+PDF escaneado sin capa de texto, archivo truncado, imagen renombrada y un PDF
+con demasiadas páginas), mide cuánto tarda el chequeo de cada uno y muestra
+la decisión. Un rechazo local evita la subida y un ciclo completo del job
+remoto (segundos a minutos).
+
+Uso: python benchmarks/bench_pdf_precheck.py [repeticiones]
+"""
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ranges import PARAMETER_ALIASES, RANGES  # noqa: E402
+from pdf_precheck import PdfPrecheck  # noqa: E402
+
+EXAM_LINES = [
+    "Laboratorio Blanco - Informe de resultados", "Paciente: Juan Perez", "Hemograma",
+    "Hemoglobina 14.2 g/dL (13.0 - 17.0)", "Hematocrito 42 % (40 - 50)", "Recuento de Leucocitos 6.800 /uL",
+    "Recuento de Plaquetas 250.000 /uL", "Glicemia Basal 92 mg/dL (70 - 100)", "Uremia 30 mg/dL",
+]
+INVOICE_LINES = [
+    "Factura electronica numero 45812", "Senores: Comercial Los Andes Limitada",
+    "Detalle de la compra realizada en nuestra tienda durante el mes de octubre",
+    "Servicio de transporte de carga entre Santiago y Valparaiso, incluye seguro",
+    "Arriendo de bodega por treinta dias con acceso las veinticuatro horas",
+    "Total a pagar en la fecha de vencimiento indicada en este documento",
+]
+
+
+def _table_content(lines):
+    """Filas "celda|celda|..." escritas columna por columna con Tm, como los generadores de informes"""
+    cells = [line.split('|') for line in lines]
+    shown = []
+    for column, x in enumerate((50, 300, 380, 450)):
+        for row, line_cells in enumerate(cells):
+            if column < len(line_cells):
+                shown.append(b"1 0 0 1 %d %d Tm (%s) Tj" % (x, 800 - 14 * row, line_cells[column].encode('latin-1')))
+    return b"BT /F1 10 Tf " + b" ".join(shown) + b" ET"
+
+
+def build_pdf(pages_lines, image_only=False, table=False):
+    """PDF mínimo válido: una página por lista de líneas, contenido comprimido con Flate"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages_lines:
+        if image_only:
+            content = b"q 595 0 0 842 0 0 cm /Im1 Do Q"
+        elif table:
+            content = _table_content(lines)
+        else:
+            shown = b" ".join(b"(" + line.encode('latin-1') + b") Tj 0 -14 Td" for line in lines)
+            content = b"BT /F1 10 Tf 50 800 Td " + shown + b" ET"
+        stream = zlib.compress(content)
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /Contents %d 0 R /Resources << /Font << /F1 3 0 R >> >> >>"
+                       % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def run(repetitions):
+    precheck = PdfPrecheck(RANGES.keys(), PARAMETER_ALIASES.keys())
+    exam = build_pdf([EXAM_LINES, EXAM_LINES[3:] * 3])
+    samples = {
+        'examen Lab. Blanco': exam,
+        'factura (no es examen)': build_pdf([INVOICE_LINES * 3]),
+        'escaneado (sin texto)': build_pdf([[]] * 2, image_only=True),
+        'truncado': exam[:len(exam) // 2],
+        'imagen renombrada': b"\x89PNG\r\n\x1a\n" + os.urandom(50000),
+        '60 páginas': build_pdf([INVOICE_LINES] * 60),
+    }
+    for name, data in samples.items():
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            result = precheck.check(data)
+        elapsed_ms = (time.perf_counter() - start) / repetitions * 1000
+        verdict = "acepta" if result.ok else f"rechaza ({result.reason})"
+        print(f"{name:24s} {len(data) / 1024:7.1f} KB  {elapsed_ms:6.2f} ms  {verdict}; "
+              f"páginas={result.pages} letras={result.text_chars} marcadores={sorted(result.markers)[:3]}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,76 @@
+"""
+Benchmark: prompts contextuales con presupuesto de tokens sobre una
+conversación larga reproducida (corpus sintético).
+
+Compara por turno los tokens de entrada estimados de:
+  - historial completo (lo que crece sin límite),
+  - PromptBudgetBuilder con resumen acumulado,
+y el tiempo local de armado del prompt.
+
+Uso: python benchmarks/bench_prompt_budget.py [n_turnos] [presupuesto]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from conversation_context import ConversationContext  # noqa: E402
+from conversation_engine import CONTEXTUAL_PROMPT_TEMPLATE, CONTEXTUAL_SYSTEM_PROMPT  # noqa: E402
+from prompt_budget import PromptBudgetBuilder, RollingSummary, estimate_tokens, format_history_line  # noqa: E402
+
+
+USER_LINES = [
+    "Hola, quiero revisar mis resultados",
+    "¿Qué significa tener la hemoglobina baja?",
+    "Sí, me gustaría agendar una cita",
+    "¿Puedo cambiar la hora de mi cita para la tarde?",
+    "Gracias, ¿y qué debo comer para mejorar el hierro?",
+    "Tengo dudas sobre la glicemia basal que salió en 105",
+]
+ASSISTANT_LINE = ("Entiendo tu consulta. Según tus resultados, te recomiendo mantener una alimentación "
+                  "balanceada y conversar con tu médico para una evaluación más detallada. ")
+
+
+def run(n_turns, budget):
+    rng = random.Random(3)
+    system_prompt = CONTEXTUAL_SYSTEM_PROMPT
+    template = CONTEXTUAL_PROMPT_TEMPLATE
+    builder = PromptBudgetBuilder(budget)
+    summary = RollingSummary()
+    context = ConversationContext()
+    messages = []
+
+    full_tokens = budget_tokens = 0
+    build_seconds = 0.0
+    max_budgeted = 0
+    for turn in range(n_turns):
+        user_message = rng.choice(USER_LINES)
+        messages.append({"role": "user", "content": user_message})
+        header = context.render(messages, 'completed', 'Ana')
+
+        history = "\n".join(format_history_line(m) for m in messages[:-1])
+        full_prompt = template.format(context=f"{header}\n{history}", user_message=user_message)
+        full_tokens += estimate_tokens(system_prompt) + estimate_tokens(full_prompt)
+
+        start = time.perf_counter()
+        budgeted = builder.build(template, system_prompt, user_message, messages, summary, context_header=header)
+        build_seconds += time.perf_counter() - start
+        budget_tokens += budgeted.estimated_tokens
+        max_budgeted = max(max_budgeted, budgeted.estimated_tokens)
+
+        messages.append({"role": "assistant", "content": ASSISTANT_LINE * rng.randint(1, 3)})
+        summary.wait()
+
+    print(f"turnos: {n_turns}, presupuesto: {budget} tokens")
+    print(f"historial completo:   {full_tokens / n_turns:,.0f} tokens/turno promedio")
+    print(f"con presupuesto:      {budget_tokens / n_turns:,.0f} tokens/turno promedio (máximo {max_budgeted})")
+    print(f"ahorro de entrada:    {100 * (1 - budget_tokens / full_tokens):.1f}%")
+    print(f"armado del prompt:    {build_seconds / n_turns * 1e6:.0f} µs/turno (resumen fuera del turno)")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1500)
@@ -0,0 +1,106 @@
+"""
+Benchmark: prefijo `system` cacheable en las llamadas a Bedrock.
+
+Reproduce un turno típico (intención + respuesta contextual) contra un cliente
+Bedrock falso que imita el caché de prompts: el prefijo marcado con
+cache_control se cobra completo la primera vez y como lectura de caché en las
+siguientes, y reporta `usage` como lo hace Bedrock. Compara los tokens de
+entrada no cacheados sin marcadores, con cada instrucción como su propio
+prefijo y con el prefijo compartido (SHARED_INSTRUCTIONS), y verifica que la
+contabilidad local (sin `usage`) coincide con la del servicio.
+
+Las llamadas se enrutan con las rutas por defecto (intención en Haiku,
+contextual en Sonnet) y el cliente exige el mínimo cacheable de cada modelo,
+así que el prefijo compartido solo se usa donde de verdad se cachea.
+
+Uso: python benchmarks/bench_prompt_cache.py [n_turnos]
+"""
+import io
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bedrock_gateway import BedrockGateway, cache_min_tokens  # noqa: E402
+from conversation_engine import CONTEXTUAL_SYSTEM_PROMPT, INTENT_ANALYSIS_INSTRUCTIONS, SHARED_INSTRUCTIONS  # noqa: E402
+from model_router import DEFAULT_ROUTES, TASK_CLASSIFICATION, TASK_CONTEXTUAL_CHAT, ModelRouter  # noqa: E402
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, estimate_tokens  # noqa: E402
+
+
+class FakeBedrockClient:
+    """Cliente local con la misma interfaz que boto3 bedrock-runtime.invoke_model"""
+
+    def __init__(self, report_usage=True):
+        self.report_usage = report_usage
+        self.cached_prefixes = set()
+        self.calls = 0
+
+    def invoke_model(self, modelId, body):
+        self.calls += 1
+        request = json.loads(body)
+        system = request.get('system', [])
+        # Como Bedrock: el prefijo cacheado llega hasta el último bloque marcado; el resto se cobra normal
+        marked_upto = max((i + 1 for i, block in enumerate(system) if 'cache_control' in block), default=0)
+        prefix_text = "".join(block['text'] for block in system[:marked_upto])
+        # Bajo el mínimo del modelo el marcador se ignora y todo se cobra como entrada normal
+        marked = marked_upto > 0 and estimate_tokens(prefix_text) >= cache_min_tokens(modelId)
+        prefix = "".join(block['text'] for block in (system[:marked_upto] if marked else system))
+        tail = "".join(block['text'] for block in system[marked_upto:]) if marked else ""
+        suffix_tokens = estimate_tokens(tail + request['messages'][0]['content'])
+
+        usage = {'input_tokens': suffix_tokens, 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        key = (modelId, prefix)
+        if marked and key in self.cached_prefixes:
+            usage['cache_read_input_tokens'] = estimate_tokens(prefix)
+        elif marked:
+            usage['cache_creation_input_tokens'] = estimate_tokens(prefix)
+            self.cached_prefixes.add(key)
+        else:
+            usage['input_tokens'] += estimate_tokens(prefix)
+
+        result = {'content': [{'type': 'text', 'text': 'POSITIVA'}]}
+        if self.report_usage:
+            result['usage'] = usage
+        return {'body': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+
+def run_turns(gateway, n_turns):
+    for turn in range(n_turns):
+        gateway.invoke_text(INTENT_ANALYSIS_INSTRUCTIONS, f'Contexto: confirmando cita\nMensaje del usuario: "sí, turno {turn}"',
+                            10, task=TASK_CLASSIFICATION)
+        gateway.invoke_text(CONTEXTUAL_SYSTEM_PROMPT, f"CONTEXTO CONVERSACIONAL ACTUAL:\nEstado: completado\n\nUsuario: consulta {turn}\n\nBianca:",
+                            1000, task=TASK_CONTEXTUAL_CHAT, budget_tokens=DEFAULT_PROMPT_TOKEN_BUDGET)
+    return gateway.accounting.snapshot()
+
+
+def build_gateway(client, **kwargs):
+    return BedrockGateway(client, 'modelo', router=ModelRouter(DEFAULT_ROUTES), **kwargs)
+
+
+def run(n_turns):
+    shared_tokens = estimate_tokens(BedrockGateway(None, 'modelo', shared_instructions=SHARED_INSTRUCTIONS).shared_prefix)
+    print(f"prefijos: intención {estimate_tokens(INTENT_ANALYSIS_INSTRUCTIONS)} tokens, "
+          f"contextual {estimate_tokens(CONTEXTUAL_SYSTEM_PROMPT)} tokens, compartido {shared_tokens} tokens")
+    for task in (TASK_CLASSIFICATION, TASK_CONTEXTUAL_CHAT):
+        model_id = DEFAULT_ROUTES[task].models[0]
+        print(f"  {task}: {model_id} (mínimo cacheable {cache_min_tokens(model_id)} tokens)")
+    print(f"turnos: {n_turns}\n")
+
+    baseline = run_turns(build_gateway(FakeBedrockClient(), enable_prompt_cache=False), n_turns)
+    cached = run_turns(build_gateway(FakeBedrockClient()), n_turns)
+    shared = run_turns(build_gateway(FakeBedrockClient(), shared_instructions=SHARED_INSTRUCTIONS), n_turns)
+    local = run_turns(build_gateway(FakeBedrockClient(report_usage=False), shared_instructions=SHARED_INSTRUCTIONS),
+                      n_turns)
+
+    print(f"sin marcadores:       {baseline['uncached_input_tokens']:,} tokens no cacheados")
+    for label, totals in (("prefijo por tarea", cached), ("prefijo compartido", shared)):
+        print(f"{label + ':':22s}{totals['uncached_input_tokens']:,} no cacheados + {totals['cached_input_tokens']:,} "
+              f"leídos de caché ({100 * totals['cached_ratio']:.1f}%), ahorro no cacheado "
+              f"{100 * (1 - totals['uncached_input_tokens'] / baseline['uncached_input_tokens']):.1f}%")
+    print(f"contabilidad local:   {'coincide' if local == shared else 'NO coincide'} con usage del servicio")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,80 @@
+"""
+Benchmark: recordatorios persistentes con millones de pendientes.
+
+Agenda N recordatorios repartidos en 30 días (en lotes, como una carga
+masiva), simula un reinicio (instancia nueva sobre el mismo archivo: solo la
+ventana próxima sube a memoria) y despacha los vencidos con un sender falso
+limitado a `rate` mensajes por segundo.
+
+Uso: python benchmarks/bench_reminder_scheduler.py [n_recordatorios] [rate]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminder_scheduler import ReminderScheduler  # noqa: E402
+
+SCHEDULE_BATCH = 10000
+DUE_NOW = 2000
+HORIZON_SECONDS = 30 * 86400
+
+
+class FakeWhatsApp:
+    """Cuenta envíos; falla el 2% para ejercitar los reintentos"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, to_number, message):
+        time.sleep(0.002)
+        if self.rng.random() < 0.02:
+            raise ConnectionError("Twilio 503")
+        with self._lock:
+            self.sent += 1
+
+
+def run(n_reminders, rate):
+    rng = random.Random(11)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "reminders.db")
+        scheduler = ReminderScheduler(path)
+
+        start = time.perf_counter()
+        for first in range(0, n_reminders, SCHEDULE_BATCH):
+            scheduler.schedule_many(
+                (f"cita-{i}:24h", f"whatsapp:+569{i:08d}",
+                 now - rng.random() * 60 if i < DUE_NOW else now + rng.random() * HORIZON_SECONDS,
+                 "⏰ Recordatorio de tu cita", None)
+                for i in range(first, min(first + SCHEDULE_BATCH, n_reminders))
+            )
+        elapsed = time.perf_counter() - start
+        print(f"agendar {n_reminders:,}: {elapsed:.1f} s ({n_reminders / elapsed:,.0f}/s), "
+              f"archivo {os.path.getsize(path) / 2 ** 20:,.0f} MB")
+
+        whatsapp = FakeWhatsApp(rng)
+        start = time.perf_counter()
+        restarted = ReminderScheduler(path, send=whatsapp.send, rate_per_second=rate,
+                                      base_backoff_seconds=0.05, max_backoff_seconds=0.2)
+        restarted.start()
+        print(f"reinicio: ventana cargada en {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"~{restarted.snapshot()['in_memory']:,} en memoria de {n_reminders:,} pendientes")
+
+        start = time.perf_counter()
+        while restarted.snapshot()['sent'] + restarted.snapshot()['failed'] < DUE_NOW:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        snapshot = restarted.snapshot()
+        print(f"despacho de {DUE_NOW:,} vencidos: {elapsed:.1f} s ({whatsapp.sent / elapsed:,.0f} msg/s, límite {rate:g}/s)")
+        print(f"estado: {snapshot}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, float(sys.argv[2]) if len(sys.argv) > 2 else 500)
@@ -0,0 +1,96 @@
+"""
+Benchmark: resultados del usuario con GETs condicionales (ETag) vs. descarga y
+parseo completo en cada consulta, contra un servidor falso.
+
+El servidor responde 304 si el ETag coincide; a mitad de la corrida llegan
+resultados nuevos (cambia el ETag). También se prueba un servidor sin
+validadores (TTL de respaldo).
+
+Uso: python benchmarks/bench_response_cache.py [n_consultas]
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_ranges import RANGES, PARAMETER_ALIASES  # noqa: E402
+from parameter_normalizer import ParameterNormalizer  # noqa: E402
+from response_cache import ConditionalResponseCache  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = body.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class FakeResultsServer:
+    def __init__(self, with_validators=True):
+        self.with_validators = with_validators
+        self.full_responses = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.set_results(1)
+
+    def set_results(self, version):
+        items = [{"analysis_results": f"VALOR {name}. Resultado versión {version}", "value": (low + high) / 2}
+                 for name, (low, high) in RANGES.items()] * 10
+        self.body = json.dumps(items).encode('utf-8')
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+
+    def get(self, headers):
+        if self.with_validators and headers.get('If-None-Match') == self.etag:
+            self.not_modified += 1
+            return FakeResponse(304, headers={'ETag': self.etag})
+        self.full_responses += 1
+        self.bytes_sent += len(self.body)
+        return FakeResponse(200, self.body, {'ETag': self.etag} if self.with_validators else {})
+
+
+def run(n_queries):
+    normalizer = ParameterNormalizer(RANGES, PARAMETER_ALIASES)
+
+    def parse(response):
+        if response.status_code != 200:
+            raise Exception(f"Error obteniendo resultados: {response.status_code}")
+        return normalizer.build_results(response.json())
+
+    server = FakeResultsServer()
+    start = time.perf_counter()
+    for i in range(n_queries):
+        if i == n_queries // 2:
+            server.set_results(2)
+        parse(server.get({}))
+    uncached = time.perf_counter() - start
+    print(f"sin caché:          {server.full_responses} respuestas completas, "
+          f"{server.bytes_sent / 1024:,.0f} KB, {uncached / n_queries * 1e6:,.0f} µs/consulta")
+
+    server = FakeResultsServer()
+    cache = ConditionalResponseCache()
+    start = time.perf_counter()
+    for i in range(n_queries):
+        if i == n_queries // 2:
+            server.set_results(2)
+        cache.fetch('results-user', ('results', 'token'), server.get, parse)
+    cached = time.perf_counter() - start
+    print(f"con ETag:           {server.full_responses} completas + {server.not_modified} 304, "
+          f"{server.bytes_sent / 1024:,.0f} KB, {cached / n_queries * 1e6:,.0f} µs/consulta (sin latencia de red)")
+    print(f"estadísticas:       {cache.snapshot()}")
+
+    server = FakeResultsServer(with_validators=False)
+    cache = ConditionalResponseCache(fallback_ttl_seconds=30)
+    for _ in range(n_queries):
+        cache.fetch('results-user', ('results', 'token'), server.get, parse)
+    print(f"sin validadores:    {server.full_responses} respuesta(s) completa(s) en la ventana de TTL; {cache.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,97 @@
+"""
+Prueba de concurrencia: N empleados de la misma empresa piden productos y
+proveedores al mismo tiempo contra un upstream falso (latencia simulada).
+
+Sin agrupación cada llamador hace su propia petición; con SingleFlight las
+llamadas idénticas concurrentes comparten una sola. También verifica que un
+401 del líder no se comparte: los demás llamadores reintentan con su token.
+
+Uso: python benchmarks/bench_singleflight.py [n_llamadores]
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight  # noqa: E402
+
+UPSTREAM_SECONDS = 0.2
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeUpstream:
+    """Cuenta las peticiones que llegan por URL"""
+
+    def __init__(self, invalid_tokens=()):
+        self.hits = Counter()
+        self.invalid_tokens = set(invalid_tokens)
+        self._lock = threading.Lock()
+
+    def get(self, url, token):
+        with self._lock:
+            self.hits[url] += 1
+        time.sleep(UPSTREAM_SECONDS)
+        if token in self.invalid_tokens:
+            return FakeResponse(401, {})
+        return FakeResponse(200, {'products': ['Chequeo preventivo']})
+
+
+def run_callers(n_callers, call):
+    barrier = threading.Barrier(n_callers)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker(i):
+        barrier.wait()
+        status = call(i)
+        with lock:
+            statuses[status] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, statuses
+
+
+def run(n_callers):
+    url = "https://api.example/api/companies/7/products"
+
+    upstream = FakeUpstream()
+    elapsed, _ = run_callers(n_callers, lambda i: upstream.get(url, f"token-{i}").status_code)
+    print(f"sin agrupar:  {n_callers} llamadores → {upstream.hits[url]} peticiones upstream ({elapsed:.2f} s)")
+
+    upstream = FakeUpstream()
+    flight = SingleFlight()
+    elapsed, statuses = run_callers(n_callers, lambda i: flight.do(
+        'products', url, lambda: upstream.get(url, f"token-{i}"),
+        share_if=lambda response: response.status_code == 200).status_code)
+    print(f"SingleFlight: {n_callers} llamadores → {upstream.hits[url]} petición upstream ({elapsed:.2f} s), "
+          f"status {dict(statuses)}, contadores {flight.snapshot()}")
+    assert upstream.hits[url] == 1, "se esperaba una sola petición upstream"
+
+    # Todos los tokens fallan: el 401 no se comparte y cada uno reintenta con el suyo
+    upstream = FakeUpstream(invalid_tokens={f"token-{i}" for i in range(n_callers)})
+    flight = SingleFlight()
+    _, statuses = run_callers(n_callers, lambda i: flight.do(
+        'products', url, lambda: upstream.get(url, f"token-{i}"),
+        share_if=lambda response: response.status_code == 200).status_code)
+    print(f"401 del líder: {upstream.hits[url]} peticiones upstream, status {dict(statuses)}, "
+          f"contadores {flight.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
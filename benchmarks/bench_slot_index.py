@@ -0,0 +1,102 @@
+"""
+Benchmark: índice de disponibilidad (bitmap por día) para miles de clínicas en
+un horizonte de 60 días, vs. buscar en la lista de citas en cada consulta.
+
+Mide carga en bloque, memoria, y el costo de las consultas que hacen los
+selectores de día y hora (próximos días con horas libres, horas libres del
+día) más la reserva.
+
+Uso: python benchmarks/bench_slot_index.py [n_clinicas] [ocupación 0-1]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slot_index import DEFAULT_HORIZON_DAYS, DEFAULT_SLOT_HOURS, SlotAvailabilityIndex  # noqa: E402
+
+N_QUERIES = 20000
+
+
+def is_open_day(day):
+    return day.weekday() < 5
+
+
+def synthetic_bookings(n_providers, occupancy, rng):
+    today = date.today()
+    bookings = []
+    for provider_id in range(n_providers):
+        for offset in range(1, DEFAULT_HORIZON_DAYS):
+            day = today + timedelta(days=offset)
+            for hour in DEFAULT_SLOT_HOURS:
+                if rng.random() < occupancy:
+                    bookings.append((provider_id, datetime(day.year, day.month, day.day, hour)))
+    return bookings
+
+
+def naive_free_hours(bookings_by_provider, provider_id, day):
+    taken = {when.hour for when in bookings_by_provider.get(provider_id, ()) if when.date() == day}
+    return [hour for hour in DEFAULT_SLOT_HOURS if hour not in taken]
+
+
+def naive_next_days(bookings_by_provider, provider_id, n):
+    found, current = [], date.today()
+    while len(found) < n:
+        current += timedelta(days=1)
+        if is_open_day(current) and naive_free_hours(bookings_by_provider, provider_id, current):
+            found.append(current)
+    return found
+
+
+def run(n_providers, occupancy):
+    rng = random.Random(5)
+    bookings = synthetic_bookings(n_providers, occupancy, rng)
+    print(f"{n_providers:,} clínicas × {DEFAULT_HORIZON_DAYS} días × {len(DEFAULT_SLOT_HOURS)} horas, "
+          f"{len(bookings):,} citas ({occupancy:.0%} de ocupación)")
+
+    start = time.perf_counter()
+    index = SlotAvailabilityIndex()
+    index.load(bookings)
+    load_seconds = time.perf_counter() - start
+    print(f"carga en bloque: {load_seconds:.2f} s, bitmaps {index.snapshot()['bitmap_bytes'] / 1024:,.0f} KB")
+
+    bookings_by_provider = {}
+    for provider_id, when in bookings:
+        bookings_by_provider.setdefault(provider_id, []).append(when)
+
+    queries = [(rng.randrange(n_providers), date.today() + timedelta(days=rng.randint(1, 20))) for _ in range(N_QUERIES)]
+
+    start = time.perf_counter()
+    for provider_id, _ in queries:
+        index.next_available_days(provider_id, 3, is_open_day=is_open_day)
+    index_days = (time.perf_counter() - start) / N_QUERIES
+    start = time.perf_counter()
+    for provider_id, day in queries:
+        index.free_hours(provider_id, day)
+    index_hours = (time.perf_counter() - start) / N_QUERIES
+    start = time.perf_counter()
+    for provider_id, day in queries:
+        index.book(provider_id, datetime(day.year, day.month, day.day, 12))
+    index_book = (time.perf_counter() - start) / N_QUERIES
+
+    sample = queries[:500]
+    start = time.perf_counter()
+    for provider_id, _ in sample:
+        naive_next_days(bookings_by_provider, provider_id, 3)
+    naive_days = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    for provider_id, day in sample:
+        naive_free_hours(bookings_by_provider, provider_id, day)
+    naive_hours = (time.perf_counter() - start) / len(sample)
+
+    print(f"próximos 3 días libres: índice {index_days * 1e6:.1f} µs vs. lista {naive_days * 1e6:,.0f} µs")
+    print(f"horas libres del día:   índice {index_hours * 1e6:.1f} µs vs. lista {naive_hours * 1e6:,.0f} µs")
+    print(f"reserva (check + set):  índice {index_book * 1e6:.1f} µs")
+    print(f"estado: {index.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, float(sys.argv[2]) if len(sys.argv) > 2 else 0.6)
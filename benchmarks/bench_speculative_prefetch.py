@@ -0,0 +1,69 @@
+"""
+Benchmark: turno 'analyzing' de una reserva confirmada, en serie vs. con la
+consulta de clínicas especulada en paralelo a la clasificación de intención.
+
+Las latencias de Bedrock y de /health-providers se simulan con sleep
+(valores de referencia divididos por SCALE) y se reportan ya reescaladas.
+
+Uso: python benchmarks/bench_speculative_prefetch.py [n_turnos]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speculation import SPECULATION_STATS, SpeculativeCall  # noqa: E402
+
+INTENT_MS = 900       # clasificación con modelo rápido
+PROVIDERS_MS = 350    # GET /api/companies/{id}/health-providers
+SCALE = 10
+
+
+def simulated(ms, rng):
+    time.sleep(ms * rng.uniform(0.8, 1.3) / 1000 / SCALE)
+
+
+def analyze_user_intent(rng):
+    simulated(INTENT_MS, rng)
+    return 'POSITIVA'
+
+
+def get_health_providers(rng):
+    simulated(PROVIDERS_MS, rng)
+    return [{'name': 'Clínica'}]
+
+
+def serial_turn(rng):
+    if analyze_user_intent(rng) == 'POSITIVA':
+        return get_health_providers(rng)
+
+
+def speculative_turn(rng):
+    prefetch = SpeculativeCall(get_health_providers, rng)
+    if analyze_user_intent(rng) == 'POSITIVA':
+        return prefetch.confirm()
+    prefetch.discard()
+
+
+def measure(turn_fn, n_turns, seed):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(n_turns):
+        turn_fn(rng)
+    return (time.perf_counter() - start) / n_turns * 1000 * SCALE
+
+
+def run(n_turns):
+    serial = measure(serial_turn, n_turns, seed=5)
+    speculative = measure(speculative_turn, n_turns, seed=5)
+    print(f"turnos: {n_turns} (reserva confirmada)")
+    print(f"en serie:     {serial:,.0f} ms/turno")
+    print(f"especulativo: {speculative:,.0f} ms/turno")
+    print(f"reducción:    {serial - speculative:,.0f} ms ({100 * (1 - speculative / serial):.1f}%)")
+    print(f"especulaciones: {SPECULATION_STATS.snapshot()}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,121 @@
+"""
+API de exámenes falsa (local) con los mismos endpoints que /api/examinations:
+upload → job_id, job/{id} → estado, analysis-job/{id} → análisis.
+
+Cada job "procesa" entre --min-seconds y --max-seconds; --fail-rate de los
+jobs termina sin éxito. Sirve para probar tools/ingest_exams.py:
+
+    python benchmarks/fake_examinations_api.py --port 8765
+    API_BASE_URL=http://127.0.0.1:8765 EXAM_INGESTION_TOKEN=x python tools/ingest_exams.py carpeta/
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeExaminationsApi:
+    def __init__(self, min_seconds=1.0, max_seconds=4.0, fail_rate=0.02, upload_latency=0.05, seed=1):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.fail_rate = fail_rate
+        self.upload_latency = upload_latency
+        self.rng = random.Random(seed)
+        self.jobs = {}
+        self.requests = {'upload': 0, 'job': 0, 'analysis': 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def upload(self, size):
+        time.sleep(self.upload_latency)
+        with self._lock:
+            self.requests['upload'] += 1
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'ready_at': time.monotonic() + self.rng.uniform(self.min_seconds, self.max_seconds),
+                'success': self.rng.random() >= self.fail_rate, 'size': size
+            }
+        return {'job_id': job_id}
+
+    def job(self, job_id):
+        with self._lock:
+            self.requests['job'] += 1
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if time.monotonic() < job['ready_at']:
+            return {'status': 'Procesando'}
+        response = {'success': True} if job['success'] else {'success': False, 'error_message': 'PDF ilegible'}
+        return {'status': 'Completado', 'response': response}
+
+    def analysis(self, job_id):
+        with self._lock:
+            self.requests['analysis'] += 1
+            if job_id not in self.jobs:
+                return None
+        return {'metadata': {'parameters_found_count': 1, 'parameters_out_of_range_count': 0},
+                'parameters_found': [{'name': 'Glucosa', 'unit_of_measure': 'mg/dL', 'analysis': [{'value': '90'}]}],
+                'parameters_out_of_range': []}
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                payload = json.dumps(body if body is not None else {'error': 'not found'}).encode('utf-8')
+                self.send_response(200 if body is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                size = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(size)
+                self._reply(api.upload(size) if self.path == '/api/examinations/upload' else None)
+
+            def do_GET(self):
+                prefix, _, job_id = self.path.rpartition('/')
+                if prefix == '/api/examinations/job':
+                    self._reply(api.job(job_id))
+                elif prefix == '/api/examinations/analysis-job':
+                    self._reply(api.analysis(job_id))
+                else:
+                    self._reply(None)
+
+        return Handler
+
+    def start(self, port=0):
+        """Levanta el servidor en un thread; retorna la URL base"""
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self.handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--max-seconds", type=float, default=4.0)
+    parser.add_argument("--fail-rate", type=float, default=0.02)
+    args = parser.parse_args()
+    fake = FakeExaminationsApi(args.min_seconds, args.max_seconds, args.fail_rate)
+    print(f"API de exámenes falsa en {fake.start(args.port)} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,278 @@
+import bisect
+import csv
+import json
+import random
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
+from appointment_outbox import RETRYABLE_CLIENT_ERRORS, appointment_idempotency_key
+from slot_index import DEFAULT_SLOT_HOURS, format_slot_datetime
+
+# Citas simultáneas por clínica y hora (una campaña suele tener varios boxes de toma de muestras)
+DEFAULT_SLOT_CAPACITY = 1
+DEFAULT_CAMPAIGN_WORKERS = 16
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_BACKOFF_SECONDS = 1.0
+DEFAULT_PRODUCT_ID = 2
+
+RESULT_ASSIGNED = 'assigned'
+RESULT_SENT = 'sent'
+RESULT_FAILED = 'failed'
+RESULT_UNASSIGNED = 'unassigned'
+RESULT_ALREADY_BOOKED = 'already_booked'
+
+CampaignEmployee = namedtuple('CampaignEmployee', ['user_id', 'name', 'providers', 'earliest', 'latest', 'hours'])
+Assignment = namedtuple('Assignment', ['employee', 'health_provider_id', 'clinic', 'when'])
+CampaignResult = namedtuple('CampaignResult', ['user_id', 'name', 'health_provider_id', 'clinic', 'date_time',
+                                               'status', 'status_code', 'error'])
+
+
+def _parse_id(value):
+    value = str(value).strip()
+    return int(value) if value.isdigit() else value
+
+
+def _parse_list(value):
+    if isinstance(value, list):
+        return [_parse_id(item) for item in value if str(item).strip()]
+    return [_parse_id(item) for item in str(value or '').split('|') if item.strip()]
+
+
+def _parse_date(value):
+    return date.fromisoformat(str(value).strip()) if value not in (None, '') else None
+
+
+def _parse_hours(value):
+    """'9-12' (horas de inicio, ambas incluidas), '9|15' o lista; vacío = cualquier hora"""
+    if isinstance(value, list):
+        return [int(hour) for hour in value]
+    value = str(value or '').strip()
+    if '-' in value:
+        first, last = (int(part) for part in value.split('-', 1))
+        return list(range(first, last + 1))
+    return [int(hour) for hour in value.split('|') if hour.strip()]
+
+
+def _employee_from_record(record, line):
+    if not str(record.get('user_id') or '').strip():
+        raise ValueError(f"Línea {line}: falta user_id")
+    try:
+        return CampaignEmployee(
+            user_id=_parse_id(record['user_id']),
+            name=(record.get('name') or '').strip(),
+            providers=_parse_list(record.get('providers')),
+            earliest=_parse_date(record.get('earliest')),
+            latest=_parse_date(record.get('latest')),
+            hours=_parse_hours(record.get('hours'))
+        )
+    except ValueError as e:
+        raise ValueError(f"Línea {line}: {e}")
+
+
+def load_employees(path):
+    """
+    Empleados de la campaña desde CSV o JSONL. Campos: user_id (obligatorio),
+    name, providers (ids o nombres de clínica separados por '|', o lista),
+    earliest/latest (YYYY-MM-DD) y hours ('9-12').
+    """
+    employees = []
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line, raw in enumerate(f, 1):
+                if not raw.strip():
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError as e:
+                    raise ValueError(f"Línea {line}: JSON inválido ({e})")
+                employees.append(_employee_from_record(record, line))
+        else:
+            for line, record in enumerate(csv.DictReader(f), 2):
+                employees.append(_employee_from_record(record, line))
+    return employees
+
+
+class CampaignSlotAssigner:
+    """
+    Asigna hora a cada empleado entre las clínicas de la empresa respetando la
+    capacidad por clínica y hora.
+
+    Greedy "más restringido primero": los empleados con menos clínicas, días y
+    horas aceptables se asignan antes, a la primera fecha posible y, dentro de
+    ese día, a la clínica con más cupos libres (reparte la carga). La
+    capacidad vive en un array por clínica y día, y un cursor por clínica se
+    salta los días ya llenos, así que cada asignación cuesta pocas operaciones.
+    """
+
+    def __init__(self, providers, business_days, slot_hours=DEFAULT_SLOT_HOURS,
+                 capacity=DEFAULT_SLOT_CAPACITY, booked=()):
+        self.days = sorted(business_days)
+        self.slot_hours = tuple(slot_hours)
+        self.capacity = capacity
+        self._clinic = {provider['health_provider_id']: provider['name'] for provider in providers}
+        self._by_name = {provider['name'].lower(): provider['health_provider_id'] for provider in providers}
+        self._day_index = {day: i for i, day in enumerate(self.days)}
+        self._slot_of_hour = {hour: slot for slot, hour in enumerate(self.slot_hours)}
+        self._remaining = {
+            pid: [array('H', [capacity]) * len(self.slot_hours) for _ in self.days] for pid in self._clinic
+        }
+        self._day_left = {pid: [capacity * len(self.slot_hours)] * len(self.days) for pid in self._clinic}
+        self._first_open = dict.fromkeys(self._clinic, 0)
+        for pid, when in booked:
+            self._take(pid, self._day_index.get(when.date()), self._slot_of_hour.get(when.hour))
+
+    def _take(self, pid, day, slot):
+        if pid not in self._remaining or day is None or slot is None or not self._remaining[pid][day][slot]:
+            return False
+        self._remaining[pid][day][slot] -= 1
+        self._day_left[pid][day] -= 1
+        while self._first_open[pid] < len(self.days) and not self._day_left[pid][self._first_open[pid]]:
+            self._first_open[pid] += 1
+        return True
+
+    def _provider_ids(self, employee):
+        if not employee.providers:
+            return list(self._clinic)
+        ids = []
+        for provider in employee.providers:
+            pid = provider if provider in self._clinic else self._by_name.get(str(provider).lower())
+            if pid is not None:
+                ids.append(pid)
+        return ids
+
+    def _window(self, employee):
+        first = bisect.bisect_left(self.days, employee.earliest) if employee.earliest else 0
+        last = bisect.bisect_right(self.days, employee.latest) if employee.latest else len(self.days)
+        return first, last
+
+    def assign(self, employee):
+        """Reserva la primera hora que cumple las preferencias; None si no queda ninguna"""
+        pids = self._provider_ids(employee)
+        slots = [self._slot_of_hour[h] for h in employee.hours if h in self._slot_of_hour] if employee.hours \
+            else range(len(self.slot_hours))
+        first, last = self._window(employee)
+        for day in range(first, last):
+            best = None
+            for pid in pids:
+                if day < self._first_open[pid] or not self._day_left[pid][day]:
+                    continue
+                free = self._remaining[pid][day]
+                slot = next((s for s in slots if free[s]), None)
+                if slot is not None and (best is None or self._day_left[pid][day] > self._day_left[best[0]][day]):
+                    best = (pid, slot)
+            if best is not None:
+                pid, slot = best
+                self._take(pid, day, slot)
+                when = datetime.combine(self.days[day], datetime.min.time()).replace(hour=self.slot_hours[slot])
+                return Assignment(employee, pid, self._clinic[pid], when)
+        return None
+
+    def assign_all(self, employees):
+        """(asignaciones, empleados sin hora), procesando primero a los más restringidos"""
+        def flexibility(employee):
+            first, last = self._window(employee)
+            hours = len(employee.hours) if employee.hours else len(self.slot_hours)
+            return len(self._provider_ids(employee)) * max(last - first, 0) * hours
+
+        assignments, unassigned = [], []
+        for employee in sorted(employees, key=flexibility):
+            assignment = self.assign(employee)
+            if assignment is None:
+                unassigned.append(employee)
+            else:
+                assignments.append(assignment)
+        return assignments, unassigned
+
+
+def appointment_payload(assignment, product_id=DEFAULT_PRODUCT_ID):
+    return {
+        "user_id": assignment.employee.user_id,
+        "product_id": product_id,
+        "health_provider_id": assignment.health_provider_id,
+        "date_time": format_slot_datetime(assignment.when)
+    }
+
+
+def _result(assignment, status, status_code=None, error=None, employee=None):
+    if assignment is None:
+        return CampaignResult(employee.user_id, employee.name, None, None, None, status, None, error)
+    return CampaignResult(assignment.employee.user_id, assignment.employee.name, assignment.health_provider_id,
+                          assignment.clinic, format_slot_datetime(assignment.when), status, status_code, error)
+
+
+def _submit_one(assignment, send, product_id, max_attempts, base_backoff_seconds, record_sent):
+    payload = appointment_payload(assignment, product_id)
+    key = appointment_idempotency_key(payload)
+    status_code, error = None, None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            status_code, error = send(payload, key).status_code, None
+            if status_code in (200, 201):
+                if record_sent is not None:
+                    record_sent(payload, status_code, key)
+                return _result(assignment, RESULT_SENT, status_code)
+            error = f"HTTP {status_code}"
+            if 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS:
+                break
+        except Exception as e:
+            status_code, error = None, str(e) or type(e).__name__
+        if attempt < max_attempts:
+            time.sleep(base_backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+    return _result(assignment, RESULT_FAILED, status_code, error)
+
+
+def submit_appointments(assignments, send, workers=DEFAULT_CAMPAIGN_WORKERS, product_id=DEFAULT_PRODUCT_ID,
+                        max_attempts=DEFAULT_MAX_ATTEMPTS, base_backoff_seconds=DEFAULT_BASE_BACKOFF_SECONDS,
+                        on_result=None, record_sent=None):
+    """
+    Crea las citas con a lo más `workers` POSTs simultáneos. `send(payload,
+    idempotency_key)` hace el POST (la clave es la misma del outbox de citas).
+    `record_sent(payload, status_code, idempotency_key)` se llama apenas se
+    crea cada cita, para registrarla en el outbox: así el índice de horas del
+    bot la ve y una re-ejecución interrumpida se salta a quienes ya tienen cita
+    (ver `already_booked`), sin depender de que la API deduplique.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="campaign") as executor:
+        futures = [executor.submit(_submit_one, a, send, product_id, max_attempts, base_backoff_seconds, record_sent)
+                   for a in assignments]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
+
+
+def already_booked(employees, user_ids):
+    """(empleados por agendar, empleados que ya tienen cita); los ids se comparan como texto"""
+    booked = {str(user_id) for user_id in user_ids}
+    pending, skipped = [], []
+    for employee in employees:
+        (skipped if str(employee.user_id) in booked else pending).append(employee)
+    return pending, skipped
+
+
+def already_booked_results(employees):
+    return [_result(None, RESULT_ALREADY_BOOKED, error="ya tiene cita registrada", employee=e) for e in employees]
+
+
+def unassigned_results(employees):
+    return [_result(None, RESULT_UNASSIGNED, error="sin horas disponibles", employee=e) for e in employees]
+
+
+def assigned_results(assignments):
+    """Resultado de un ensayo (--dry-run): la asignación sin enviarla"""
+    return [_result(a, RESULT_ASSIGNED) for a in assignments]
+
+
+def write_report(path, results):
+    """Reporte CSV, una fila por empleado"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CampaignResult._fields)
+        for result in sorted(results, key=lambda r: str(r.user_id)):
+            writer.writerow(result)
@@ -0,0 +1,181 @@
+import bisect
+import threading
+from datetime import date, datetime, timedelta
+
+from dateutil.easter import easter
+from dateutil.rrule import DAILY, FR, MO, TH, TU, WE, rrule
+
+SHORT_WEEKDAYS = ['Lun', 'Mar', 'Mie', 'Jue', 'Vie', 'Sab', 'Dom']
+
+# Años precalculados desde el año en curso (se extiende solo si se consulta más allá)
+DEFAULT_CALENDAR_YEARS = 3
+
+# Feriados regionales (Ley 20.663 y Ley 20.678)
+REGIONAL_HOLIDAYS = {
+    'arica': [((6, 7), "Asalto y Toma del Morro de Arica")],
+    'nuble': [((8, 20), "Nacimiento del Prócer de la Independencia")],
+}
+
+FIXED_HOLIDAYS = [
+    ((1, 1), "Año Nuevo"),
+    ((5, 1), "Día Nacional del Trabajo"),
+    ((5, 21), "Día de las Glorias Navales"),
+    ((7, 16), "Día de la Virgen del Carmen"),
+    ((8, 15), "Asunción de la Virgen"),
+    ((9, 18), "Independencia Nacional"),
+    ((9, 19), "Día de las Glorias del Ejército"),
+    ((11, 1), "Día de Todos los Santos"),
+    ((12, 8), "Inmaculada Concepción"),
+    ((12, 25), "Navidad"),
+]
+
+# Ley 19.668: si caen martes, miércoles o jueves pasan al lunes anterior; si caen viernes, al lunes siguiente
+MONDAY_MOVED_HOLIDAYS = [
+    ((6, 29), "San Pedro y San Pablo"),
+    ((10, 12), "Encuentro de Dos Mundos"),
+]
+
+
+def format_short_date(day):
+    """Mie 25/02/2026"""
+    return f"{SHORT_WEEKDAYS[day.weekday()]} {day.day:02d}/{day.month:02d}/{day.year}"
+
+
+def _move_to_monday(day):
+    if day.weekday() in (1, 2, 3):
+        return day - timedelta(days=day.weekday())
+    if day.weekday() == 4:
+        return day + timedelta(days=3)
+    return day
+
+
+def _june_solstice(year):
+    """Fecha del solsticio de invierno en Chile continental (UTC-4), aproximación de Meeus"""
+    y = (year - 2000) / 1000
+    jde = 2451716.56767 + 365241.62603 * y + 0.00325 * y ** 2 + 0.00888 * y ** 3 - 0.00030 * y ** 4
+    return (datetime(2000, 1, 1, 12) + timedelta(days=jde - 2451545.0, hours=-4)).date()
+
+
+def chile_holidays(year, regions=()):
+    """Feriados nacionales (y de las regiones indicadas) de un año: {date: nombre}"""
+    holidays = {date(year, month, day): name for (month, day), name in FIXED_HOLIDAYS}
+    for (month, day), name in MONDAY_MOVED_HOLIDAYS:
+        holidays[_move_to_monday(date(year, month, day))] = name
+
+    easter_sunday = easter(year)
+    holidays[easter_sunday - timedelta(days=2)] = "Viernes Santo"
+    holidays[easter_sunday - timedelta(days=1)] = "Sábado Santo"
+
+    # Ley 21.357: día del solsticio de invierno (2021 fue fijado por ley el 21 de junio)
+    if year >= 2021:
+        holidays[date(2021, 6, 21) if year == 2021 else _june_solstice(year)] = "Día Nacional de los Pueblos Indígenas"
+
+    # Ley 20.299: iglesias evangélicas; si cae martes pasa al viernes anterior, si cae miércoles al viernes siguiente
+    reformation = date(year, 10, 31)
+    if reformation.weekday() == 1:
+        reformation -= timedelta(days=4)
+    elif reformation.weekday() == 2:
+        reformation += timedelta(days=2)
+    holidays[reformation] = "Día de las Iglesias Evangélicas y Protestantes"
+
+    # Ley 20.215: fiestas patrias largas (17 si cae lunes, 20 si cae viernes)
+    if date(year, 9, 17).weekday() == 0:
+        holidays[date(year, 9, 17)] = "Fiestas Patrias"
+    if date(year, 9, 20).weekday() == 4:
+        holidays[date(year, 9, 20)] = "Fiestas Patrias"
+
+    for region in regions:
+        for (month, day), name in REGIONAL_HOLIDAYS.get(region, []):
+            holidays[date(year, month, day)] = name
+    return holidays
+
+
+class BusinessCalendar:
+    """
+    Calendario de días hábiles de Chile precalculado para varios años.
+
+    Los días hábiles (lunes a viernes, sin feriados) quedan en una lista
+    ordenada; "próximos N días hábiles" es una búsqueda binaria más un slice.
+    Las etiquetas "Mie 25/02/2026" se precalculan en ambos sentidos, así
+    formatear y parsear una fecha del rango es un acceso a dict.
+
+    `extra_holidays` permite agregar feriados puntuales (ej. elecciones).
+    """
+
+    def __init__(self, regions=(), years=DEFAULT_CALENDAR_YEARS, extra_holidays=None, today=None):
+        self.regions = tuple(regions)
+        self.extra_holidays = dict(extra_holidays or {})
+        self._lock = threading.Lock()
+        self._first_year = (today or date.today()).year
+        self._build(self._first_year + years - 1)
+
+    def _build(self, last_year):
+        start, end = date(self._first_year, 1, 1), date(last_year, 12, 31)
+        holidays = {}
+        for year in range(self._first_year, last_year + 1):
+            holidays.update(chile_holidays(year, self.regions))
+        holidays.update(self.extra_holidays)
+        weekdays = rrule(DAILY, dtstart=start, until=end, byweekday=(MO, TU, WE, TH, FR))
+        self._business_days = [day.date() for day in weekdays if day.date() not in holidays]
+        self._business_set = frozenset(self._business_days)
+        self._holidays = holidays
+        self._labels = {}
+        self._dates_by_label = {}
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            label = format_short_date(day)
+            self._labels[day] = label
+            self._dates_by_label[label] = day
+        self._last_day = end
+
+    def _ensure(self, day):
+        if day > self._last_day:
+            with self._lock:
+                if day > self._last_day:
+                    self._build(day.year + 1)
+
+    def is_business_day(self, day):
+        if isinstance(day, datetime):
+            day = day.date()
+        self._ensure(day)
+        return day in self._business_set
+
+    def holiday_name(self, day):
+        """Nombre del feriado, o None si no lo es"""
+        if isinstance(day, datetime):
+            day = day.date()
+        self._ensure(day)
+        return self._holidays.get(day)
+
+    def next_business_days(self, n, after=None):
+        """Los `n` días hábiles siguientes a `after` (por defecto, hoy)"""
+        after = after or date.today()
+        if isinstance(after, datetime):
+            after = after.date()
+        self._ensure(after + timedelta(days=n * 2 + 14))
+        start = bisect.bisect_right(self._business_days, after)
+        return self._business_days[start:start + n]
+
+    def label(self, day):
+        """Etiqueta corta en español ('Mie 25/02/2026'), precalculada dentro del rango"""
+        if isinstance(day, datetime):
+            day = day.date()
+        return self._labels.get(day) or format_short_date(day)
+
+    def parse_label(self, label):
+        """Inverso de `label`: la fecha, o None si la etiqueta no corresponde"""
+        day = self._dates_by_label.get(label.strip())
+        if day is None:
+            try:
+                weekday, numbers = label.split()
+                day_num, month, year = map(int, numbers.split('/'))
+                day = date(year, month, day_num)
+            except ValueError:
+                return None
+            if SHORT_WEEKDAYS[day.weekday()] != weekday:
+                return None
+        return day
+
+    def snapshot(self):
+        return {'first_day': date(self._first_year, 1, 1).isoformat(), 'last_day': self._last_day.isoformat(),
+                'business_days': len(self._business_days), 'holidays': len(self._holidays), 'regions': list(self.regions)}
@@ -0,0 +1,96 @@
+import threading
+import time
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_SECONDS = 30
+
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída: la llamada no se intentó"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por dependencia (API GoMind, Bedrock).
+
+    Tras `failure_threshold` fallos consecutivos se abre y las llamadas fallan de
+    inmediato con `open_error`, así el llamador usa su respaldo sin esperar el
+    timeout completo. Pasados `recovery_seconds` deja pasar una sola llamada de
+    prueba (half-open): si resulta bien se cierra, si falla se vuelve a abrir.
+
+    `is_failure(result)` cuenta como fallo respuestas que no lanzan (ej. 5xx).
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 recovery_seconds=DEFAULT_RECOVERY_SECONDS, is_failure=None, open_error=CircuitOpenError):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.is_failure = is_failure
+        self.open_error = open_error
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        """Retorna True si la llamada es la prueba half-open; lanza `open_error` si se rechaza"""
+        with self._lock:
+            if self._state == STATE_OPEN:
+                remaining = self._opened_at + self.recovery_seconds - time.monotonic()
+                if remaining > 0:
+                    self._stats['rejected'] += 1
+                    raise self.open_error(f"{self.name} no disponible (circuito abierto, reintento en {remaining:.0f} s)")
+                self._state = STATE_HALF_OPEN
+            if self._state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    self._stats['rejected'] += 1
+                    raise self.open_error(f"{self.name} no disponible (verificando recuperación)")
+                self._probe_in_flight = True
+            self._stats['calls'] += 1
+            return self._probe_in_flight and self._state == STATE_HALF_OPEN
+
+    def _release(self, ok, probe):
+        with self._lock:
+            if probe:
+                self._probe_in_flight = False
+            if ok:
+                self._consecutive_failures = 0
+                if probe:
+                    self._state = STATE_CLOSED
+                return
+            self._stats['failures'] += 1
+            self._consecutive_failures += 1
+            if probe or (self._state == STATE_CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._stats['opened'] += 1
+
+    def call(self, fn, *args, **kwargs):
+        probe = self._acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            self._release(False, probe)
+            raise
+        self._release(not (self.is_failure and self.is_failure(result)), probe)
+        return result
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def snapshot(self):
+        """Estado actual y contadores (llamadas, fallos, rechazos inmediatos, aperturas)"""
+        with self._lock:
+            report = dict(self._stats, state=self._state, consecutive_failures=self._consecutive_failures)
+            if self._state == STATE_OPEN:
+                report['retry_in_seconds'] = round(max(0.0, self._opened_at + self.recovery_seconds - time.monotonic()), 1)
+            return report
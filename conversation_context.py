@@ -0,0 +1,105 @@
+from collections import deque
+
+# Descripción legible de cada stage para el contexto que se envía a Bedrock
+STAGE_DESCRIPTIONS = {
+    'main_menu': 'en menú principal',
+    'selecting_product': 'seleccionando producto',
+    'analyzing': 'revisando si quiere agendar cita',
+    'selecting_clinic': 'eligiendo clínica',
+    'scheduling': 'eligiendo día',
+    'selecting_time': 'eligiendo hora',
+    'confirming': 'confirmando cita',
+    'completed': 'proceso completado'
+}
+
+
+def describe_stage(stage):
+    """Descripción del stage o el nombre del stage si no tiene descripción"""
+    return STAGE_DESCRIPTIONS.get(stage, stage)
+
+
+class ConversationContext:
+    """
+    Contexto conversacional mantenido de forma incremental.
+
+    Cada mensaje nuevo se formatea una sola vez al entrar a la ventana de los
+    últimos `window_size` mensajes; los que salen de la ventana se acumulan en
+    un resumen (cantidad de mensajes y etapas recorridas). El texto final se
+    cachea mientras no cambien los mensajes, el stage ni el usuario, por lo que
+    todas las llamadas de un mismo turno reutilizan el mismo string.
+    """
+
+    def __init__(self, window_size=3, preview_chars=60, summary_stages=6):
+        self.preview_chars = preview_chars
+        self._window = deque(maxlen=window_size)
+        self._stage_path = deque(maxlen=summary_stages)
+        self._seen_messages = 0
+        self._summarized_messages = 0
+        self._cache_key = None
+        self._cached = ""
+
+    def _format_message(self, message):
+        role = "Usuario" if message['role'] == 'user' else "Bianca"
+        content = message['content']
+        if len(content) > self.preview_chars:
+            content = content[:self.preview_chars] + "..."
+        return f"{role}: {content}"
+
+    def append_message(self, message):
+        """Incorpora un mensaje nuevo; el que sale de la ventana pasa al resumen"""
+        if len(self._window) == self._window.maxlen:
+            self._summarized_messages += 1
+        self._window.append(self._format_message(message))
+        self._seen_messages += 1
+
+    def set_stage(self, stage):
+        """Registra un cambio de stage en el recorrido resumido"""
+        if not self._stage_path or self._stage_path[-1] != stage:
+            self._stage_path.append(stage)
+
+    def reset(self):
+        self._window.clear()
+        self._stage_path.clear()
+        self._seen_messages = 0
+        self._summarized_messages = 0
+        self._cache_key = None
+
+    def sync(self, messages, stage, upto=None):
+        """Consume solo los mensajes que aún no se han visto (incluye los agregados fuera del dispatcher)"""
+        upto = len(messages) if upto is None else upto
+        if upto < self._seen_messages:
+            self.reset()
+        for index in range(self._seen_messages, upto):
+            self.append_message(messages[index])
+        self.set_stage(stage)
+
+    def summary(self):
+        """Resumen de lo que ya salió de la ventana de mensajes recientes"""
+        if not self._summarized_messages:
+            return ""
+        path = " → ".join(describe_stage(s) for s in self._stage_path)
+        return f"Resumen: {self._summarized_messages} mensajes anteriores; recorrido: {path}"
+
+    def render(self, messages, stage, user_name=None, upto=None):
+        """
+        Texto de contexto para los prompts con messages[:upto]; se recalcula solo si algo cambió.
+        `upto` permite dejar fuera el mensaje actual, que el prompt ya incluye aparte.
+        """
+        upto = len(messages) if upto is None else upto
+        cache_key = (upto, stage, user_name)
+        if cache_key == self._cache_key:
+            return self._cached
+
+        self.sync(messages, stage, upto)
+        context_parts = []
+        if user_name:
+            context_parts.append(f"Usuario: {user_name}")
+        context_parts.append(f"Estado: {describe_stage(stage)}")
+        summary = self.summary()
+        if summary:
+            context_parts.append(summary)
+        context_parts.extend(self._window)
+
+        self._cached = " | ".join(context_parts)
+        self._cache_key = cache_key
+        return self._cached
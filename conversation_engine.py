@@ -0,0 +1,1492 @@
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+
+from action_steps_library import HEALTHY_STEPS_INSTRUCTIONS, UNHEALTHY_STEPS_INSTRUCTIONS
+from appointment_outbox import DEFAULT_CONFIRM_WAIT_SECONDS, STATUS_FAILED, STATUS_SENT
+from conversation_context import ConversationContext, describe_stage
+from conversation_state import (
+    DEFAULT_HANDLER, STAGE_HANDLERS, begin_turn, compile_stage_table, dispatch_stage, had_turn_flag, raise_turn_flag
+)
+from exam_ingestion import JOB_COMPLETED_STATUSES
+from keyword_matcher import KEYWORD_MATCHER
+from medical_ranges import RANGES
+from model_router import TASK_CLASSIFICATION, TASK_CONTEXTUAL_CHAT, TASK_SHORT_GENERATION
+from pdf_precheck import REJECT_NO_LAB_MARKERS, REJECT_TOO_LARGE, REJECT_TOO_MANY_PAGES
+from progressive_reply import DEFAULT_STEPS_DEADLINE_SECONDS, TwoPhaseReply
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, PromptBudgetBuilder, RollingSummary, format_history_line
+from slot_index import parse_slot_datetime
+from speculation import SpeculativeCall
+from turn_deadline import DEFAULT_TURN_BUDGET_SECONDS, DEADLINE_STATS, DeadlineExceeded, remaining_seconds, turn_deadline
+
+BEDROCK_MAX_TOKENS = 1000
+# Horas de anticipación de los recordatorios de citas confirmadas
+DEFAULT_REMINDER_LEAD_HOURS = (24, 2)
+# La hora de la cita es hora local de la clínica (el sufijo 'Z' del formato de la API no es UTC)
+CLINIC_TIMEZONE = ZoneInfo("America/Santiago")
+# Consulta del job de un examen subido: cada segundo, hasta 2 minutos
+EXAM_POLL_SECONDS = 1
+EXAM_MAX_POLLS = 120
+
+# ============================================
+# PROMPTS
+# ============================================
+# Instrucciones fijas de cada llamada a Bedrock: viajan como prefijo `system`
+# (cacheable) y solo el mensaje del usuario cambia entre llamadas
+INTENT_ANALYSIS_INSTRUCTIONS = """Analiza la respuesta del usuario que se entrega junto a su contexto y determina su intención exacta.
+
+Analiza si la intención es:
+- POSITIVA: Quiere proceder, acepta, está de acuerdo (incluye respuestas como "podría ser", "tal vez", "me parece bien")
+- NEGATIVA: No quiere proceder, rechaza claramente
+- AMBIGUA: No está claro, necesita clarificación
+- PRODUCTOS: Quiere ver productos o servicios disponibles
+- NUEVA_CITA: Quiere agendar una nueva cita adicional
+
+Responde ÚNICAMENTE con una de estas palabras: POSITIVA, NEGATIVA, AMBIGUA, PRODUCTOS, o NUEVA_CITA"""
+
+RESEND_INTENT_INSTRUCTIONS = """El usuario está en un proceso de verificación de identidad. Se le envió un código de verificación a su correo electrónico.
+
+¿El usuario está pidiendo que se le reenvíe el código porque no le llegó, no lo recibió, o necesita uno nuevo?
+
+Responde ÚNICAMENTE con:
+- SI: Si el usuario indica que no recibió el código, no le llegó, quiere que se lo reenvíen, o pide ayuda porque no tiene el código
+- NO: Si el usuario está escribiendo algo que parece ser un intento de código, texto aleatorio, o cualquier otra cosa no relacionada con reenvío
+
+Responde solo con SI o NO."""
+
+FAREWELL_INTENT_INSTRUCTIONS = """Analiza si el usuario se está despidiendo o finalizando la conversación.
+
+Determina la intención:
+- DESPEDIDA: Se está despidiendo claramente (gracias, adiós, hasta luego, nos vemos, chao, bye, eso es todo, ya terminé)
+- CONTINUANDO: Quiere seguir conversando o hacer algo más
+- AMBIGUO: No está claro
+
+Responde ÚNICAMENTE con: DESPEDIDA, CONTINUANDO, o AMBIGUO"""
+
+# Sufijo del análisis de despedida: historial acotado al presupuesto de tokens del prompt
+FAREWELL_PROMPT_TEMPLATE = """Contexto de la conversación:
+{context}
+Mensaje del usuario: "{user_message}\""""
+
+SUMMARY_INSTRUCTIONS = """Resume en máximo 3 frases lo importante de esta conversación entre un usuario y Bianca (asistente de salud).
+Incluye datos útiles para continuar: resultados mencionados, citas agendadas o rechazadas, preferencias.
+
+Responde SOLO con el resumen."""
+
+BIANCA_PROMPT = """
+Eres "Bianca", asistente virtual de GoMind para salud física y emocional. Ayudas a interpretar resultados médicos y agendar citas con tono empático, claro y profesional.
+
+### Personalidad: Usa expresiones naturales: "Perfecto", "Entiendo", "Excelente". Evita tecnicismos innecesarios y frases repetitivas. Mantén conversación coherente.
+
+### Rangos Médicos (21 parámetros)
+**Coagulación:** Protrombina 70-100%, INR 0.8-1.2, TTPK 25-40 seg
+**Metabolismo:** Glicemia 75-100 mg/dL, Uremia 0-50 mg/dL  
+**Hemograma:** Eritrocitos 3.9-5.3 M/μL, Hemoglobina 11.5-14.5 g/dL, Hematocrito 37-47%, VCM 80-100 fL, HCM 26-34 pg, CHCM 31-36 g/dL
+**Leucocitos:** Total 4-10.5 K/μL, Linfocitos 20-40%, Neutrófilos 55-70%, Monocitos 2-10%, Eosinófilos 0-5%, Basófilos 0-2%, Neutrófilos abs 2-7 K/μL, Linfocitos abs 0.8-4 K/μL
+**Otros:** Plaquetas 150-400 K/μL, VHS 0-11 mm/h
+
+### Flujo: Valores normales → felicita, NO ofrezcas cita. Valores anormales → explica brevemente, recomienda cita. Si acepta cita, muestra 3 días hábiles con horarios 09:00-18:00.
+
+### Intenciones de Agendamiento: Si preguntas sobre cita y responden "sí", "claro", "vamos", "dale", "ok" → procede INMEDIATAMENTE al agendamiento sin pedir más información.
+
+### Contexto: Mantén coherencia conversacional. Si usuario dice "no" → responde empáticamente sin reiniciar. Para consultas generales: redirige amablemente a resultados, citas o productos.
+"""
+
+# Prefijo estable (system) de las conversaciones contextuales; solo varía el sufijo
+CONTEXTUAL_SYSTEM_PROMPT = BIANCA_PROMPT + """
+INSTRUCCIONES ADICIONALES:
+- Responde de manera coherente con el contexto conversacional que se entrega
+- Si el usuario ya completó un proceso, reconócelo en tu respuesta
+- Mantén un tono natural y contextual
+- Si detectas que el usuario podría estar finalizando, ofrece ayuda adicional de manera sutil
+"""
+
+CONTEXTUAL_PROMPT_TEMPLATE = """CONTEXTO CONVERSACIONAL ACTUAL:
+{context}
+
+Usuario: {user_message}
+
+Bianca:"""
+
+# Instrucciones estáticas que el gateway envía juntas como un solo prefijo cacheable en los
+# modelos cuyo mínimo de caché alcanzan (Sonnet: 1024 tokens; en Haiku va cada una sola).
+# El orden es parte del prefijo: cambiarlo invalida el caché
+SHARED_INSTRUCTIONS = (
+    CONTEXTUAL_SYSTEM_PROMPT, INTENT_ANALYSIS_INSTRUCTIONS, RESEND_INTENT_INSTRUCTIONS, FAREWELL_INTENT_INSTRUCTIONS,
+    SUMMARY_INSTRUCTIONS, HEALTHY_STEPS_INSTRUCTIONS, UNHEALTHY_STEPS_INSTRUCTIONS,
+)
+
+# ============================================
+# MENSAJES
+# ============================================
+WELCOME_MESSAGE = """👋 ¡Hola! Soy **Bianca** 😊, tu asistente de salud de GoMind.
+
+Ingresa tu **correo electrónico** para enviarte un código de verificación y así confirmar tu identidad"""
+
+# Cada front-end puede reemplazar los textos que dependen del canal (ej. 'file_upload_reminder')
+MESSAGES = {
+    'healthy_results_intro': "¡Excelente noticia, tus valores están todos dentro del rango saludable:\n\n{results}\n\nEstos resultados indican que estás llevando un estilo de vida saludable. ¡Felicitaciones! Sigue así con tus buenos hábitos de alimentación y ejercicio.",
+    'unhealthy_results_intro': "He revisado tus valores y me gustaría comentarte lo que veo:\n\n{issues}\n\nAunque no están muy elevados, sería recomendable que un médico los revise más a fondo.",
+    'generic_steps_healthy': "\n\n**Pasos a Seguir:**\n- Mantén tus hábitos saludables actuales\n- Programa tu próximo chequeo preventivo\n- Continúa con actividad física regular\n- Mantén una alimentación balanceada",
+    'generic_steps_unhealthy': "\n\n**Pasos a Seguir:**\n- Consulta con tu médico sobre estos resultados\n- Sigue las recomendaciones médicas\n- Monitorea tus valores regularmente\n- Mantén hábitos de vida saludables",
+    'disclaimer': "\n\nLos resultados obtenidos mediante IA se basan exclusivamente en los indicadores analizados y deben entenderse como una referencia de apoyo.\nLa interpretación final y la toma de decisiones corresponden siempre al criterio profesional de los colaboradores.",
+    'appointment_question': "¿Te gustaría que te ayude a agendar una cita para que puedas discutir estos resultados con un profesional?",
+    'appointment_success': "¡Excelente! Tu cita quedó confirmada para el {day} a las {time} en {clinic}.\n\nLa cita ha sido registrada correctamente en nuestro sistema. Te enviaremos un recordatorio antes de la hora programada.\n\n",
+    'appointment_error': "Lo siento, hubo un problema al agendar tu cita (Error {status}). Por favor, intenta nuevamente en unos minutos o contacta a nuestro soporte técnico.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
+    'turn_timeout': "Lo siento, estoy tardando más de lo normal en responder. Por favor, escríbeme nuevamente en unos momentos.",
+    'rate_limited': "Estás enviando mensajes muy rápido 🙏 Espera unos segundos y vuelve a escribirme.",
+    'overloaded': "En este momento estoy atendiendo muchas conversaciones. Por favor, escríbeme nuevamente en unos minutos.",
+    'appointment_queued': "Recibí tu solicitud de cita para el {day} a las {time} en {clinic} ✅\n\nNuestro sistema de agendamiento está respondiendo lento, así que la registraré apenas esté disponible y te avisaré por aquí cuando quede confirmada.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
+    'appointment_reminder': "⏰ Recordatorio: tienes una cita el {day} a las {time} en {clinic}.\n\nSi no puedes asistir, avísanos con anticipación.",
+    'appointment_outbox_failed': "Lo siento, no pudimos registrar tu cita del {day} a las {time} en {clinic}. Escribe 'Agendar mi cita' para elegir otro horario o contacta a nuestro soporte técnico.",
+    'connection_error': "Lo siento, hubo un problema de conexión al procesar tu cita. Por favor, verifica tu conexión a internet e intenta nuevamente, o contacta a nuestro soporte técnico.\n\n¿Hay algo más en lo que pueda ayudarte mientras tanto?",
+    'file_upload_reminder': "Por favor, sube el archivo PDF de tu examen para continuar.",
+    'exam_processing_failed': "Lo siento, no pudimos procesar tu examen: {error}\n\n¿Te gustaría intentarlo nuevamente? Escribe 'Lab. Blanco' para subir otro archivo.",
+    'exam_processing_error': "Lo siento, hubo un problema procesando tu examen. Por favor, verifica que el archivo sea un PDF válido e intenta nuevamente.\n\n¿Te gustaría intentarlo nuevamente? Escribe 'Lab. Blanco' para subir otro archivo.",
+    'exam_invalid_pdf': "el archivo no es un PDF válido o llegó incompleto",
+    'exam_too_large': "el archivo supera el máximo de {max_mb} MB",
+    'exam_too_many_pages': "el documento tiene más de {max_pages} páginas",
+    'exam_not_lab': "el documento no parece un examen de laboratorio (no encontramos parámetros médicos ni el nombre del laboratorio)",
+    'clinic_unavailable': "Lo siento, no hay clínicas disponibles en este momento. ¿Te gustaría intentarlo más tarde o tienes alguna otra consulta?",
+    'clinic_error': "Error obteniendo clínicas disponibles: {error}. ¿Te gustaría intentarlo más tarde?",
+    'clinic_not_recognized': "No reconocí esa clínica. ¿Puedes elegir una de las opciones disponibles?",
+    'day_not_recognized': "No reconocí ese día. ¿Puedes elegir uno de los disponibles usando el número (1, 2, 3) o el nombre del día?",
+    'time_taken': "Esa hora ya no está disponible 😕 Estos son los horarios libres del {day}:\n\n{hours}\n\n¿Cuál prefieres? Escribe la hora (ejemplo: 18:00 o 18).",
+    'time_unavailable': "Esa opción no está disponible. Por favor, elige un número de las opciones mostradas.",
+    'time_format_error': "Por favor, responde con el número de la opción que prefieres (ejemplo: 1, 2, 3).",
+    'appointment_declined': "Entiendo, no confirmo la cita. ¿Te gustaría reagendar para otro día u horario, o hay algo más en lo que pueda ayudarte?",
+    'appointment_general_declined': "Entiendo. Si cambias de opinión y quieres agendar una cita más tarde, solo dímelo. ¿Hay algo más en lo que pueda ayudarte?",
+    'new_appointment_offer': "¡Perfecto! Te ayudo a agendar una nueva cita. ¿Esta cita es para revisar nuevos resultados médicos o es una consulta de seguimiento?",
+    'new_appointment_start': "Excelente, iniciemos el proceso para tu nueva cita. Tenemos estas clínicas disponibles:",
+    'new_appointment_medical_request': "Entiendo que necesitas una nueva cita. Para brindarte el mejor servicio, ¿podrías compartirme el ID de usuario para revisar tus resultados médicos más recientes? Esto me ayudará a determinar si necesitas una cita médica.",
+    'login_success_menu': "¡Bienvenido/a, {user_name}!\n\n¿Cómo te ayudamos hoy?\n\n- Agendar mi cita\n- Revisa mi examen\n\nEscribe la opción que prefieras.",
+    'products_menu': "Gracias, voy a proceder a ayudarte con tu agendamiento, por favor selecciona alguno de los productos disponibles\n\n{products_list}\n¿Cuál producto te interesa? Escribe el nombre del producto.",
+    'product_selected': "Perfecto ✅ Para agendar tu **{product_name}**, contamos con los siguientes centros médicos:",
+    'invalid_menu_option': "No entendí tu selección. Por favor, escribe:\n- 'Agendar mi cita' para agendar una cita\n- 'Revisa mi examen' para análisis médico",
+    'invalid_product_option': "No reconocí ese producto. Por favor, escribe el nombre de uno de los productos disponibles.",
+    'verification_code_sent': "🔒 Para confirmar tu identidad, te envié un código de verificación a tu correo.\nEscríbelo aquí para continuar",
+    'code_authentication_success': "🎉 ¡Perfecto! Ya verifiqué tu identidad.",
+    'invalid_code': "No pudimos validar el código ingresado. Por favor, revisa el código e inténtalo nuevamente.",
+    'code_error': "No pudimos validar el código ingresado. Por favor, revisa el código e inténtalo nuevamente."
+}
+
+# Tabla de mapeo: nombre de clínica → health_provider_id
+CLINIC_MAPPING = {
+    "Inmunomedica Concepción": 1,
+    "Laboratorio Blanco Santiago": 3,
+    "Red Salud Santiago Centro": 4
+}
+
+# Mapeo de nombres largos a nombres cortos para mostrar al usuario
+CLINIC_DISPLAY_NAMES = {
+    "Inmunomedica Concepción": "Inmunomedica Concepción",
+    "Laboratorio Blanco Santiago": "Lab. Blanco Stgo",
+    "Red Salud Santiago Centro": "Red Salud Stgo Centro",
+    "Go Mind": "Go Mind"
+}
+
+SPANISH_MONTH_NUMBERS = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+
+
+# ============================================
+# SESIÓN
+# ============================================
+class ConversationSession:
+    """Estado de una conversación; el motor lo recibe explícito en cada turno"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.stage = 'initial'
+        self.user_data = None
+        self.messages = []
+        self.context = ""
+        self.company_id = None
+        self.clinics = None
+        self.user_email = None
+        self.auth_token = None
+        self.company_products = None
+        self.user_profile = None
+        self.selected_clinic = None
+        self.selected_day = None
+        self.selected_time = None
+        self.resend_count = 0
+        self.next_days = None
+        self.available_hours = None
+        self.selected_product = None
+        self.pending_appointment = None
+        self.turn_flags = set()
+        self.previous_turn_flags = set()
+        self.conversation_context = ConversationContext()
+        self.rolling_summary = RollingSummary()
+
+
+class SessionStore:
+    """
+    Sesiones en memoria por id (número de WhatsApp, sesión del navegador).
+
+    `locked()` serializa los turnos de una misma conversación cuando llegan
+    en paralelo (reintentos, mensajes seguidos); conversaciones distintas no
+    se bloquean entre sí. Con varios procesos cada uno tiene su propio store,
+    así que los mensajes de un mismo id deben llegar siempre al mismo proceso.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ConversationSession(session_id)
+            return session
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.session_id] = session
+
+    @contextmanager
+    def locked(self, session_id):
+        """Sesión con acceso exclusivo durante el bloque; se guarda al salir"""
+        with self._lock:
+            lock = self._locks.setdefault(session_id, threading.Lock())
+        with lock:
+            session = self.get_or_create(session_id)
+            yield session
+            self.save(session)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def snapshot(self):
+        return {'sessions': len(self)}
+
+
+# ============================================
+# FUNCIONES UTILITARIAS
+# ============================================
+def get_short_clinic_name(full_name):
+    """Convierte el nombre completo de la clínica a su versión corta para mostrar"""
+    return CLINIC_DISPLAY_NAMES.get(full_name, full_name)
+
+
+def is_valid_email(email):
+    """Valida formato básico de email usando regex"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return bool(re.match(pattern, email)) and ' ' not in email
+
+
+def find_match(prompt, items, key_func=None):
+    """Función consolidada para encontrar coincidencias en listas"""
+    prompt_lower = prompt.lower()
+
+    for item in items:
+        if key_func:
+            text_to_compare = key_func(item)
+        elif isinstance(item, dict) and 'name' in item:
+            text_to_compare = item['name']
+        else:
+            text_to_compare = str(item)
+
+        text_words = text_to_compare.lower().split()
+        if any(word in prompt_lower for word in text_words):
+            return item  # Devolver el objeto completo
+
+    return None
+
+
+def has_user_data(session):
+    """Verifica si hay datos de usuario disponibles"""
+    return session.user_data and session.user_data.get('id')
+
+
+def is_authenticated(session):
+    """Verifica si el usuario está autenticado"""
+    return session.auth_token is not None
+
+
+def get_user_info(session):
+    """Obtiene información del usuario de manera segura"""
+    if has_user_data(session):
+        return {
+            'id': session.user_data.get('id'),
+            'name': session.user_data.get('name', 'Usuario')
+        }
+    return {'id': None, 'name': 'Usuario'}
+
+
+def get_session_user_name(session):
+    """Nombre del usuario en sesión o 'Usuario' por defecto"""
+    if session.user_data:
+        return session.user_data.get('name', 'Usuario')
+    return "Usuario"
+
+
+def selected_provider_id(session):
+    """health_provider_id de la clínica elegida (None si no viene en los datos del endpoint)"""
+    for clinic in session.clinics or []:
+        if clinic['name'] == session.selected_clinic:
+            return clinic.get('health_provider_id')
+    return None
+
+
+def validate_appointment_data(session):
+    required_fields = ['selected_clinic', 'selected_day', 'selected_time']
+    missing_fields = [field for field in required_fields if not getattr(session, field, None)]
+
+    if missing_fields:
+        raise ValueError(f"Faltan datos requeridos: {', '.join(missing_fields)}")
+
+    if not session.user_data or not session.user_data.get('id'):
+        raise ValueError("ID de usuario no disponible")
+
+    return True
+
+
+# ============================================
+# MOTOR DE CONVERSACIÓN
+# ============================================
+class ConversationEngine:
+    """
+    Lógica conversacional de Bianca, independiente del canal.
+
+    Cada handler recibe la sesión de forma explícita (nada de estado global
+    ni de `st.session_state`), así que el mismo motor atiende el chat web de
+    Streamlit, el webhook de WhatsApp o un worker en segundo plano. Los
+    clientes de la API GoMind y de Bedrock, el calendario, el índice de horas
+    y el outbox de citas se inyectan: una instancia por proceso, compartida
+    por todos los threads (sus cachés y contadores son thread-safe). El outbox
+    y los recordatorios viven en SQLite y se comparten también entre procesos.
+
+    Los front-ends solo traducen su entrada a `handle_message` /
+    `process_examination` y entregan la respuesta; un `TwoPhaseReply` se
+    entrega según el canal (mismo mensaje o dos mensajes).
+    """
+
+    def __init__(self, api, bedrock, normalizer, calendar, slot_index, outbox, action_steps_library,
+                 ranges=RANGES, pdf_precheck=None, local_exam_parser=None, reminders=None, messages=None,
+                 offer_user_switch=False, turn_budget_seconds=DEFAULT_TURN_BUDGET_SECONDS,
+                 confirm_wait_seconds=DEFAULT_CONFIRM_WAIT_SECONDS, progressive_exam_reply=True,
+                 action_steps_deadline_seconds=DEFAULT_STEPS_DEADLINE_SECONDS,
+                 prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, reminder_lead_hours=DEFAULT_REMINDER_LEAD_HOURS,
+                 keyword_matcher=KEYWORD_MATCHER):
+        self.api = api
+        self.bedrock = bedrock
+        self.normalizer = normalizer
+        self.calendar = calendar
+        self.slot_index = slot_index
+        self.outbox = outbox
+        self.action_steps_library = action_steps_library
+        self.ranges = ranges
+        self.pdf_precheck = pdf_precheck
+        self.local_exam_parser = local_exam_parser
+        self.reminders = reminders
+        self.messages = dict(MESSAGES, **(messages or {}))
+        # En el chat web se puede agendar la nueva cita para otro usuario; en WhatsApp el número es el usuario
+        self.offer_user_switch = offer_user_switch
+        self.turn_budget_seconds = turn_budget_seconds
+        self.confirm_wait_seconds = confirm_wait_seconds
+        self.progressive_exam_reply = progressive_exam_reply
+        self.action_steps_deadline_seconds = action_steps_deadline_seconds
+        self.reminder_lead_hours = tuple(reminder_lead_hours)
+        self.keyword_matcher = keyword_matcher
+        # Constructor de prompts con presupuesto de tokens (el resumen se genera fuera del turno)
+        self.prompt_builder = PromptBudgetBuilder(prompt_token_budget, summarize_fn=self.summarize_history_with_ai)
+        # Tabla stage → handler compilada una vez contra los métodos del motor
+        handlers = {name: getattr(self, name) for name in set(STAGE_HANDLERS.values()) | {DEFAULT_HANDLER}}
+        self._stage_table, self._default_handler = compile_stage_table(handlers)
+
+    # ============================================
+    # ENTRADA DE LOS FRONT-ENDS
+    # ============================================
+    def handle_message(self, session, user_message, display_message=None):
+        """
+        Procesa un turno de texto con plazo total y actualiza el stage de la sesión.
+
+        `display_message` reemplaza lo que queda en el historial (ej. el código
+        de verificación enmascarado). Retorna (respuesta, stage); la respuesta
+        puede ser texto, None o un TwoPhaseReply.
+        """
+        session.messages.append({"role": "user", "content": user_message if display_message is None else display_message})
+        try:
+            with turn_deadline(self.turn_budget_seconds):
+                begin_turn(session)
+                response, new_stage = dispatch_stage(
+                    self._stage_table, self._default_handler, session.stage, user_message, session
+                )
+        except DeadlineExceeded:
+            DEADLINE_STATS.add('degraded_turns')
+            response, new_stage = self.messages['turn_timeout'], session.stage
+
+        session.stage = new_stage
+        session.conversation_context.set_stage(new_stage)
+        return response, new_stage
+
+    def record_reply(self, session, text):
+        """Agrega al historial lo que el front-end efectivamente entregó al usuario"""
+        if text:
+            session.messages.append({"role": "assistant", "content": text})
+
+    def process_examination(self, session, file_bytes, filename='examen.pdf'):
+        """Procesa un PDF subido y retorna (respuesta, stage); el stage queda en la sesión"""
+        try:
+            analysis, error = self.process_uploaded_examination(file_bytes, filename, session.auth_token)
+            if analysis:
+                response, new_stage = self.generate_examination_response(analysis, session)
+            else:
+                response, new_stage = self.messages['exam_processing_failed'].format(error=error), 'selecting_lab'
+        except Exception:
+            response, new_stage = self.messages['exam_processing_error'], 'selecting_lab'
+
+        session.stage = new_stage
+        session.conversation_context.set_stage(new_stage)
+        return response, new_stage
+
+    def resolve_appointment(self, recipient, outcome, appointment, session=None):
+        """
+        Mensaje final de una cita que el outbox resolvió después del turno.
+        Si quedó confirmada agenda los recordatorios y, con `session`, deja los mismos
+        flags que una confirmación inmediata; si falló libera la hora.
+        """
+        if session is not None:
+            session.pending_appointment = None
+        if outcome.status == STATUS_SENT:
+            if session is not None:
+                # El siguiente turno ve la cita como recién confirmada (menú directo, sin despedida)
+                raise_turn_flag(session, 'appointment_confirmed')
+            self.schedule_appointment_reminders(recipient, appointment, outcome.key)
+            return self.messages['appointment_success'].format(**appointment).strip()
+        if appointment.get('health_provider_id') is not None:
+            self.slot_index.release(appointment['health_provider_id'], parse_slot_datetime(appointment['date_time']))
+        return self.messages['appointment_outbox_failed'].format(**appointment)
+
+    def check_pending_appointment(self, session):
+        """Para canales sin mensajes proactivos: resultado de la cita pendiente, o None si sigue en curso"""
+        pending = session.pending_appointment
+        if not pending:
+            return None
+        outcome = self.outbox.status(pending['key'])
+        if outcome is None or outcome.status not in (STATUS_SENT, STATUS_FAILED):
+            return None
+        return self.resolve_appointment(session.session_id, outcome, pending, session)
+
+    def schedule_appointment_reminders(self, recipient, appointment, appointment_key):
+        """Agenda los recordatorios de una cita confirmada (los que ya no alcanzan a enviarse se omiten)"""
+        if self.reminders is None or recipient is None:
+            return
+        starts_at = parse_slot_datetime(appointment['date_time']).replace(tzinfo=CLINIC_TIMEZONE).timestamp()
+        message = self.messages['appointment_reminder'].format(**appointment)
+        now = time.time()
+        self.reminders.schedule_many(
+            (f"{appointment_key}:{lead:g}h", recipient, starts_at - lead * 3600, message, starts_at)
+            for lead in self.reminder_lead_hours if starts_at - lead * 3600 > now
+        )
+
+    # ============================================
+    # FECHAS Y DISPONIBILIDAD
+    # ============================================
+    def format_spanish_date(self, date_obj):
+        """Formatea una fecha en español en formato corto: Mie 25/02/2026"""
+        return self.calendar.label(date_obj)
+
+    def convert_spanish_date_to_iso(self, date_str, time_str):
+        try:
+            # Formato nuevo: "Mie 20/05/2026" (mismas etiquetas precalculadas que format_spanish_date)
+            day = self.calendar.parse_label(date_str)
+            if day is not None:
+                hour, minute = map(int, time_str.split(':'))
+                return datetime(day.year, day.month, day.day, hour, minute, 0).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+            parts = date_str.split()
+            if len(parts) == 2 and '/' in parts[1]:
+                date_part = parts[1]  # "20/05/2026"
+                day, month, year = map(int, date_part.split('/'))
+                hour, minute = map(int, time_str.split(':'))
+                dt = datetime(year, month, day, hour, minute, 0)
+                return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+            # Formato viejo: "Miercoles 25 de febrero" (retrocompatibilidad)
+            elif len(parts) >= 4 and parts[2] == 'de':
+                day = int(parts[1])
+                month_name = parts[3].lower()
+
+                month = SPANISH_MONTH_NUMBERS.get(month_name)
+                if not month:
+                    raise ValueError(f"Mes no reconocido: {month_name}")
+
+                current_year = datetime.now().year
+                hour, minute = map(int, time_str.split(':'))
+                dt = datetime(current_year, month, day, hour, minute, 0)
+
+                if dt < datetime.now():
+                    dt = datetime(current_year + 1, month, day, hour, minute, 0)
+
+                return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            else:
+                raise ValueError(f"Formato de fecha no reconocido: {date_str}")
+
+        except Exception as e:
+            raise ValueError(f"Error convirtiendo fecha: {date_str} {time_str} - {str(e)}")
+
+    def get_next_business_days(self, n=3):
+        """Obtiene los próximos días hábiles excluyendo fines de semana y feriados"""
+        return [self.format_spanish_date(day) for day in self.calendar.next_business_days(n)]
+
+    def slot_date(self, date_str):
+        """Fecha de un día ofrecido ('Mie 20/05/2026'), con el mismo parseo que convert_spanish_date_to_iso"""
+        return parse_slot_datetime(self.convert_spanish_date_to_iso(date_str, '0:00')).date()
+
+    def get_next_available_days(self, provider_id, n=3):
+        """Próximos días hábiles con al menos una hora libre en la clínica"""
+        if provider_id is None:
+            return self.get_next_business_days(n)
+        days = self.slot_index.next_available_days(provider_id, n, is_open_day=self.calendar.is_business_day)
+        return [self.format_spanish_date(day) for day in days]
+
+    def get_free_hours(self, session, date_str):
+        """Horas libres del día en la clínica elegida ("9:00" ... "18:00")"""
+        provider_id = selected_provider_id(session)
+        if provider_id is None:
+            hours = self.slot_index.slot_hours
+        else:
+            hours = self.slot_index.free_hours(provider_id, self.slot_date(date_str))
+        return [f"{h}:00" for h in hours]
+
+    def time_taken_response(self, session):
+        """La hora pedida está ocupada: vuelve a ofrecer las libres del mismo día"""
+        session.available_hours = self.get_free_hours(session, session.selected_day)
+        hours_str = "\n".join(f"- {h}" for h in session.available_hours)
+        return self.messages['time_taken'].format(day=session.selected_day, hours=hours_str), 'selecting_time'
+
+    def get_conversation_context(self, session, current_message=None):
+        """
+        Contexto conversacional actual (incremental y cacheado por turno): usuario, estado,
+        resumen local de lo anterior y los últimos mensajes. Si `current_message` es el
+        último del historial se deja fuera, porque el prompt lo incluye aparte.
+        """
+        user_name = get_user_info(session)['name'] if has_user_data(session) else None
+        upto = len(session.messages)
+        if current_message is not None and upto and session.messages[-1]['content'] == current_message:
+            upto -= 1
+        return session.conversation_context.render(session.messages, session.stage, user_name, upto)
+
+    def get_stage_header(self, session):
+        """Usuario y estado, sin mensajes (para prompts que ya agregan el historial reciente)"""
+        user_name = get_user_info(session)['name'] if has_user_data(session) else None
+        stage = describe_stage(session.stage)
+        return f"Usuario: {user_name} | Estado: {stage}" if user_name else f"Estado: {stage}"
+
+    def handle_appointment_error(self, error, error_type='general'):
+        if error_type == 'clinic_fetch':
+            return self.messages['clinic_error'].format(error=str(error)), 'completed'
+        elif error_type == 'api_connection':
+            return self.messages['connection_error'], 'completed'
+        elif error_type == 'api_error':
+            return self.messages['appointment_error'].format(status=getattr(error, 'status_code', 'Unknown')), 'completed'
+        else:
+            return f"Error inesperado: {str(error)}. ¿Te gustaría intentarlo más tarde?", 'completed'
+
+    def prepare_api_appointment_data(self, session):
+        clinic_name = session.selected_clinic
+
+        health_provider_id = None
+        for clinic in session.clinics:
+            if clinic['name'] == clinic_name:
+                health_provider_id = clinic['health_provider_id']
+                break
+
+        if not health_provider_id:
+            raise ValueError(f"Clínica no encontrada en datos del endpoint: {clinic_name}")
+
+        if not session.user_data:
+            raise ValueError("user_data no está disponible")
+
+        if 'id' not in session.user_data:
+            raise ValueError(f"Campo 'id' no encontrado en user_data")
+
+        try:
+            date_time_iso = self.convert_spanish_date_to_iso(session.selected_day, session.selected_time)
+        except Exception as e:
+            raise ValueError(f"Error procesando fecha y hora: {str(e)}")
+
+        return {
+            "user_id": session.user_data["id"],
+            "product_id": 2,
+            "health_provider_id": health_provider_id,
+            "date_time": date_time_iso
+        }
+
+    # ============================================
+    # ANÁLISIS CON IA
+    # ============================================
+    def analyze_results(self, results_dict):
+        issues = []
+        needs_appointment = False
+
+        for param, value in results_dict.items():
+            if param in self.ranges:
+                min_val, max_val = self.ranges[param]
+                if not (min_val <= value <= max_val):
+                    issues.append(f"{param} fuera de rango: {value}")
+                    needs_appointment = True
+
+        return issues, needs_appointment
+
+    def generate_action_steps_with_ai(self, results, issues, is_healthy):
+        """Genera pasos a seguir personalizados usando IA"""
+        # Perfiles ya conocidos (batch offline o generados antes) se responden sin Bedrock
+        profile = () if is_healthy else self.action_steps_library.profile(results, issues)
+        library_steps = self.action_steps_library.lookup(profile)
+        if library_steps:
+            return f"\n\n**Pasos a Seguir:**\n{library_steps}"
+
+        try:
+            results_text = ", ".join([f"{k}: {v}" for k, v in results.items()])
+            if is_healthy:
+                instructions = HEALTHY_STEPS_INSTRUCTIONS
+                prompt = f"Resultados de laboratorio SALUDABLES: {results_text}"
+            else:
+                issues_text = "\n".join(issues)
+                instructions = UNHEALTHY_STEPS_INSTRUCTIONS
+                prompt = f"Problemas detectados en sus exámenes:\n{issues_text}\n\nValores completos: {results_text}"
+
+            steps = self.bedrock.invoke_text(instructions, prompt, 150, task=TASK_SHORT_GENERATION).strip()
+            self.action_steps_library.add(profile, steps)
+
+            return f"\n\n**Pasos a Seguir:**\n{steps}"
+        except Exception:
+            return self.generic_action_steps(is_healthy)
+
+    def generic_action_steps(self, is_healthy):
+        """Pasos genéricos pre-definidos (respaldo si Bedrock falla o no responde a tiempo)"""
+        return self.messages['generic_steps_healthy'] if is_healthy else self.messages['generic_steps_unhealthy']
+
+    def build_exam_reply(self, findings, results, issues, is_healthy, closing):
+        """
+        Arma la respuesta de resultados: los hallazgos están listos de inmediato y los
+        pasos a seguir se generan en paralelo. Con `progressive_exam_reply` se retorna
+        un TwoPhaseReply para entregarlos en dos fases; si no, el texto completo.
+        """
+        reply = TwoPhaseReply(
+            findings,
+            lambda: self.generate_action_steps_with_ai(results, issues, is_healthy),
+            self.generic_action_steps(is_healthy),
+            closing,
+            deadline_seconds=self.action_steps_deadline_seconds
+        )
+        return reply if self.progressive_exam_reply else reply.text()
+
+    def analyze_user_intent(self, user_message, context_stage):
+        """Analiza la intención del usuario usando Bedrock"""
+        try:
+            context_descriptions = {
+                'analyzing': 'Se le preguntó al usuario si quiere agendar una cita médica',
+                'confirming': 'Se le está pidiendo confirmación final para agendar una cita',
+                'completed': 'La conversación terminó y el usuario podría querer una nueva cita',
+                'showing_products': 'Se pueden mostrar productos de salud disponibles',
+                'waiting_code': 'Se le pidió al usuario un código de verificación enviado a su correo. Determina si el usuario está pidiendo que se le reenvíe el código porque no le llegó',
+                'general': 'Conversación general, detectar cualquier intención'
+            }
+
+            context_desc = context_descriptions.get(context_stage, 'Conversación general')
+
+            prompt = f'Contexto: {context_desc}\nMensaje del usuario: "{user_message}"'
+
+            intent = self.bedrock.invoke_text(
+                INTENT_ANALYSIS_INSTRUCTIONS, prompt, 10, task=TASK_CLASSIFICATION
+            ).strip().upper()
+
+            valid_intents = ['POSITIVA', 'NEGATIVA', 'AMBIGUA', 'PRODUCTOS', 'NUEVA_CITA']
+            if intent in valid_intents:
+                return intent
+            else:
+                return 'AMBIGUA'
+
+        except Exception:
+            keyword_hits = self.keyword_matcher.match(user_message)
+            if 'negativa' in keyword_hits:
+                return 'NEGATIVA'
+            elif 'positiva' in keyword_hits:
+                return 'POSITIVA'
+            else:
+                return 'AMBIGUA'
+
+    def analyze_resend_intent(self, user_message):
+        """Analiza si el usuario quiere que se le reenvíe el código de verificación"""
+        try:
+            prompt = f'El usuario escribió: "{user_message}"'
+
+            answer = self.bedrock.invoke_text(RESEND_INTENT_INSTRUCTIONS, prompt, 5, task=TASK_CLASSIFICATION).strip().upper()
+            return 'SI' in answer or 'SÍ' in answer
+
+        except Exception:
+            return False
+
+    def analyze_farewell_intent(self, message, session):
+        """Analiza si el usuario se está despidiendo usando Bedrock"""
+        try:
+            # Corre en cada turno de 'completed': el contexto incremental de la sesión (últimos
+            # mensajes + resumen local, sin llamar al modelo) acotado por el presupuesto
+            context = self.get_conversation_context(session, current_message=message)
+            # Se presupuesta contra el `system` que el gateway enviará (puede ser el prefijo compartido)
+            system_text = self.bedrock.system_text(FAREWELL_INTENT_INSTRUCTIONS, task=TASK_CLASSIFICATION)
+            prompt = self.prompt_builder.build(
+                FAREWELL_PROMPT_TEMPLATE, system_text, message, (), None, context_header=context
+            ).text
+
+            intent = self.bedrock.invoke_text(
+                FAREWELL_INTENT_INSTRUCTIONS, prompt, 10, task=TASK_CLASSIFICATION,
+                budget_tokens=self.prompt_builder.budget_tokens
+            ).strip().upper()
+
+            return intent if intent in ['DESPEDIDA', 'CONTINUANDO', 'AMBIGUO'] else 'CONTINUANDO'
+
+        except Exception:
+            if self.keyword_matcher.has(message, 'despedida'):
+                return 'DESPEDIDA'
+            return 'CONTINUANDO'
+
+    def summarize_history_with_ai(self, previous_summary, messages):
+        """Resume mensajes antiguos de la conversación (se ejecuta en segundo plano)"""
+        history_text = "\n".join(format_history_line(m) for m in messages)
+        prompt = f"Resumen previo: {previous_summary or 'Sin resumen previo'}\n\nMensajes nuevos:\n{history_text}"
+        return self.bedrock.invoke_text(SUMMARY_INSTRUCTIONS, prompt, 200, task=TASK_SHORT_GENERATION).strip()
+
+    def invoke_bedrock_smart(self, user_message, context_type='general', context_data="", session=None):
+        """Función consolidada para invocar Bedrock con diferentes tipos de contexto"""
+        if context_type == 'contextual':
+            # Prompt acotado al presupuesto de tokens: historial reciente + resumen de lo anterior
+            messages = session.messages if session else []
+            rolling_summary = session.rolling_summary if session else RollingSummary()
+            system_text = self.bedrock.system_text(CONTEXTUAL_SYSTEM_PROMPT, task=TASK_CONTEXTUAL_CHAT)
+            full_prompt = self.prompt_builder.build(
+                CONTEXTUAL_PROMPT_TEMPLATE, system_text, user_message,
+                messages, rolling_summary, context_header=context_data
+            ).text
+            system_prefix = CONTEXTUAL_SYSTEM_PROMPT
+            budget_tokens = self.prompt_builder.budget_tokens
+        else:
+            full_prompt = f"Contexto de conversación: {context_data}\n\nUsuario: {user_message}\n\nBianca:"
+            system_prefix = BIANCA_PROMPT
+            budget_tokens = None
+
+        try:
+            return self.bedrock.invoke_text(
+                system_prefix, full_prompt, BEDROCK_MAX_TOKENS, task=TASK_CONTEXTUAL_CHAT, budget_tokens=budget_tokens
+            )
+        except Exception as e:
+            return f"Error al invocar Bedrock: {str(e)}"
+
+    # ============================================
+    # LÓGICA DE NEGOCIO
+    # ============================================
+    def generate_medical_response(self, results, issues, user_name, session):
+        if not issues:
+            results_text = "\n".join([f"- {k}: {v}" for k, v in results.items()])
+            response = f"{user_name}! Gracias por compartir tus resultados conmigo. Me da gusto poder revisarlos contigo.\n\n"
+            response += self.messages['healthy_results_intro'].format(results=results_text)
+
+            return self.build_exam_reply(response, results, issues, True, self.messages['disclaimer']), 'completed'
+        else:
+            issues_text = "\n".join([f"- {issue}" for issue in issues])
+            response = f"{user_name}! Gracias por compartir tus resultados conmigo. "
+            response += self.messages['unhealthy_results_intro'].format(issues=issues_text)
+
+            closing = self.messages['disclaimer'] + f"\n\n{self.messages['appointment_question']}"
+            return self.build_exam_reply(response, results, issues, False, closing), 'analyzing'
+
+    def process_medical_results(self, user_id, user_name, session):
+        try:
+            results = self.api.get_user_results(session.auth_token)
+            session.user_data = {"id": user_id, "results": results}
+
+            issues, needs_appointment = self.analyze_results(results)
+
+            return self.generate_medical_response(results, issues, user_name, session)
+
+        except Exception as e:
+            error_msg = str(e)
+            if "SESSION_EXPIRED" in error_msg:
+                session.auth_token = None
+                return "Tu sesión ha expirado. Por favor, ingresa tu correo electrónico nuevamente para continuar:", 'waiting_email'
+            elif "Paciente no identificado" in error_msg:
+                return f"Lo siento, no se logró identificar al paciente con el ID {user_id}. Verifica que el número sea correcto o contacta a soporte. ¿Hay algo más en lo que pueda ayudarte?", 'completed'
+            else:
+                return f"Error obteniendo resultados de la API: {error_msg}. ¿Puedes compartir tus resultados médicos en formato JSON? Ejemplo: {{\"Glicemia Basal\": 90, \"Hemoglobina\": 13}}", 'waiting_json'
+
+    def generate_farewell_response(self, session):
+        """Genera una respuesta de despedida contextual"""
+        raise_turn_flag(session, 'farewell_sent')
+        user_info = get_user_info(session)
+        user_name = user_info['name'] if user_info['name'] != 'Usuario' else ""
+
+        appointment_info = ""
+        if session.selected_clinic and session.selected_day and session.selected_time:
+            appointment_info = f" para tu cita del {session.selected_day} a las {session.selected_time} en {session.selected_clinic}"
+
+        if appointment_info:
+            if user_name:
+                return f"¡Perfecto, {user_name}! Me alegra haber podido ayudarte{appointment_info}. ¡Que tengas un excelente día y nos vemos pronto!"
+            else:
+                return f"¡Perfecto! Me alegra haber podido ayudarte{appointment_info}. ¡Que tengas un excelente día y nos vemos pronto!"
+        else:
+            if user_name:
+                return f"¡Gracias por usar nuestros servicios, {user_name}! Espero haber podido ayudarte. ¡Que tengas un excelente día!"
+            else:
+                return "¡Gracias por usar nuestros servicios! Espero haber podido ayudarte. ¡Que tengas un excelente día!"
+
+    # ============================================
+    # HANDLERS DE FLUJO
+    # ============================================
+    def handle_appointment_request(self, session, clinics_prefetch=None):
+        try:
+            # Si las clínicas se pidieron en paralelo al análisis de intención, se reutilizan
+            if clinics_prefetch is not None:
+                clinics = clinics_prefetch.confirm(timeout=remaining_seconds())
+            else:
+                clinics = self.api.get_health_providers(session.company_id, session.auth_token)
+
+            if not clinics:
+                return self.messages['clinic_unavailable'], 'completed'
+
+            session.clinics = clinics
+
+            response = f"Contamos con los siguientes centros médicos:\n\n"
+            for i, clinic in enumerate(clinics):
+                short_name = get_short_clinic_name(clinic['name'])
+                response += f"{i+1}. {short_name} - $$Horario de atención de 9:00 a 18:00 hrs\n"
+            response += "\n¿En cuál clínica prefieres agendar tu cita?\nResponde con el número de tu opción."
+            return response, 'selecting_clinic'
+        except DeadlineExceeded:
+            # Se responde con turn_timeout (handle_message), no como error de clínicas
+            raise
+        except requests.exceptions.RequestException:
+            return self.handle_appointment_error(None, 'api_connection')
+        except Exception as e:
+            return self.handle_appointment_error(e, 'clinic_fetch')
+
+    def handle_clinic_selection(self, prompt, session):
+        clinics = session.clinics
+        selected_clinic = None
+
+        try:
+            clinic_num = int(prompt.strip()) - 1
+            if 0 <= clinic_num < len(clinics):
+                selected_clinic = clinics[clinic_num]['name']
+        except ValueError:
+            matched_clinic = find_match(prompt, clinics)
+            if matched_clinic:
+                selected_clinic = matched_clinic['name'] if isinstance(matched_clinic, dict) else matched_clinic
+
+        if not selected_clinic:
+            return self.messages['clinic_not_recognized'], 'selecting_clinic'
+
+        session.selected_clinic = selected_clinic
+        next_days = self.get_next_available_days(selected_provider_id(session), 3)
+        session.next_days = next_days
+        response = f"¡Excelente! Has seleccionado {selected_clinic}.\n\nAhora, tengo disponibilidad para agendar una cita en los próximos días hábiles:\n\n"
+        for i, day in enumerate(next_days):
+            response += f"{i+1}. {day}\n"
+        response += "\n¿Para qué día te gustaría agendar? (Selecciona el numero)"
+        return response, 'scheduling'
+
+    def handle_day_selection(self, prompt, session):
+        next_days = session.next_days
+        selected_day = None
+
+        try:
+            day_num = int(prompt.strip()) - 1
+            if 0 <= day_num < len(next_days):
+                selected_day = next_days[day_num]
+        except ValueError:
+            selected_day = find_match(prompt, next_days)
+
+        if not selected_day:
+            return self.messages['day_not_recognized'], 'scheduling'
+
+        hours = self.get_free_hours(session, selected_day)
+        hours_str = "\n".join(f"- {h}" for h in hours)
+        response = f"Genial, el {selected_day} tengo disponibilidad en los siguientes horarios:\n\n{hours_str}\n\n¿A qué hora te gustaría agendar? Escribe la hora que prefieras (ejemplo: 18:00 o 18)."
+
+        session.selected_day = selected_day
+        session.available_hours = hours
+        return response, 'selecting_time'
+
+    def handle_time_selection(self, prompt, session):
+        user_input = prompt.strip()
+
+        # Una lista vacía significa día lleno, no "sin listado": no se cae al rango completo
+        available_hours = session.available_hours if session.available_hours is not None \
+            else [f"{h}:00" for h in range(9, 19)]
+        selected_hour = None
+
+        # Intentar primero como hora directa (18:00 o 18)
+        try:
+            if ":" in user_input:
+                hour, minute = user_input.split(":")
+                hour_num = int(hour)
+            else:
+                hour_num = int(user_input)
+            formatted_hour = f"{hour_num}:00"
+
+            # Validar que esté entre las horas libres del día
+            if formatted_hour in available_hours:
+                selected_hour = formatted_hour
+            elif 9 <= hour_num <= 18:
+                return self.time_taken_response(session)
+        except ValueError:
+            pass
+
+        # Si no funcionó, intentar como número de opción (retrocompatibilidad)
+        if not selected_hour:
+            try:
+                option_num = int(user_input)
+                if 1 <= option_num <= len(available_hours):
+                    selected_hour = available_hours[option_num - 1]
+            except ValueError:
+                pass
+
+        if selected_hour:
+            response = f"Perfecto, reservo para el {session.selected_day} a las {selected_hour}. ¿Confirmo tu cita?"
+            session.selected_time = selected_hour
+            return response, 'confirming'
+        else:
+            return "No reconocí esa hora. Por favor, escribe una hora entre 9:00 y 18:00 (ejemplo: 18:00 o 18).", 'selecting_time'
+
+    def handle_appointment_confirmation(self, session):
+        held_slot = None
+        try:
+            validate_appointment_data(session)
+
+            api_appointment_data = self.prepare_api_appointment_data(session)
+            if not session.auth_token:
+                raise ValueError("Token de autenticación no disponible")
+            appointment = {'day': session.selected_day, 'time': session.selected_time, 'clinic': session.selected_clinic}
+            appointment.update(
+                health_provider_id=api_appointment_data['health_provider_id'], date_time=api_appointment_data['date_time']
+            )
+            slot = parse_slot_datetime(api_appointment_data['date_time'])
+            if not self.slot_index.book(appointment['health_provider_id'], slot):
+                return self.time_taken_response(session)
+            held_slot = (appointment['health_provider_id'], slot)
+
+            # La cita queda guardada antes de enviarse: si la API está lenta o caída se
+            # responde "en proceso" y el resultado llega después (aviso o siguiente turno)
+            remaining = remaining_seconds()
+            outcome = self.outbox.submit(
+                api_appointment_data, session.auth_token, recipient=session.session_id, context=appointment,
+                wait_seconds=self.confirm_wait_seconds if remaining is None else min(self.confirm_wait_seconds, remaining)
+            )
+            # Desde aquí la hora la resuelve el outbox (se libera solo si la cita falla)
+            held_slot = None
+
+            if outcome.status == STATUS_SENT:
+                raise_turn_flag(session, 'appointment_confirmed')
+                self.schedule_appointment_reminders(session.session_id, appointment, outcome.key)
+                return self.messages['appointment_success'].format(**appointment), 'completed'
+            elif outcome.status == STATUS_FAILED:
+                self.slot_index.release(appointment['health_provider_id'], slot)
+                return self.handle_appointment_error(outcome, 'api_error' if outcome.status_code else 'api_connection')
+            else:
+                session.pending_appointment = dict(appointment, key=outcome.key)
+                return self.messages['appointment_queued'].format(**appointment), 'completed'
+
+        except requests.exceptions.RequestException:
+            self.release_held_slot(held_slot)
+            return self.handle_appointment_error(None, 'api_connection')
+        except ValueError as e:
+            self.release_held_slot(held_slot)
+            # Si faltan datos de cita, reiniciar el flujo de agendamiento
+            if "Faltan datos requeridos" in str(e):
+                return self.handle_appointment_request(session)
+            else:
+                return self.handle_appointment_error(e, 'general')
+        except Exception as e:
+            self.release_held_slot(held_slot)
+            return self.handle_appointment_error(e, 'general')
+
+    def release_held_slot(self, held_slot):
+        """Devuelve al índice una hora reservada cuya cita no alcanzó a registrarse"""
+        if held_slot is not None:
+            self.slot_index.release(*held_slot)
+
+    def handle_appointment_flow(self, stage, prompt, session):
+        if stage == 'analyzing':
+            # Las clínicas se piden mientras Bedrock clasifica; si no quiere agendar se descartan
+            clinics_prefetch = SpeculativeCall(self.api.get_health_providers, session.company_id, session.auth_token)
+            intent = self.analyze_user_intent(prompt, 'analyzing')
+            if intent == 'POSITIVA':
+                return self.handle_appointment_request(session, clinics_prefetch)
+            clinics_prefetch.discard()
+            if intent == 'AMBIGUA':
+                return "¿Te gustaría que te ayude a agendar una cita? Por favor responde sí o no para continuar.", 'analyzing'
+            else:
+                return self.messages['appointment_general_declined'], 'completed'
+
+        elif stage == 'selecting_clinic':
+            return self.handle_clinic_selection(prompt, session)
+
+        elif stage == 'scheduling':
+            return self.handle_day_selection(prompt, session)
+
+        elif stage == 'selecting_time':
+            return self.handle_time_selection(prompt, session)
+
+        elif stage == 'confirming':
+            intent = self.analyze_user_intent(prompt, 'confirming')
+            if intent == 'POSITIVA':
+                return self.handle_appointment_confirmation(session)
+            elif intent == 'AMBIGUA':
+                return "¿Confirmas tu cita? Por favor responde sí o no.", 'confirming'
+            else:
+                session.selected_time = None
+                return self.messages['appointment_declined'], 'completed'
+
+        return None, None
+
+    def reset_appointment_selection(self, session):
+        """Olvida la cita en curso (clínica, día, hora y opciones ofrecidas)"""
+        session.selected_clinic = None
+        session.selected_day = None
+        session.selected_time = None
+        session.clinics = None
+        session.next_days = None
+
+    def handle_new_appointment_request(self, prompt, session):
+        """Maneja solicitudes de nueva cita con opción híbrida de usuario"""
+        self.reset_appointment_selection(session)
+
+        # Si ya hay datos de usuario autenticado, ofrecer opciones
+        if session.auth_token and session.user_data:
+            user_name = session.user_data.get('name', 'Usuario actual')
+
+            response = f"""¿Para quién quieres agendar la nueva cita?
+
+1. Mismo usuario ({user_name})
+2. Cambiar de usuario
+
+Por favor, responde con el número de tu opción."""
+
+            return response, 'selecting_user_for_new_appointment'
+        else:
+            # Si no hay datos, ir directo a autenticación
+            return "Para agendar una nueva cita, necesito que te autentiques. Por favor ingresa tu correo electrónico:", 'waiting_email'
+
+    def handle_user_selection_for_new_appointment(self, prompt, session):
+        """Maneja la selección del usuario para nueva cita"""
+        user_choice = prompt.strip()
+
+        if user_choice == '1':
+            # Reutilizar datos existentes - ir directo a selección de clínica
+            return self.handle_appointment_request(session)
+        elif user_choice == '2':
+            self.clear_user_session_data(session)
+            return "Perfecto, vamos a cambiar de usuario. Por favor ingresa tu correo electrónico:", 'waiting_email'
+        else:
+            return "Por favor, responde con **1** para el mismo usuario o **2** para cambiar de usuario.", 'selecting_user_for_new_appointment'
+
+    def clear_user_session_data(self, session):
+        """Limpia los datos de sesión del usuario para permitir cambio de usuario"""
+        self.reset_appointment_selection(session)
+        session.auth_token = None
+        session.user_data = None
+        session.company_id = None
+        session.company_products = None
+        session.user_email = None
+
+    def handle_main_menu_selection(self, prompt, session):
+        """Maneja la selección del menú principal después del login"""
+        keyword_hits = self.keyword_matcher.match(prompt)
+
+        # Detectar intención por palabras clave (agendar tiene prioridad sobre revisar)
+        if 'agendar' in keyword_hits:
+            return self.show_products_menu(session)
+        elif 'revisar' in keyword_hits:
+            return self.start_medical_analysis(session)
+        else:
+            return self.messages['invalid_menu_option'], 'main_menu'
+
+    def show_products_menu(self, session):
+        """Muestra el menú de productos disponibles"""
+        if not session.company_products:
+            return "No hay productos disponibles en este momento. ¿Te gustaría hacer un análisis médico en su lugar?", 'main_menu'
+
+        products_list = ""
+        for product in session.company_products:
+            name = product.get('name', 'Producto sin nombre')
+            products_list += f"- {name}\n"
+
+        response = self.messages['products_menu'].format(products_list=products_list)
+        return response, 'selecting_product'
+
+    def handle_product_selection(self, prompt, session):
+        """Maneja la selección de un producto específico"""
+        selected_product = None
+
+        # Intentar primero con número (retrocompatibilidad)
+        try:
+            product_num = int(prompt.strip()) - 1
+            if 0 <= product_num < len(session.company_products):
+                selected_product = session.company_products[product_num]
+        except ValueError:
+            pass
+
+        # Si no funcionó con número, buscar por nombre
+        if not selected_product:
+            selected_product = find_match(prompt, session.company_products)
+
+        if selected_product:
+            product_name = selected_product.get('name', 'Producto seleccionado')
+            session.selected_product = selected_product
+
+            response = self.messages['product_selected'].format(product_name=product_name)
+            appointment_response, appointment_stage = self.handle_appointment_request(session)
+            return f"{response}\n\n{appointment_response}", appointment_stage
+        else:
+            return self.messages['invalid_product_option'], 'selecting_product'
+
+    def start_medical_analysis(self, session):
+        """Inicia el flujo de análisis médico - selección de laboratorio"""
+        response = "¿Selecciona el laboratorio donde se realizó el examen?\n\n"
+        response += "- Lab. Blanco\n"
+        response += "- Otro\n\n"
+        response += "Escribe la opción que prefieras."
+        return response, 'selecting_lab'
+
+    def handle_lab_selection(self, prompt, session):
+        """Maneja la selección del laboratorio"""
+        keyword_hits = self.keyword_matcher.match(prompt)
+
+        if 'lab_blanco' in keyword_hits:
+            return "Por favor, sube el archivo PDF de tu examen para continuar.", 'waiting_file_upload'
+        elif 'lab_otro' in keyword_hits:
+            return "Para otros laboratorios visita nuestro sitio web: https://bianca.gomind.cl\n\n¿Hay algo más en lo que pueda ayudarte?", 'completed'
+        else:
+            return "No entendí tu selección. Por favor, escribe:\n- 'Lab. Blanco' si tu examen es de Lab. Blanco\n- 'Otro' para otros laboratorios", 'selecting_lab'
+
+    # ============================================
+    # EXÁMENES PDF
+    # ============================================
+    def precheck_error_message(self, precheck):
+        """Motivo del rechazo local, para el mensaje "no pudimos procesar tu examen: ..." """
+        if precheck.reason == REJECT_TOO_LARGE:
+            return self.messages['exam_too_large'].format(max_mb=self.pdf_precheck.max_bytes // (1024 * 1024))
+        if precheck.reason == REJECT_TOO_MANY_PAGES:
+            return self.messages['exam_too_many_pages'].format(max_pages=self.pdf_precheck.max_pages)
+        if precheck.reason == REJECT_NO_LAB_MARKERS:
+            return self.messages['exam_not_lab']
+        return self.messages['exam_invalid_pdf']
+
+    def process_uploaded_examination(self, file_bytes, filename, token):
+        """Orquesta el flujo completo: upload → polling → análisis"""
+        # Paso 0: chequeo local; lo que obviamente no es un examen no se sube ni ocupa un job
+        if self.pdf_precheck is not None:
+            precheck = self.pdf_precheck.check(file_bytes)
+            if not precheck.ok:
+                return None, self.precheck_error_message(precheck)
+
+        # Paso 0b: lectura local; solo si no es confiable se sube al pipeline remoto
+        if self.local_exam_parser is not None:
+            local = self.local_exam_parser.parse(file_bytes)
+            if local.analysis is not None:
+                return local.analysis, None
+
+        # Paso 1: Subir archivo
+        upload_result = self.api.upload_examination(file_bytes, filename, token)
+        job_id = upload_result['job_id']
+
+        # Paso 2: Polling hasta Completado
+        for attempt in range(EXAM_MAX_POLLS):
+            time.sleep(EXAM_POLL_SECONDS)
+            job_status = self.api.check_job_status(job_id, token)
+
+            if job_status.get('status', '').lower() in JOB_COMPLETED_STATUSES:
+                # Paso 3: Verificar success
+                job_response = job_status.get('response', {})
+                if job_response.get('success', False):
+                    # Paso 4: Obtener análisis
+                    return self.api.get_examination_analysis(job_id, token), None
+                else:
+                    return None, job_response.get('error_message', 'No se pudo procesar el examen')
+
+        return None, "El procesamiento está tardando más de lo esperado. Por favor, intenta nuevamente en unos minutos."
+
+    def generate_examination_response(self, analysis_data, session):
+        """Genera la respuesta con los resultados del análisis del PDF"""
+        metadata = analysis_data.get('metadata', {})
+        params_found = analysis_data.get('parameters_found', [])
+        params_out_of_range = analysis_data.get('parameters_out_of_range', [])
+
+        total_params = metadata.get('parameters_found_count', len(params_found))
+        out_of_range_count = metadata.get('parameters_out_of_range_count', len(params_out_of_range))
+
+        # Si no se encontraron parámetros médicos, no es un examen válido
+        if total_params == 0:
+            return "El documento que subiste no corresponde a un examen de laboratorio o no pudimos identificar parámetros médicos en él.", 'selecting_lab'
+
+        user_name = get_session_user_name(session)
+
+        if out_of_range_count == 0:
+            # Todos los parámetros están bien
+            results_text = ""
+            for p in params_found:
+                value = p['analysis'][0]['value'] if p.get('analysis') else 'N/A'
+                unit = p.get('unit_of_measure', '')
+                results_text += f"- {p['name']}: {value} {unit}\n"
+
+            response = f"¡{user_name}! Gracias por compartir tu examen. Me da gusto poder revisarlo contigo.\n\n"
+            response += f"¡Excelente noticia! Se encontraron {total_params} parámetros y todos están dentro del rango saludable:\n\n{results_text}"
+
+            # Generar pasos con IA
+            results_dict = {}
+            for p in params_found:
+                try:
+                    val = float(p['analysis'][0]['value']) if p.get('analysis') else 0
+                    results_dict[p['name']] = val
+                except (ValueError, IndexError):
+                    pass
+
+            return self.build_exam_reply(response, results_dict, [], True, self.messages['disclaimer']), 'completed'
+        else:
+            # Hay parámetros fuera de rango
+            issues_text = ""
+            for p in params_out_of_range:
+                value = p['analysis'][0]['value'] if p.get('analysis') else 'N/A'
+                unit = p.get('unit_of_measure', '')
+                ranges = ', '.join(p['analysis'][0].get('reference_ranges', [])) if p.get('analysis') else 'N/A'
+                issues_text += f"- {p['name']}: {value} {unit} (Rango referencia: {ranges})\n"
+
+            response = f"¡{user_name}! Gracias por compartir tu examen. He revisado tus resultados.\n\n"
+            response += f"Se encontraron {total_params} parámetros, de los cuales {out_of_range_count} están fuera de rango:\n\n{issues_text}"
+
+            # Generar pasos con IA
+            results_dict = {}
+            issues_list = []
+            for p in params_out_of_range:
+                try:
+                    val = float(p['analysis'][0]['value']) if p.get('analysis') else 0
+                    results_dict[p['name']] = val
+                    issues_list.append(f"{p['name']} fuera de rango: {p['analysis'][0]['value']}")
+                except (ValueError, IndexError):
+                    pass
+
+            closing = self.messages['disclaimer'] + f"\n\n{self.messages['appointment_question']}"
+            return self.build_exam_reply(response, results_dict, issues_list, False, closing), 'analyzing'
+
+    def handle_medical_input(self, prompt, session):
+        if prompt.strip().isdigit() and len(prompt.strip()) > 0:
+            user_id = prompt.strip()
+            return self.process_medical_results(user_id, "Usuario", session)
+
+        try:
+            data = json.loads(prompt)
+            if isinstance(data, dict) and self.keyword_matcher.has(str(data), 'parametro_medico'):
+                user_name = data.get('nombre_usuario', 'Usuario')
+                results = {k: v for k, v in data.items() if k != 'nombre_usuario'}
+                session.user_data = {"results": results}
+
+                issues, needs_appointment = self.analyze_results(results)
+                return self.generate_medical_response(results, issues, user_name, session)
+        except json.JSONDecodeError:
+            pass
+
+        return None, None
+
+    def handle_contextual_conversation(self, prompt, session):
+        """Maneja conversación con contexto completo y detección de despedidas"""
+        farewell_intent = self.analyze_farewell_intent(prompt, session)
+
+        if farewell_intent == 'DESPEDIDA':
+            return self.generate_farewell_response(session), 'conversation_ended'
+
+        # El constructor de prompts agrega los mensajes recientes y el resumen: aquí solo usuario y estado
+        return self.invoke_bedrock_smart(prompt, 'contextual', self.get_stage_header(session), session), 'completed'
+
+    def handle_authentication_flow(self, stage, prompt, session):
+        if stage == 'waiting_email':
+            email = prompt.strip().lower()
+            if is_valid_email(email):
+                session.user_email = email
+
+                try:
+                    self.api.send_verification_code(email)
+                    return self.messages['verification_code_sent'], 'waiting_verification_code'
+                except Exception as e:
+                    error_msg = str(e)
+                    if "Usuario no encontrado" in error_msg or "No encontramos" in error_msg:
+                        return error_msg, 'waiting_email'
+                    else:
+                        return f"Error enviando código de verificación: {error_msg}. Por favor, intenta nuevamente.", 'waiting_email'
+            else:
+                return "Parece que hay un pequeño error en el dato que ingresaste. Revísalo y vuelve a intentarlo, por favor. Recuerda que necesitamos tu correo electrónico", 'waiting_email'
+
+        elif stage == 'waiting_verification_code':
+            verification_code = prompt.strip()
+
+            # CASO 1: Si es numérico → Validar directamente como código (sin IA)
+            if verification_code.isdigit():
+                try:
+                    auth_data = self.api.authenticate_with_code(session.user_email, verification_code)
+
+                    session.auth_token = auth_data['token']
+                    session.company_id = auth_data['company_id']
+
+                    user_data = auth_data['user_data']
+                    user_id = user_data.get('user_id') or user_data.get('id') or user_data.get('userId')
+                    user_name = user_data.get('name', 'Usuario')
+
+                    session.user_data = {
+                        'id': user_id,
+                        'name': user_name
+                    }
+
+                    try:
+                        session.company_products = self.api.get_company_products(auth_data['company_id'], auth_data['token'])
+                    except Exception:
+                        session.company_products = []
+
+                    success_message = self.messages['code_authentication_success']
+                    menu_message = self.messages['login_success_menu'].format(user_name=user_name)
+
+                    return f"{success_message}\n\n{menu_message}", 'main_menu'
+
+                except Exception as e:
+                    error_msg = str(e)
+                    if "código" in error_msg.lower() or "inválido" in error_msg.lower():
+                        return self.messages['invalid_code'], 'waiting_verification_code'
+                    else:
+                        return self.messages['code_error'], 'waiting_verification_code'
+
+            # CASO 2 y 3: No es numérico → ¿Es solicitud de reenvío o texto basura?
+            else:
+                # Primero verificar con keywords rápidas (sin costo)
+                es_reenvio = self.keyword_matcher.has(verification_code, 'reenvio')
+
+                # Si no coincide con keywords, usar IA específica como fallback
+                if not es_reenvio:
+                    es_reenvio = self.analyze_resend_intent(prompt)
+
+                if es_reenvio:
+                    if session.resend_count >= 3:
+                        return "Has alcanzado el límite de reenvíos. Por favor, revisa tu carpeta de spam o correo no deseado. Si necesitas ayuda adicional, contacta a support@gomind.cl", 'waiting_verification_code'
+
+                    try:
+                        session.resend_count += 1
+                        self.api.send_verification_code(session.user_email)
+
+                        if session.resend_count == 3:
+                            return "Te envié un nuevo código de verificación a tu correo. Escríbelo aquí para continuar.\n\n💡 Si no lo encuentras, revisa tu carpeta de spam o correo no deseado. Si el problema persiste, contacta a support@gomind.cl\n(Último intento disponible)", 'waiting_verification_code'
+                        else:
+                            return f"Te envié un nuevo código de verificación a tu correo. Escríbelo aquí para continuar.\n(Intento {session.resend_count} de 3)", 'waiting_verification_code'
+                    except Exception:
+                        return "No pudimos reenviar el código. Por favor, intenta nuevamente en unos minutos o contacta a support@gomind.cl", 'waiting_verification_code'
+                else:
+                    # No es reenvío ni código válido → Texto basura
+                    return self.messages['code_error'], 'waiting_verification_code'
+
+        elif stage == 'authenticated':
+            # process_medical_results ya traduce los errores de la API a una respuesta
+            return self.process_medical_results(prompt.strip(), "Usuario", session)
+
+        return None, None
+
+    # ============================================
+    # HANDLERS POR STAGE
+    # ============================================
+    def handle_initial_stage(self, prompt, session):
+        # El usuario escribió algo por primera vez - mostrar mensaje de bienvenida
+        return WELCOME_MESSAGE, 'waiting_email'
+
+    def handle_showing_products_stage(self, prompt, session):
+        intent = self.analyze_user_intent(prompt, 'showing_products')
+        if intent == 'PRODUCTOS':
+            products = session.company_products
+            if products:
+                response = "Aquí tienes los productos disponibles de tu compañía:\n\n"
+                for product in products:
+                    name = product.get('name', 'Producto sin nombre')
+                    description = product.get('description', 'Sin descripción')
+                    price = product.get('price', 'Precio no disponible')
+                    response += f"**{name}**\n{description}\nPrecio: {price}\n\n"
+                return response, 'showing_products'
+            else:
+                return "No hay productos disponibles en este momento.", 'authenticated'
+        else:
+            return None, 'authenticated'
+
+    def handle_waiting_file_upload_stage(self, prompt, session):
+        # Texto recibido mientras se espera el archivo
+        return self.messages['file_upload_reminder'], 'waiting_file_upload'
+
+    def handle_waiting_json_stage(self, prompt, session):
+        response, new_stage = self.handle_medical_input(prompt, session)
+        if response is not None:
+            return response, new_stage
+        return "El formato JSON no es válido. Por favor, comparte tus resultados en formato JSON válido, ejemplo: {\"Glicemia Basal\": 90, \"Hemoglobina\": 13}", 'waiting_json'
+
+    def main_menu_response(self, session):
+        return self.messages['login_success_menu'].format(user_name=get_session_user_name(session)), 'main_menu'
+
+    def handle_completed_stage(self, prompt, session):
+        response, new_stage = self.handle_medical_input(prompt, session)
+        if response is not None:
+            return response, new_stage
+
+        if had_turn_flag(session, 'appointment_confirmed'):
+            # Después de confirmar cita: mostrar menú principal directo
+            return self.main_menu_response(session)
+
+        # Flujo normal: no hay cita confirmada reciente
+        farewell_intent = self.analyze_farewell_intent(prompt, session)
+        if farewell_intent == 'DESPEDIDA':
+            return self.generate_farewell_response(session), 'conversation_ended'
+
+        intent = self.analyze_user_intent(prompt, 'completed')
+        if intent in ['NUEVA_CITA', 'POSITIVA']:
+            if self.offer_user_switch:
+                return self.handle_new_appointment_request(prompt, session)
+            self.reset_appointment_selection(session)
+            return self.handle_appointment_request(session)
+        elif intent == 'NEGATIVA':
+            return self.generate_farewell_response(session), 'conversation_ended'
+
+        # En lugar de conversación libre, redirigir al menú principal
+        return self.handle_unrecognized_stage(prompt, session)
+
+    def handle_conversation_ended_stage(self, prompt, session):
+        response, new_stage = self.handle_medical_input(prompt, session)
+        if response is not None:
+            return response, new_stage
+
+        # Si el turno anterior fue la despedida → Mostrar menú principal
+        if had_turn_flag(session, 'farewell_sent'):
+            return self.main_menu_response(session)
+
+        # Si no, verificar saludo para reiniciar
+        if self.keyword_matcher.has(prompt, 'saludo'):
+            if session.auth_token:
+                return self.main_menu_response(session)
+            else:
+                return WELCOME_MESSAGE, 'waiting_email'
+
+        # Si no es saludo, mantener conversación cerrada
+        return "¡Que tengas un excelente día! Si necesitas algo más, solo escribe **hola** y te ayudo.", 'conversation_ended'
+
+    def handle_unrecognized_stage(self, prompt, session):
+        # Default fallback - redirigir al menú principal en lugar de conversación libre
+        if session.auth_token:
+            menu, stage = self.main_menu_response(session)
+            return f"No estoy segura de cómo ayudarte con eso. Te muestro las opciones disponibles:\n\n{menu}", stage
+        else:
+            return WELCOME_MESSAGE, 'waiting_email'
@@ -0,0 +1,89 @@
+from functools import partial
+
+# ============================================
+# TABLA DE TRANSICIONES (usada por conversation_engine.py)
+# ============================================
+
+# stage → nombre del handler. El motor compila la tabla contra sus propios
+# métodos al crearse, así el despacho de un turno es un único acceso a dict.
+STAGE_HANDLERS = {
+    'initial': 'handle_initial_stage',
+    'waiting_email': 'handle_authentication_flow',
+    'waiting_verification_code': 'handle_authentication_flow',
+    'authenticated': 'handle_authentication_flow',
+    'showing_products': 'handle_showing_products_stage',
+    'main_menu': 'handle_main_menu_selection',
+    'selecting_lab': 'handle_lab_selection',
+    'waiting_file_upload': 'handle_waiting_file_upload_stage',
+    'selecting_product': 'handle_product_selection',
+    'selecting_user_for_new_appointment': 'handle_user_selection_for_new_appointment',
+    'analyzing': 'handle_appointment_flow',
+    'selecting_clinic': 'handle_appointment_flow',
+    'scheduling': 'handle_appointment_flow',
+    'selecting_time': 'handle_appointment_flow',
+    'confirming': 'handle_appointment_flow',
+    'waiting_json': 'handle_waiting_json_stage',
+    'completed': 'handle_completed_stage',
+    'conversation_ended': 'handle_conversation_ended_stage',
+}
+
+# Handlers que atienden varios stages y reciben el stage como primer argumento
+STAGE_AWARE_HANDLERS = frozenset({'handle_authentication_flow', 'handle_appointment_flow'})
+
+# Handler usado cuando el stage no está en la tabla o el handler no resolvió el turno
+DEFAULT_HANDLER = 'handle_unrecognized_stage'
+
+# Flags explícitos que un turno deja para el siguiente (reemplazan la búsqueda en el historial)
+TURN_FLAGS = frozenset({'appointment_confirmed', 'farewell_sent'})
+
+# Stages con autenticación o agendamiento en curso: bajo carga se atienden antes
+# que la conversación libre
+PRIORITY_STAGES = frozenset({
+    'waiting_email', 'waiting_verification_code', 'authenticated',
+    'showing_products', 'selecting_product', 'selecting_user_for_new_appointment',
+    'analyzing', 'selecting_clinic', 'scheduling', 'selecting_time', 'confirming',
+})
+
+
+def compile_stage_table(namespace):
+    """
+    Resuelve STAGE_HANDLERS contra un namespace de funciones (módulo o métodos del motor).
+
+    Los stages cuyo handler no existe en el namespace se omiten y caen en el
+    handler por defecto, igual que un stage desconocido.
+    """
+    table = {}
+    for stage, handler_name in STAGE_HANDLERS.items():
+        handler = namespace.get(handler_name)
+        if handler is None:
+            continue
+        table[stage] = partial(handler, stage) if handler_name in STAGE_AWARE_HANDLERS else handler
+    return table, namespace[DEFAULT_HANDLER]
+
+
+def begin_turn(session):
+    """Rota los flags: los del turno anterior quedan disponibles para consulta y se parte de cero"""
+    session.previous_turn_flags = getattr(session, 'turn_flags', None) or set()
+    session.turn_flags = set()
+
+
+def raise_turn_flag(session, flag):
+    """Marca un evento del turno actual (ej: 'appointment_confirmed')"""
+    if flag not in TURN_FLAGS:
+        raise ValueError(f"Flag de turno desconocido: {flag}")
+    session.turn_flags.add(flag)
+
+
+def had_turn_flag(session, flag):
+    """Indica si el turno anterior marcó el flag"""
+    return flag in (getattr(session, 'previous_turn_flags', None) or ())
+
+
+def dispatch_stage(stage_table, default_handler, stage, prompt, *context):
+    """Despacha un turno en O(1); cae al handler por defecto si el stage no resolvió"""
+    handler = stage_table.get(stage)
+    if handler is not None:
+        response, new_stage = handler(prompt, *context)
+        if new_stage is not None:
+            return response, new_stage
+    return default_handler(prompt, *context)
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+JOB_COMPLETED_STATUSES = frozenset({'completado', 'completed'})
+JOB_FAILED_STATUSES = frozenset({'fallido', 'failed', 'error'})
+
+DEFAULT_UPLOAD_WORKERS = 4
+DEFAULT_API_WORKERS = 8
+# Jobs subidos y aún sin resultado: acota la carga que ponemos sobre el procesador de exámenes
+DEFAULT_MAX_OUTSTANDING_JOBS = 64
+DEFAULT_MIN_POLL_SECONDS = 0.5
+DEFAULT_MAX_POLL_SECONDS = 10.0
+DEFAULT_JOB_TIMEOUT_SECONDS = 600.0
+UPLOAD_ATTEMPTS = 3
+# Errores seguidos consultando un job antes de darlo por fallido
+MAX_POLL_ERRORS = 5
+API_TIMEOUT = 30
+
+MANIFEST_UPLOADED = 'uploaded'
+MANIFEST_COMPLETED = 'completed'
+MANIFEST_FAILED = 'failed'
+
+
+class PrecheckRejected(Exception):
+    """El chequeo local descartó el PDF antes de subirlo"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExaminationsClient:
+    """Cliente de /api/examinations con una sesión HTTP compartida (conexiones reutilizadas entre threads)"""
+
+    def __init__(self, api_base_url, token, pool_size=DEFAULT_UPLOAD_WORKERS + DEFAULT_API_WORKERS):
+        self.api_base_url = api_base_url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def upload(self, filename, file_bytes):
+        response = self.session.post(f"{self.api_base_url}/api/examinations/upload", timeout=60,
+                                     files={"file": (filename, file_bytes, "application/pdf")})
+        if response.status_code != 200:
+            raise Exception(f"Error subiendo examen: {response.status_code} - {response.text}")
+        return response.json()['job_id']
+
+    def job_status(self, job_id):
+        response = self.session.get(f"{self.api_base_url}/api/examinations/job/{job_id}", timeout=API_TIMEOUT)
+        if response.status_code != 200:
+            raise Exception(f"Error consultando job: {response.status_code} - {response.text}")
+        return response.json()
+
+    def analysis(self, job_id):
+        response = self.session.get(f"{self.api_base_url}/api/examinations/analysis-job/{job_id}", timeout=API_TIMEOUT)
+        if response.status_code != 200:
+            raise Exception(f"Error obteniendo análisis: {response.status_code} - {response.text}")
+        return response.json()
+
+
+class IngestionManifest:
+    """
+    Manifest JSONL de solo-agregar: una línea por cambio de estado de cada
+    archivo (la última manda). Permite reanudar una carga interrumpida sin
+    volver a subir lo ya subido ni reprocesar lo ya completado.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # última línea a medio escribir si el proceso murió
+                    self.entries[entry['file']] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def record(self, name, **fields):
+        entry = dict(self.entries.get(name, {}), file=name, at=time.time(), **fields)
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.entries[name] = entry
+
+    def close(self):
+        self._file.close()
+
+
+class BulkExamIngestor:
+    """
+    Carga masiva de PDFs en tubería: subidas con `upload_workers` en paralelo
+    (a lo más `max_outstanding` jobs sin terminar), un solo loop que consulta
+    todos los jobs pendientes que vencen y descarga los análisis en paralelo.
+
+    El intervalo de consulta es adaptativo: la primera consulta se hace cerca
+    del tiempo de procesamiento observado (promedio móvil) y luego crece x1.5
+    hasta `max_poll_seconds`, en vez de consultar cada segundo.
+
+    Con `precheck` (un PdfPrecheck) los archivos que obviamente no son
+    exámenes se descartan sin subirlos.
+    """
+
+    def __init__(self, client, manifest, output_dir, upload_workers=DEFAULT_UPLOAD_WORKERS,
+                 api_workers=DEFAULT_API_WORKERS, max_outstanding=DEFAULT_MAX_OUTSTANDING_JOBS,
+                 min_poll_seconds=DEFAULT_MIN_POLL_SECONDS, max_poll_seconds=DEFAULT_MAX_POLL_SECONDS,
+                 job_timeout_seconds=DEFAULT_JOB_TIMEOUT_SECONDS, precheck=None, log=print):
+        self.client = client
+        self.manifest = manifest
+        self.output_dir = output_dir
+        self.upload_workers = upload_workers
+        self.api_workers = api_workers
+        self.max_outstanding = max_outstanding
+        self.min_poll_seconds = min_poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self.precheck = precheck
+        self.log = log
+        self._processing_ewma = None
+        self._stats = {}
+
+    def _upload(self, name, path):
+        with open(path, 'rb') as f:
+            file_bytes = f.read()
+        sha256 = hashlib.sha256(file_bytes).hexdigest()
+        if self.precheck is not None:
+            result = self.precheck.check(file_bytes)
+            if not result.ok:
+                raise PrecheckRejected(f"Rechazado por el chequeo local: {result.reason}")
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            try:
+                return self.client.upload(os.path.basename(path), file_bytes), sha256, len(file_bytes)
+            except Exception:
+                if attempt == UPLOAD_ATTEMPTS:
+                    raise
+                time.sleep(2 ** attempt * random.uniform(0.5, 1.0))
+
+    def _first_poll_delay(self):
+        if self._processing_ewma is None:
+            return self.min_poll_seconds
+        return max(self.min_poll_seconds, 0.8 * self._processing_ewma)
+
+    def _track(self, job_id, name, uploaded_at):
+        self._outstanding[job_id] = {
+            'name': name, 'uploaded_at': uploaded_at, 'next_poll_at': time.monotonic() + self._first_poll_delay(),
+            'interval': self.min_poll_seconds, 'polling': False, 'errors': 0
+        }
+
+    def _fail(self, name, error):
+        self._stats['failed'] += 1
+        self.manifest.record(name, status=MANIFEST_FAILED, error=str(error))
+        self.log(f"Error en {name}: {error}")
+
+    def _output_path(self, name):
+        return os.path.join(self.output_dir, name + ".json")
+
+    def _plan(self, files):
+        """Separa lo ya completado, los jobs a retomar y lo que falta subir"""
+        todo = []
+        for name, path in files:
+            entry = self.manifest.get(name)
+            if entry and entry['status'] in (MANIFEST_COMPLETED, MANIFEST_UPLOADED) \
+                    and entry.get('sha256') == file_sha256(path):
+                if entry['status'] == MANIFEST_COMPLETED:
+                    self._stats['skipped'] += 1
+                else:
+                    self._stats['resumed'] += 1
+                    self._track(entry['job_id'], name, time.monotonic())
+                continue
+            todo.append((name, path))
+        todo.reverse()
+        return todo
+
+    def _on_upload(self, name, future):
+        try:
+            job_id, sha256, size = future.result()
+        except Exception as e:
+            if isinstance(e, PrecheckRejected):
+                self._stats['rejected'] += 1
+            self._fail(name, e)
+            return
+        self._stats['uploaded'] += 1
+        self._stats['uploaded_bytes'] += size
+        self.manifest.record(name, status=MANIFEST_UPLOADED, job_id=job_id, sha256=sha256, error=None)
+        self._track(job_id, name, time.monotonic())
+
+    def _on_poll(self, job_id, future, api_pool):
+        job = self._outstanding[job_id]
+        job['polling'] = False
+        self._stats['polls'] += 1
+        now = time.monotonic()
+        try:
+            status = future.result()
+            job['errors'] = 0
+        except Exception as e:
+            job['errors'] += 1
+            if job['errors'] >= MAX_POLL_ERRORS:
+                del self._outstanding[job_id]
+                self._fail(job['name'], e)
+                return
+            status = {}
+
+        state = str(status.get('status', '')).lower()
+        if state in JOB_COMPLETED_STATUSES:
+            del self._outstanding[job_id]
+            response = status.get('response', {})
+            if not response.get('success', False):
+                self._fail(job['name'], response.get('error_message', 'No se pudo procesar el examen'))
+                return
+            processing = now - job['uploaded_at']
+            self._processing_ewma = processing if self._processing_ewma is None \
+                else 0.8 * self._processing_ewma + 0.2 * processing
+            self._analyses[api_pool.submit(self.client.analysis, job_id)] = (job_id, job['name'], processing)
+        elif state in JOB_FAILED_STATUSES:
+            del self._outstanding[job_id]
+            self._fail(job['name'], status.get('response', {}).get('error_message', state))
+        elif now - job['uploaded_at'] > self.job_timeout_seconds:
+            del self._outstanding[job_id]
+            self._fail(job['name'], "El procesamiento excedió el tiempo máximo")
+        else:
+            job['interval'] = min(job['interval'] * 1.5, self.max_poll_seconds)
+            job['next_poll_at'] = now + job['interval']
+
+    def _on_analysis(self, job_id, name, processing, future):
+        try:
+            analysis = future.result()
+        except Exception as e:
+            self._fail(name, e)
+            return
+        output = self._output_path(name)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(analysis, f, ensure_ascii=False)
+        self._stats['completed'] += 1
+        self._stats['processing_seconds'] += processing
+        self.manifest.record(name, status=MANIFEST_COMPLETED, job_id=job_id, output=output, error=None)
+        if self._stats['completed'] % 100 == 0:
+            self.log(f"{self._stats['completed']} exámenes completados")
+
+    def run(self, files):
+        """Procesa [(nombre, ruta)] y retorna el reporte de la carga"""
+        self._stats = dict.fromkeys(('skipped', 'resumed', 'uploaded', 'rejected', 'completed', 'failed', 'polls',
+                                     'uploaded_bytes'), 0)
+        self._stats['processing_seconds'] = 0.0
+        self._outstanding, self._analyses = {}, {}
+        uploads, polls = {}, {}
+        start = time.monotonic()
+        todo = self._plan(files)
+
+        with ThreadPoolExecutor(self.upload_workers, thread_name_prefix="exam-upload") as upload_pool, \
+                ThreadPoolExecutor(self.api_workers, thread_name_prefix="exam-api") as api_pool:
+            while todo or uploads or polls or self._analyses or self._outstanding:
+                while todo and len(uploads) + len(self._outstanding) < self.max_outstanding:
+                    name, path = todo.pop()
+                    uploads[upload_pool.submit(self._upload, name, path)] = name
+
+                # Una pasada consulta todos los jobs que vencieron
+                now = time.monotonic()
+                next_due = None
+                for job_id, job in self._outstanding.items():
+                    if job['polling']:
+                        continue
+                    if job['next_poll_at'] <= now:
+                        job['polling'] = True
+                        polls[api_pool.submit(self.client.job_status, job_id)] = job_id
+                    elif next_due is None or job['next_poll_at'] < next_due:
+                        next_due = job['next_poll_at']
+
+                timeout = None if next_due is None else max(0.0, next_due - now)
+                running = list(uploads) + list(polls) + list(self._analyses)
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in uploads:
+                        self._on_upload(uploads.pop(future), future)
+                    elif future in polls:
+                        self._on_poll(polls.pop(future), future, api_pool)
+                    else:
+                        self._on_analysis(*self._analyses.pop(future), future)
+
+        elapsed = time.monotonic() - start
+        completed = self._stats['completed']
+        processing_seconds = self._stats.pop('processing_seconds')
+        return dict(
+            self._stats,
+            files=len(files),
+            elapsed_seconds=round(elapsed, 2),
+            files_per_minute=round(completed / elapsed * 60, 1) if elapsed else 0.0,
+            avg_processing_seconds=round(processing_seconds / completed, 2) if completed else None,
+            polls_per_job=round(self._stats['polls'] / (completed + self._stats['failed']), 2)
+            if completed + self._stats['failed'] else None
+        )
@@ -0,0 +1,169 @@
+import requests
+
+from singleflight import API_SINGLEFLIGHT
+from turn_deadline import call_timeout
+
+API_TIMEOUT = 30
+UPLOAD_TIMEOUT = 60
+
+
+class GoMindApiClient:
+    """
+    Cliente de la API GoMind compartido por el chat web y WhatsApp.
+
+    No guarda estado de sesión: el token de cada usuario viaja como argumento,
+    así una misma instancia atiende turnos de distintos usuarios desde varios
+    threads. El circuit breaker, la caché condicional de resultados y el
+    single-flight de recursos por empresa se inyectan y se comparten entre
+    todos los turnos del proceso.
+    """
+
+    def __init__(self, base_url, breaker, response_cache, normalizer, singleflight=API_SINGLEFLIGHT,
+                 timeout=API_TIMEOUT, upload_timeout=UPLOAD_TIMEOUT):
+        self.base_url = base_url
+        self.breaker = breaker
+        self.response_cache = response_cache
+        self.normalizer = normalizer
+        self.singleflight = singleflight
+        self.timeout = timeout
+        self.upload_timeout = upload_timeout
+
+    def _post(self, url, **kwargs):
+        return self.breaker.call(requests.post, url, timeout=call_timeout(self.timeout), **kwargs)
+
+    def _get(self, url, headers):
+        return self.breaker.call(requests.get, url, headers=headers, timeout=call_timeout(self.timeout))
+
+    def send_verification_code(self, email):
+        """Envía código de verificación al correo del usuario"""
+        response = self._post(f"{self.base_url}/api/auth/login/user-exist", json={"email": email})
+
+        if response.status_code == 200:
+            data = response.json()
+            user_exists = data.get('user_exist', True)
+            message = data.get('message', '')
+
+            if not user_exists:
+                raise Exception(message if message else "Usuario no encontrado")
+
+            return True
+        else:
+            raise Exception(f"Error enviando código: {response.text}")
+
+    def authenticate_with_code(self, email, auth_code):
+        """Autentica con código de verificación para obtener token completo"""
+        payload = {"email": email, "auth_code": int(auth_code)}
+        response = self._post(f"{self.base_url}/api/auth/login/wsp", json=payload)
+
+        if response.status_code == 200:
+            data = response.json()
+
+            if not data.get('success', True):
+                raise Exception(f"Código inválido: {data.get('message', 'Código de verificación incorrecto')}")
+
+            token = data.get('token')
+            company_id = data.get('company', {}).get('company_id')
+            user_data = data.get('user', {})
+
+            if not token or not company_id or not user_data:
+                raise Exception("Error en autenticación: datos incompletos del servidor")
+
+            return {'token': token, 'company_id': company_id, 'user_data': user_data}
+        else:
+            raise Exception(f"Error autenticando con código: {response.text}")
+
+    def _shared_company_get(self, endpoint, url, headers):
+        """
+        GET de recursos por empresa (iguales para todos sus empleados): las llamadas
+        concurrentes a la misma URL comparten una sola petición. Solo se comparten
+        respuestas 200; ante otro status cada llamador usa su propio token.
+        """
+        return self.singleflight.do(
+            endpoint, url, lambda: self._get(url, headers),
+            share_if=lambda response: response.status_code == 200
+        )
+
+    def get_company_products(self, company_id, token):
+        url = f"{self.base_url}/api/companies/{company_id}/products"
+        response = self._shared_company_get('products', url, {"Authorization": f"Bearer {token}"})
+        if response.status_code == 200:
+            return response.json().get('products', [])
+        else:
+            raise Exception(f"Error obteniendo productos: {response.status_code} - {response.text}")
+
+    def get_health_providers(self, company_id, token):
+        url = f"{self.base_url}/api/companies/{company_id}/health-providers"
+        response = self._shared_company_get('health-providers', url, {"Authorization": f"Bearer {token}"})
+        if response.status_code == 200:
+            return response.json().get('healthProviders', [])
+        else:
+            raise Exception(f"Error obteniendo proveedores de salud: {response.status_code} - {response.text}")
+
+    def get_user_results(self, token):
+        """Resultados del usuario del token; un 401 se informa como SESSION_EXPIRED"""
+        url = f"{self.base_url}/api/parameters/results-user"
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def parse(response):
+            if response.status_code == 401:
+                raise Exception("SESSION_EXPIRED")
+            elif response.status_code == 200:
+                data = response.json()
+                if isinstance(data, list):
+                    if len(data) == 0:
+                        raise Exception("Paciente no identificado o sin resultados disponibles.")
+                    return self.normalizer.build_results(data)
+                else:
+                    return data
+            else:
+                raise Exception(f"Error obteniendo resultados: {response.status_code} - {response.text}")
+
+        # Con 304 se reutilizan los resultados ya parseados
+        return self.response_cache.fetch(
+            'results-user', (url, token),
+            lambda conditional: self._get(url, {**headers, **conditional}),
+            parse
+        )
+
+    def send_appointment(self, appointment_api_data, token, idempotency_key=None):
+        """POST de la cita; retorna la respuesta tal cual (el outbox decide si reintentar)"""
+        if not token:
+            raise ValueError("Token de autenticación no disponible")
+
+        headers = {"Authorization": f"Bearer {token}"}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        return self._post(f"{self.base_url}/api/appointments", json=appointment_api_data, headers=headers)
+
+    def upload_examination(self, file_bytes, filename, token):
+        """Sube el PDF al endpoint de examinations"""
+        url = f"{self.base_url}/api/examinations/upload"
+        headers = {"Authorization": f"Bearer {token}"}
+        files = {"file": (filename, file_bytes, "application/pdf")}
+
+        response = self.breaker.call(requests.post, url, headers=headers, files=files,
+                                     timeout=call_timeout(self.upload_timeout))
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Error subiendo examen: {response.status_code} - {response.text}")
+
+    def check_job_status(self, job_id, token):
+        """Consulta el estado del job de procesamiento"""
+        response = self._get(f"{self.base_url}/api/examinations/job/{job_id}", {"Authorization": f"Bearer {token}"})
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Error consultando job: {response.status_code} - {response.text}")
+
+    def get_examination_analysis(self, job_id, token):
+        """Obtiene el análisis del examen procesado"""
+        response = self._get(f"{self.base_url}/api/examinations/analysis-job/{job_id}",
+                             {"Authorization": f"Bearer {token}"})
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Error obteniendo análisis: {response.status_code} - {response.text}")
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from singleflight import SingleFlight
+
+DEFAULT_IDEMPOTENCY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhook_deliveries.db")
+# Twilio reintenta un webhook durante unos minutos; una hora cubre los reintentos con holgura
+DEFAULT_IDEMPOTENCY_TTL_SECONDS = 3600
+DEFAULT_IDEMPOTENCY_MAX_ENTRIES = 10000
+# Si el worker que procesa una entrega muere, otro la retoma pasado este plazo
+DEFAULT_PROCESSING_LEASE_SECONDS = 120
+DEFAULT_JOIN_POLL_SECONDS = 0.1
+
+STATE_PROCESSING = 'processing'
+STATE_DONE = 'done'
+_CLAIMED = 'claimed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    delivery_key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    response TEXT,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS webhook_deliveries_updated ON webhook_deliveries (updated_at);
+"""
+
+
+class IdempotencyCache:
+    """
+    Respuestas ya calculadas por clave de entrega (MessageSid de Twilio).
+
+    `run_once(key, fn)` ejecuta `fn()` una sola vez por clave: un reintento que
+    llega después recibe la respuesta guardada, y uno que llega mientras la
+    primera entrega aún se procesa espera su resultado. Si `fn` falla no se
+    guarda nada y el siguiente reintento vuelve a procesar.
+
+    Las entregas viven en SQLite, así que la deduplicación vale entre workers
+    y tras un reinicio. Dentro del proceso los reintentos concurrentes se unen
+    al vuelo en curso; entre procesos, el que encuentra la entrega "en proceso"
+    consulta la tabla hasta que se resuelve (o vence el plazo del dueño).
+
+    Acotada por TTL y por cantidad de entradas. `fn` debe retornar algo
+    serializable a JSON (el TwiML como texto).
+    """
+
+    def __init__(self, path=DEFAULT_IDEMPOTENCY_PATH, ttl_seconds=DEFAULT_IDEMPOTENCY_TTL_SECONDS,
+                 max_entries=DEFAULT_IDEMPOTENCY_MAX_ENTRIES, processing_lease_seconds=DEFAULT_PROCESSING_LEASE_SECONDS,
+                 join_poll_seconds=DEFAULT_JOIN_POLL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.processing_lease_seconds = processing_lease_seconds
+        self.join_poll_seconds = join_poll_seconds
+        self._flight = SingleFlight()
+        self._stats = {'processed': 0, 'replayed': 0, 'joined_other_worker': 0}
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _claim(self, key):
+        """(STATE_DONE, respuesta), (STATE_PROCESSING, None) si otro worker la procesa, o (_CLAIMED, None)"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT state, response, expires_at FROM webhook_deliveries WHERE delivery_key = ?", (key,)
+            ).fetchone()
+            if row is not None and row['expires_at'] > now:
+                conn.execute("COMMIT")
+                if row['state'] == STATE_DONE:
+                    return STATE_DONE, json.loads(row['response'])
+                return STATE_PROCESSING, None
+            # Nueva, vencida o abandonada por un worker que murió: la toma este proceso
+            conn.execute(
+                """INSERT OR REPLACE INTO webhook_deliveries (delivery_key, state, response, expires_at, updated_at)
+                   VALUES (?, ?, NULL, ?, ?)""",
+                (key, STATE_PROCESSING, now + self.processing_lease_seconds, now)
+            )
+            conn.execute("COMMIT")
+        return _CLAIMED, None
+
+    def _store(self, key, response):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE webhook_deliveries SET state = ?, response = ?, expires_at = ?, updated_at = ? WHERE delivery_key = ?",
+                (STATE_DONE, json.dumps(response), now + self.ttl_seconds, now, key)
+            )
+            conn.execute("DELETE FROM webhook_deliveries WHERE expires_at <= ?", (now,))
+            conn.execute(
+                """DELETE FROM webhook_deliveries WHERE delivery_key IN (
+                       SELECT delivery_key FROM webhook_deliveries ORDER BY updated_at DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,)
+            )
+
+    def _release(self, key):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM webhook_deliveries WHERE delivery_key = ? AND state = ?", (key, STATE_PROCESSING)
+            )
+
+    def _process(self, key, fn):
+        joined = False
+        while True:
+            state, response = self._claim(key)
+            if state == STATE_DONE:
+                self._count('replayed')
+                return response
+            if state == _CLAIMED:
+                break
+            if not joined:
+                self._count('joined_other_worker')
+                joined = True
+            time.sleep(self.join_poll_seconds)
+
+        try:
+            response = fn()
+        except BaseException:
+            self._release(key)
+            raise
+        self._store(key, response)
+        self._count('processed')
+        return response
+
+    def run_once(self, key, fn):
+        return self._flight.do('delivery', key, lambda: self._process(key, fn))
+
+    def snapshot(self):
+        """Entregas procesadas, reintentos respondidos desde la tabla y reintentos que esperaron a la original"""
+        joined = self._flight.snapshot().get('delivery', {}).get('coalesced', 0)
+        with closing(self._connect()) as conn:
+            entries = conn.execute(
+                "SELECT COUNT(*) FROM webhook_deliveries WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        with self._lock:
+            return dict(self._stats, joined_in_flight=joined, entries=entries)
@@ -0,0 +1,104 @@
+from collections import deque
+from functools import lru_cache
+
+from text_utils import fold_text
+
+# Palabras clave por categoría (se comparan sin tildes ni mayúsculas)
+KEYWORD_CATEGORIES = {
+    'reenvio': [
+        'no me llegó', 'no me llego', 'no me ha llegado', 'reenviar', 'reenviame',
+        'reenvíame', 'no recibí', 'no recibi', 'no he recibido',
+        'enviar de nuevo', 'otro código', 'otro codigo', 'no llegó', 'no llego',
+        'no ha llegado', 'no me llega', 'mandarlo otra', 'enviarlo de nuevo',
+        'volver a enviar', 'no recibido', 'manda otro', 'envia otro', 'envía otro',
+        'puedes enviar', 'me puedes enviar', 'no tengo el codigo',
+        'no tengo código', 'codigo nuevo', 'código nuevo', 'enviar otro',
+        'mandar otro', 'sin codigo', 'sin código'
+    ],
+    'despedida': [
+        'gracias', 'adiós', 'hasta luego', 'nos vemos', 'chao', 'bye',
+        'eso es todo', 'ya terminé', 'ya está', 'perfecto gracias'
+    ],
+    'agendar': ['agendar', 'cita', 'chequeo', 'preventivo', 'producto'],
+    'revisar': ['revisa', 'revisar', 'examen', 'examenes', 'exámenes', 'analizar', 'resultado', 'médico', 'medico'],
+    'lab_blanco': ['lab', 'blanco'],
+    'lab_otro': ['otro', 'otros', 'diferente'],
+    'saludo': ['hola', 'buenos días', 'buenas tardes', 'buenas noches', 'hey', 'hi', 'buenas'],
+    'negativa': ['no', 'nunca', 'jamás'],
+    'positiva': ['si', 'sí', 'yes', 'ok', 'claro'],
+    'parametro_medico': ['glicemia', 'hemoglobina', 'colesterol', 'glucosa'],
+}
+
+
+class KeywordMatcher:
+    """
+    Detector de palabras clave multi-patrón (Aho-Corasick).
+
+    El autómata se construye una vez con todas las categorías; cada mensaje se
+    normaliza una sola vez y se recorre en una única pasada, devolviendo todas
+    las categorías encontradas. Mantiene la semántica de subcadena de
+    `any(k in texto for k in lista)`.
+    """
+
+    def __init__(self, categories, cache_size=1024):
+        self.categories = {name: tuple(keywords) for name, keywords in categories.items()}
+        self._build(self.categories)
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _build(self, categories):
+        goto = [{}]
+        outputs = [set()]
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                state = 0
+                for ch in fold_text(keyword):
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        outputs.append(set())
+                    state = nxt
+                outputs[state].add(category)
+
+        # Enlaces de falla en BFS; las transiciones se completan (DFA) para que
+        # la búsqueda sea un solo acceso a diccionario por carácter
+        children = [dict(transitions) for transitions in goto]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in children[state].items():
+                fail[nxt] = goto[fail[state]].get(ch, 0)
+                outputs[nxt] |= outputs[fail[nxt]]
+                queue.append(nxt)
+            for ch, nxt in goto[fail[state]].items():
+                goto[state].setdefault(ch, nxt)
+
+        self._delta = goto
+        self._outputs = [frozenset(o) for o in outputs]
+
+    def _match(self, text):
+        """Conjunto de categorías presentes en el texto"""
+        return self.match_folded(fold_text(text))
+
+    def match_folded(self, folded_text):
+        """Igual que `match`, para texto ya normalizado con `fold_text`"""
+        delta = self._delta
+        outputs = self._outputs
+        root = delta[0]
+        state = 0
+        hits = set()
+        for ch in folded_text:
+            state = delta[state].get(ch) or root.get(ch, 0)
+            if outputs[state]:
+                hits |= outputs[state]
+        return frozenset(hits)
+
+    def has(self, text, category):
+        """Indica si el texto contiene alguna palabra clave de la categoría"""
+        return category in self.match(text)
+
+
+# Detector compartido por todos los handlers (se compila al importar)
+KEYWORD_MATCHER = KeywordMatcher(KEYWORD_CATEGORIES)
@@ -0,0 +1,184 @@
+import re
+import threading
+from collections import Counter, namedtuple
+
+from pdf_precheck import LAB_NAME_MARKERS, content_streams, text_lines
+from text_utils import fold_text
+
+# Por defecto cualquier fila de resultado no reconocida deriva al pipeline remoto: ese parámetro
+# no se perdería en silencio, porque la API sí lo reporta
+DEFAULT_MIN_CONFIDENCE = 1.0
+DEFAULT_MIN_PARAMETERS = 3
+# Filas con número que no son parámetros (encabezado del informe)
+IGNORED_LABELS = frozenset({'edad', 'folio', 'ficha', 'orden', 'pagina', 'rut', 'fecha', 'hora', 'telefono'})
+
+FALLBACK_NO_TEXT = 'no_text'
+FALLBACK_NOT_LAB_BLANCO = 'not_lab_blanco'
+FALLBACK_FEW_PARAMETERS = 'few_parameters'
+FALLBACK_LOW_CONFIDENCE = 'low_confidence'
+FALLBACK_CONFLICT = 'conflicting_values'
+
+LocalParseResult = namedtuple('LocalParseResult', ['analysis', 'confidence', 'fallback_reason'])
+
+_NUMBER = r'[<>]?\s*\d[\d.,]*'
+# "Hemoglobina  14.2  g/dL  (11.5 - 14.5)": toda línea "nombre valor ..." cuenta como fila de resultado
+_ROW_RE = re.compile(r'^(?P<name>[^\d:]*[^\W\d][^\d:]*?)[\s.:]+(?P<value>' + _NUMBER + r')(?:\s+(?P<rest>.*))?$')
+_UNIT_RE = re.compile(r'(?!hasta\b|desde\b)[^\s()]*[^\d\s().,<>-][^\s()]*\s*', re.I)
+_RANGE_BOUNDS_RE = re.compile(
+    r'(' + _NUMBER + r')\s*(?:-|a)\s*(' + _NUMBER + r')|(?:<|hasta)\s*(' + _NUMBER + r')|(?:>|desde)\s*(' + _NUMBER + r')',
+    re.I)
+# "12.500" o "4.500.000": enteros con separador de miles (recuentos de células)
+_DOT_GROUPED_RE = re.compile(r'^\d{1,3}(\.\d{3})+$')
+
+
+def _to_number(text):
+    """'14,2', '14.2', '< 0.5', '1.234,5' o '12.500' como float; None si no es un número"""
+    text = text.strip().lstrip('<>').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    elif _DOT_GROUPED_RE.match(text):
+        text = text.replace('.', '')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _parse_range(text):
+    """(mínimo, máximo) del rango impreso; '< 11' o 'hasta 11' parten en 0 y '> 40' no tiene máximo"""
+    match = _RANGE_BOUNDS_RE.fullmatch(text.strip('() '))
+    if not match:
+        return None
+    if match.group(3):
+        high = _to_number(match.group(3))
+        return (0, high) if high is not None else None
+    if match.group(4):
+        low = _to_number(match.group(4))
+        return (low, float('inf')) if low is not None else None
+    low, high = _to_number(match.group(1)), _to_number(match.group(2))
+    return (low, high) if low is not None and high is not None and low <= high else None
+
+
+class LocalExamParser:
+    """
+    Extracción local de parámetros de exámenes de Laboratorio Blanco.
+
+    Los PDF con capa de texto de Lab. Blanco tienen un formato estable (una
+    fila por parámetro con valor, unidad y rango de referencia), así que se
+    pueden leer sin pasar por la cola de jobs remota. Produce la misma
+    estructura que `get_examination_analysis` (`parameters_found`,
+    `parameters_out_of_range`, `metadata`).
+
+    La confianza es la fracción de filas con forma de resultado cuyo nombre
+    se reconoce con el normalizador y cuyo valor se puede leer. Si el informe no es de Lab. Blanco,
+    tiene pocos parámetros, la confianza es baja o un parámetro aparece con
+    valores distintos, `parse` no entrega análisis y el llamador usa el
+    pipeline remoto.
+    """
+
+    def __init__(self, normalizer, ranges, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                 min_parameters=DEFAULT_MIN_PARAMETERS, lab_markers=LAB_NAME_MARKERS):
+        self.normalizer = normalizer
+        self.ranges = ranges
+        self.min_confidence = min_confidence
+        self.min_parameters = min_parameters
+        self._lab_markers = tuple(fold_text(marker) for marker in lab_markers)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def _rows(self, lines):
+        """[(nombre canónico o None, match)] de las líneas con forma de resultado"""
+        rows = []
+        for line in lines:
+            match = _ROW_RE.match(line.strip())
+            if not match:
+                continue
+            name = match.group('name').strip(' .:')
+            folded = fold_text(name)
+            if not folded or not IGNORED_LABELS.isdisjoint(re.findall(r'\w+', folded)):
+                continue
+            rows.append((self.normalizer.canonical_name(name), match))
+        return rows
+
+    def _parameter(self, canonical, match):
+        value = _to_number(match.group('value'))
+        if value is None:
+            return None, None
+        rest = match.group('rest') or ''
+        unit = _UNIT_RE.match(rest)
+        printed_range = rest[unit.end():] if unit else rest
+        bounds = _parse_range(printed_range)
+        if bounds is None:
+            # Sin rango impreso legible se evalúa con RANGES, igual que los resultados de la API
+            bounds = self.ranges.get(canonical)
+            printed_range = f"{bounds[0]} - {bounds[1]}" if bounds else None
+        else:
+            printed_range = printed_range.strip('() ')
+        parameter = {
+            'name': canonical,
+            'unit_of_measure': unit.group(0).strip() if unit else '',
+            'analysis': [{'value': f"{value:g}", 'reference_ranges': [printed_range] if printed_range else []}],
+        }
+        out_of_range = bounds is not None and not bounds[0] <= value <= bounds[1]
+        return parameter, out_of_range
+
+    def _fallback(self, reason, confidence=0.0):
+        with self._lock:
+            self._stats[f"fallback_{reason}"] += 1
+        return LocalParseResult(None, confidence, reason)
+
+    def parse(self, data):
+        """LocalParseResult; `analysis` es None cuando hay que usar el pipeline remoto"""
+        lines = [line for content in content_streams(data) for line in text_lines(content)]
+        if not lines:
+            return self._fallback(FALLBACK_NO_TEXT)
+        folded_text = fold_text(' '.join(lines))
+        if not any(marker in folded_text for marker in self._lab_markers):
+            return self._fallback(FALLBACK_NOT_LAB_BLANCO)
+
+        rows = self._rows(lines)
+        found, out_of_range, values = [], [], {}
+        recognized = 0
+        for canonical, match in rows:
+            if canonical is None:
+                continue
+            parameter, is_out = self._parameter(canonical, match)
+            if parameter is None:
+                # Un valor ilegible cuenta como fila no reconocida y baja la confianza
+                continue
+            recognized += 1
+            value = parameter['analysis'][0]['value']
+            if canonical in values:
+                # El mismo parámetro repetido en otra página solo se acepta con el mismo valor
+                if values[canonical] != value:
+                    return self._fallback(FALLBACK_CONFLICT)
+                continue
+            values[canonical] = value
+            found.append(parameter)
+            if is_out:
+                out_of_range.append(parameter)
+
+        confidence = recognized / len(rows) if rows else 0.0
+        if len(found) < self.min_parameters:
+            return self._fallback(FALLBACK_FEW_PARAMETERS, confidence)
+        if confidence < self.min_confidence:
+            return self._fallback(FALLBACK_LOW_CONFIDENCE, confidence)
+
+        with self._lock:
+            self._stats['parsed'] += 1
+        analysis = {
+            'metadata': {
+                'parameters_found_count': len(found),
+                'parameters_out_of_range_count': len(out_of_range),
+                'source': 'local',
+                'confidence': round(confidence, 3),
+            },
+            'parameters_found': found,
+            'parameters_out_of_range': out_of_range,
+        }
+        return LocalParseResult(analysis, confidence, None)
+
+    def snapshot(self):
+        """Exámenes resueltos localmente y derivaciones al pipeline remoto por motivo"""
+        with self._lock:
+            return dict(self._stats)
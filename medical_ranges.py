@@ -0,0 +1,51 @@
+# ============================================
+# RANGOS DE REFERENCIA MÉDICA (compartidos por app.py y appv1.py)
+# ============================================
+
+# Rangos de referencia médica
+RANGES = {
+    "Porcentaje (Protrombina)": (70, 100),
+    "INR": (0.8, 1.2),
+    "TTPK (Tiempo de Tromboplastina)": (25, 40),
+    "Glicemia Basal": (75, 100),
+    "Uremia": (0, 50),
+    "Recuento de Eritrocitos": (3.9, 5.3),
+    "Hemoglobina": (11.5, 14.5),
+    "Hematocrito": (37, 47),
+    "VCM": (80, 100),
+    "HCM": (26, 34),
+    "CHCM": (31, 36),
+    "Recuento de Leucocitos": (4, 10.5),
+    "Linfocitos": (20, 40),
+    "Neutrófilos": (55, 70),
+    "Monocitos": (2, 10),
+    "Eosinófilos": (0, 5),
+    "Basófilos": (0, 2),
+    "Recuento de Neutrófilos (Absoluto)": (2, 7),
+    "Recuento de Linfocitos (Absoluto)": (0.8, 4),
+    "Recuento de Plaquetas": (150, 400),
+    "VHS (Velocidad de sedimentación globular)": (0, 11),
+}
+
+# Alias y errores de tipeo conocidos del API → nombre canónico en RANGES
+PARAMETER_ALIASES = {
+    "Glisea Basal": "Glicemia Basal",
+    "Glicemia": "Glicemia Basal",
+    "Glucosa": "Glicemia Basal",
+    "Glucosa Basal": "Glicemia Basal",
+    "Recuendo de Eritrocitos": "Recuento de Eritrocitos",
+    "Eritrocitos": "Recuento de Eritrocitos",
+    "Globulos Rojos": "Recuento de Eritrocitos",
+    "Leucocitos": "Recuento de Leucocitos",
+    "Globulos Blancos": "Recuento de Leucocitos",
+    "Plaquetas": "Recuento de Plaquetas",
+    "Protrombina": "Porcentaje (Protrombina)",
+    "Tiempo de Protrombina": "Porcentaje (Protrombina)",
+    "TTPK": "TTPK (Tiempo de Tromboplastina)",
+    "TTPA": "TTPK (Tiempo de Tromboplastina)",
+    "Urea": "Uremia",
+    "VHS": "VHS (Velocidad de sedimentación globular)",
+    "Velocidad de Sedimentacion": "VHS (Velocidad de sedimentación globular)",
+    "Neutrofilos Absoluto": "Recuento de Neutrófilos (Absoluto)",
+    "Linfocitos Absoluto": "Recuento de Linfocitos (Absoluto)",
+}
@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+# Tipos de tarea que enrutan a un nivel de modelo distinto
+TASK_CLASSIFICATION = 'classification'        # intención, reenvío, despedida (respuestas de 1 palabra)
+TASK_SHORT_GENERATION = 'short_generation'    # pasos a seguir, resúmenes de historial
+TASK_CONTEXTUAL_CHAT = 'contextual_chat'      # respuestas conversacionales de Bianca
+
+# Cadena de modelos por tarea, del preferido al más rápido, y su presupuesto de latencia p95
+ModelRoute = namedtuple('ModelRoute', ['models', 'latency_budget_ms'])
+
+DEFAULT_ROUTES = {
+    TASK_CLASSIFICATION: ModelRoute(
+        ("us.anthropic.claude-3-5-haiku-20241022-v1:0", "anthropic.claude-3-haiku-20240307-v1:0"), 1500),
+    TASK_SHORT_GENERATION: ModelRoute(
+        ("us.anthropic.claude-haiku-4-5-20251001-v1:0", "us.anthropic.claude-3-5-haiku-20241022-v1:0"), 3000),
+    TASK_CONTEXTUAL_CHAT: ModelRoute(
+        ("us.anthropic.claude-sonnet-4-5-20250929-v1:0", "us.anthropic.claude-haiku-4-5-20251001-v1:0"), 6000),
+}
+
+
+def build_routes(get_setting, defaults=DEFAULT_ROUTES):
+    """
+    Arma las rutas desde la configuración de cada app.
+
+    `get_setting(key, default)` lee por ejemplo MODELS_CLASSIFICATION
+    ("modelo_a,modelo_b") y LATENCY_BUDGET_MS_CLASSIFICATION.
+    """
+    routes = {}
+    for task, route in defaults.items():
+        suffix = task.upper()
+        models = get_setting(f"MODELS_{suffix}", None)
+        if isinstance(models, str):
+            models = tuple(m.strip() for m in models.split(",") if m.strip())
+        budget = get_setting(f"LATENCY_BUDGET_MS_{suffix}", route.latency_budget_ms)
+        routes[task] = ModelRoute(tuple(models) if models else route.models, int(budget))
+    return routes
+
+
+def p95(samples):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(0.95 * len(ordered)) - 1, 0)]
+
+
+class ModelRouter:
+    """
+    Elige el modelo de cada tarea y baja a uno más rápido si el p95 se pasa del presupuesto.
+
+    Se mide la latencia de las últimas `window_size` llamadas del modelo en uso.
+    Con al menos `min_samples` y p95 sobre el presupuesto se pasa al siguiente
+    modelo de la cadena; tras `cooldown_seconds` se vuelve a probar el anterior.
+    """
+
+    def __init__(self, routes, window_size=50, min_samples=10, cooldown_seconds=120):
+        self.routes = routes
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self._level = {task: 0 for task in routes}
+        self._downgraded_at = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def select(self, task):
+        """Modelo que debe atender la tarea ahora"""
+        route = self.routes[task]
+        with self._lock:
+            level = self._level[task]
+            downgraded_at = self._downgraded_at.get(task)
+            if level and downgraded_at is not None and time.monotonic() - downgraded_at >= self.cooldown_seconds:
+                # Se reintenta el nivel anterior con una ventana limpia
+                level = self._level[task] = level - 1
+                self._latencies.pop((task, route.models[level]), None)
+                self._downgraded_at[task] = time.monotonic() if level else None
+            return route.models[level]
+
+    def record(self, task, model_id, latency_seconds):
+        """Registra la latencia de una llamada y degrada la tarea si corresponde"""
+        route = self.routes[task]
+        with self._lock:
+            window = self._latencies.setdefault((task, model_id), deque(maxlen=self.window_size))
+            window.append(latency_seconds * 1000)
+            level = self._level[task]
+            if model_id != route.models[level] or level + 1 >= len(route.models):
+                return
+            if len(window) >= self.min_samples and p95(window) > route.latency_budget_ms:
+                self._level[task] = level + 1
+                self._downgraded_at[task] = time.monotonic()
+
+    def snapshot(self):
+        """Modelo activo y p95 por tarea para monitoreo"""
+        with self._lock:
+            status = {}
+            for task, route in self.routes.items():
+                model_id = route.models[self._level[task]]
+                window = self._latencies.get((task, model_id))
+                status[task] = {
+                    'model': model_id,
+                    'downgraded': self._level[task] > 0,
+                    'p95_ms': round(p95(window)) if window else None,
+                    'budget_ms': route.latency_budget_ms,
+                }
+            return status
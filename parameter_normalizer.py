@@ -0,0 +1,104 @@
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from text_utils import fold_text
+
+UNKNOWN_PARAMETER = "Desconocido"
+
+_VALOR_RE = re.compile(r"VALOR\s+([^.]*)")
+_RECOMENDACION_RE = re.compile(r"[Rr]ecomendacion(.*)", re.DOTALL)
+
+
+class ParameterNormalizer:
+    """
+    Normaliza los nombres de parámetros que entrega el API de resultados.
+
+    Las tablas se compilan una sola vez: un diccionario de nombres canónicos y
+    alias ya normalizados (búsqueda O(1)) y una expresión regular con todas las
+    variantes, usada cuando el texto no trae una etiqueta "VALOR". Cada texto
+    distinto se resuelve una sola vez gracias a la memoización.
+    """
+
+    def __init__(self, canonical_names, aliases=None, cache_size=4096):
+        self.canonical_names = tuple(canonical_names)
+        self._lookup = {fold_text(name): name for name in self.canonical_names}
+        for alias, canonical in (aliases or {}).items():
+            if canonical not in self.canonical_names:
+                raise ValueError(f"Alias '{alias}' apunta a un parámetro inexistente: {canonical}")
+            self._lookup.setdefault(fold_text(alias), canonical)
+
+        # Alternativas más largas primero para que "Recuento de Linfocitos (Absoluto)" gane a "Linfocitos"
+        variants = sorted(self._lookup, key=len, reverse=True)
+        self._search_re = re.compile(
+            r"(?<!\w)(" + "|".join(re.escape(v) for v in variants) + r")(?!\w)"
+        )
+
+        self.unmatched = Counter()
+        self._lock = threading.Lock()
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _extract_label(self, analysis_results):
+        match = _VALOR_RE.search(analysis_results)
+        if match:
+            return match.group(1).strip()
+        match = _RECOMENDACION_RE.search(analysis_results)
+        if match:
+            return match.group(1).strip()
+        return ""
+
+    def _resolve(self, analysis_results):
+        """Retorna (nombre_canónico o None, etiqueta_extraída) para un texto de análisis"""
+        label = self._extract_label(analysis_results)
+        if label:
+            # Con etiqueta explícita solo se acepta coincidencia exacta: "Hemoglobina Glicosilada"
+            # no debe evaluarse con el rango de "Hemoglobina"
+            return self._lookup.get(fold_text(label)), label
+
+        match = self._search_re.search(fold_text(analysis_results))
+        if match:
+            return self._lookup[match.group(1)], label
+        return None, label
+
+    def canonical_name(self, name):
+        """Nombre canónico para un nombre de parámetro suelto (solo coincidencia exacta o alias)"""
+        return self._lookup.get(fold_text(name))
+
+    def extract_parameter(self, analysis_results):
+        """Nombre canónico del parámetro; si no se reconoce, la etiqueta original o 'Desconocido'"""
+        canonical, label = self.resolve(analysis_results)
+        return canonical or label or UNKNOWN_PARAMETER
+
+    def build_results(self, items):
+        """
+        Convierte la lista de resultados del API en {parámetro: valor}.
+
+        Los nombres no reconocidos se registran en `unmatched` y se guardan con
+        una clave única para que no se sobrescriban entre sí.
+        """
+        results = {}
+        unmatched_labels = []
+        seen_unmatched = Counter()
+        for item in items:
+            canonical, label = self.resolve(item['analysis_results'])
+            if canonical:
+                results[canonical] = item['value']
+                continue
+
+            key = label or UNKNOWN_PARAMETER
+            unmatched_labels.append(key)
+            seen_unmatched[key] += 1
+            if seen_unmatched[key] > 1:
+                key = f"{key} ({seen_unmatched[key]})"
+            results[key] = item['value']
+
+        if unmatched_labels:
+            with self._lock:
+                self.unmatched.update(unmatched_labels)
+        return results
+
+    def report_unmatched(self):
+        """Lista de (etiqueta, ocurrencias) no reconocidas, de más a menos frecuente"""
+        with self._lock:
+            return self.unmatched.most_common()
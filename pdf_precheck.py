@@ -0,0 +1,226 @@
+import re
+import zlib
+from collections import namedtuple
+
+from keyword_matcher import KeywordMatcher
+from text_utils import fold_text
+
+DEFAULT_MAX_PDF_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_PAGES = 30
+# Con menos letras legibles la capa de texto no es confiable (PDF escaneado, fuentes sin mapa
+# Unicode): en ese caso no se rechaza por contenido y decide el pipeline remoto
+MIN_TEXT_CHARS = 200
+# Tope de bytes descomprimidos a revisar, para que el chequeo tome milisegundos
+MAX_SCANNED_BYTES = 8 * 1024 * 1024
+LAB_NAME_MARKERS = ('Laboratorio Blanco', 'Lab. Blanco')
+# Nombres de hasta este largo (INR, VCM, HCM) aparecen dentro de otras palabras al quitar espacios
+SHORT_MARKER_MAX_CHARS = 4
+
+REJECT_NOT_PDF = 'not_pdf'
+REJECT_TRUNCATED = 'truncated'
+REJECT_TOO_LARGE = 'too_large'
+REJECT_TOO_MANY_PAGES = 'too_many_pages'
+REJECT_NO_LAB_MARKERS = 'no_lab_markers'
+
+PrecheckResult = namedtuple('PrecheckResult', ['ok', 'reason', 'pages', 'text_chars', 'markers'])
+
+_STREAM_RE = re.compile(rb'(?<!end)stream\r?\n')
+_PAGE_RE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+# String literal `(...)`; admite un nivel de paréntesis balanceados sin escapar, como "(11.5 - 14.5)"
+_LITERAL = rb'\((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)'
+_LITERAL_RE = re.compile(_LITERAL, re.S)
+# Strings que muestran texto: (..) Tj, (..) ' y [(..) -20 (..)] TJ
+_SHOW_TEXT_RE = re.compile(rb'(' + _LITERAL + rb')\s*(?:Tj|\')|\[((?:\\.|[^\]\\])*)\]\s*TJ', re.S)
+# Operadores de texto con su posición: show (Tj ' " TJ), Td/TD, Tm, T* y BT
+_TEXT_LAYOUT_RE = re.compile(
+    rb'(' + _LITERAL + rb')\s*(Tj|\'|")|\[((?:\\.|[^\]\\])*)\]\s*TJ'
+    rb'|([-+]?[\d.]+)\s+([-+]?[\d.]+)\s+T[dD](?![A-Za-z])'
+    rb'|((?:[-+]?[\d.]+\s+){4})([-+]?[\d.]+)\s+([-+]?[\d.]+)\s+Tm(?![A-Za-z])'
+    rb'|(T\*)|(?<![A-Za-z])(BT)(?![A-Za-z])', re.S)
+_ESCAPE_RE = re.compile(rb'\\([0-7]{1,3}|.)', re.S)
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _unescape(match):
+    escaped = match.group(1)
+    if escaped[:1].isdigit():
+        return bytes([int(escaped, 8) & 0xFF])
+    return _ESCAPES.get(escaped, escaped)
+
+
+def _literal_text(data):
+    """Texto de los strings literales `(...)`, unidos sin separador"""
+    return b''.join(_ESCAPE_RE.sub(_unescape, m.group(0)[1:-1]) for m in _LITERAL_RE.finditer(data)).decode('latin-1')
+
+
+def _shown_text(content):
+    """Texto que un content stream muestra en la página (ignora fuentes, imágenes y otros binarios)"""
+    return ''.join(_literal_text(m.group(1) or m.group(2)) for m in _SHOW_TEXT_RE.finditer(content))
+
+
+def text_lines(content):
+    """
+    Líneas de texto de un content stream, en orden de lectura.
+
+    Los fragmentos se agrupan por su coordenada vertical (Td, TD, Tm, T*), de
+    modo que las celdas de una tabla quedan en la misma línea separadas por
+    dos espacios aunque el generador las haya escrito columna por columna.
+    """
+    runs = []
+    x = y = 0.0
+    for order, m in enumerate(_TEXT_LAYOUT_RE.finditer(content)):
+        if m.group(1) is not None or m.group(3) is not None:
+            if m.group(2) in (b"'", b'"'):
+                y -= 1
+            text = _literal_text(m.group(1) or m.group(3))
+            if text.strip():
+                runs.append((-round(y), x, order, text))
+        elif m.group(4) is not None:
+            try:
+                x, y = x + float(m.group(4)), y + float(m.group(5))
+            except ValueError:
+                pass
+        elif m.group(7) is not None:
+            try:
+                x, y = float(m.group(7)), float(m.group(8))
+            except ValueError:
+                pass
+        elif m.group(9):
+            y -= 1
+        else:
+            x = y = 0.0
+    lines, current, current_y = [], [], None
+    for line_y, _, _, text in sorted(runs):
+        if line_y != current_y and current:
+            lines.append('  '.join(current))
+            current = []
+        current_y = line_y
+        current.append(text.strip())
+    if current:
+        lines.append('  '.join(current))
+    return lines
+
+
+def _readable_letters(text):
+    """Letras de texto legible; 0 si parece una codificación de glifos (fuentes CID o subconjuntos)"""
+    folded = fold_text(text)
+    letters = [c for c in folded if c.isalpha()]
+    if not letters or len(letters) < 0.6 * len(folded.replace(' ', '')):
+        return 0
+    vowels = sum(1 for c in letters if c in 'aeiou')
+    return len(letters) if 0.3 <= vowels / len(letters) <= 0.6 else 0
+
+
+def content_streams(data):
+    """Content streams descomprimidos del PDF (sin imágenes), para extraer su texto"""
+    return PdfPrecheck._decoded(PdfPrecheck._split(data)[1])
+
+
+class PdfPrecheck:
+    """
+    Chequeo local de un PDF antes de subirlo al pipeline de exámenes.
+
+    Valida la firma `%PDF-` y el cierre `%%EOF` (archivo completo), el tamaño
+    y el número de páginas, y busca en la capa de texto (strings literales de
+    los streams, descomprimidos con zlib) los nombres de parámetros de
+    `RANGES`, sus alias y el nombre del laboratorio con un autómata
+    Aho-Corasick. Los nombres largos de varias palabras se comparan sin
+    tildes, mayúsculas ni espacios, porque los generadores de PDF suelen
+    partir las frases entre operadores. Los de una palabra y los cortos se
+    buscan como palabra completa en el texto sin tildes ni mayúsculas: sin
+    espacios, "INR" aparecería en "...sin resultado".
+
+    Solo rechaza por contenido cuando hay texto legible suficiente y no
+    aparece ningún marcador; ante la duda deja pasar el archivo.
+    """
+
+    def __init__(self, parameter_names, aliases=None, lab_markers=LAB_NAME_MARKERS,
+                 max_bytes=DEFAULT_MAX_PDF_BYTES, max_pages=DEFAULT_MAX_PAGES):
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        markers = list(parameter_names) + list(aliases or ()) + list(lab_markers)
+        squashed, words = {}, {}
+        for marker in markers:
+            folded = fold_text(marker)
+            if ' ' in folded and len(self._squash(folded)) > SHORT_MARKER_MAX_CHARS:
+                squashed[marker] = [self._squash(folded)]
+            else:
+                words.setdefault(folded, set()).add(marker)
+        self._matcher = KeywordMatcher(squashed, cache_size=0)
+        self._words = words
+        alternatives = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+        self._word_re = re.compile(r'(?<!\w)(?:' + alternatives + r')(?!\w)') if words else None
+
+    @staticmethod
+    def _squash(text):
+        return fold_text(text).replace(' ', '')
+
+    def _markers(self, text):
+        """Marcadores presentes en el texto (frases largas sin espacios, palabras completas)"""
+        folded = fold_text(text)
+        found = set(self._matcher.match_folded(folded.replace(' ', '')))
+        if self._word_re is not None:
+            for match in self._word_re.finditer(folded):
+                found |= self._words[match.group(0)]
+        return frozenset(found)
+
+    @staticmethod
+    def _split(data):
+        """(bytes fuera de los streams, [cuerpos de stream]) en una pasada"""
+        outside, bodies, position = [], [], 0
+        for match in _STREAM_RE.finditer(data):
+            if match.start() < position:
+                continue
+            end = data.find(b'endstream', match.end())
+            if end < 0:
+                break
+            outside.append(data[position:match.start()])
+            bodies.append((data[max(0, match.start() - 300):match.start()], data[match.end():end]))
+            position = end + len(b'endstream')
+        outside.append(data[position:])
+        return b''.join(outside), bodies
+
+    @staticmethod
+    def _decoded(bodies):
+        """Streams Flate descomprimidos (se omiten imágenes y filtros que zlib no entiende)"""
+        budget = MAX_SCANNED_BYTES
+        for header, body in bodies:
+            if budget <= 0:
+                return
+            if b'/Image' in header:
+                continue
+            try:
+                content = zlib.decompressobj().decompress(body, budget)
+            except zlib.error:
+                content = body if b'/Filter' not in header else None
+            if content:
+                budget -= len(content)
+                yield content
+
+    def check(self, data):
+        if len(data) > self.max_bytes:
+            return PrecheckResult(False, REJECT_TOO_LARGE, None, 0, frozenset())
+        if b'%PDF-' not in data[:1024]:
+            return PrecheckResult(False, REJECT_NOT_PDF, None, 0, frozenset())
+        if b'%%EOF' not in data[-2048:]:
+            return PrecheckResult(False, REJECT_TRUNCATED, None, 0, frozenset())
+
+        outside, bodies = self._split(data)
+        pages = len(_PAGE_RE.findall(outside))
+        # Los metadatos (título, autor, productor) cuentan como marcador pero no como texto de la página
+        markers = self._markers(_literal_text(outside))
+        text_chars = 0
+        for content in self._decoded(bodies):
+            pages += len(_PAGE_RE.findall(content))
+            if pages > self.max_pages:
+                break
+            text = _shown_text(content)
+            text_chars += _readable_letters(text) if text else 0
+            if text and not markers:
+                markers = self._markers(text)
+
+        if pages > self.max_pages:
+            return PrecheckResult(False, REJECT_TOO_MANY_PAGES, pages, text_chars, markers)
+        if not markers and text_chars >= MIN_TEXT_CHARS:
+            return PrecheckResult(False, REJECT_NO_LAB_MARKERS, pages, text_chars, markers)
+        return PrecheckResult(True, None, pages, text_chars, markers)
@@ -0,0 +1,64 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+
+from turn_deadline import narrowed_deadline
+
+# Tiempo máximo para esperar los pasos generados por IA antes de usar el respaldo
+DEFAULT_STEPS_DEADLINE_SECONDS = 8.0
+
+
+class TwoPhaseReply:
+    """
+    Respuesta de exámenes en dos fases.
+
+    `findings` (parámetros y valores fuera de rango) está lista de inmediato.
+    Los pasos a seguir se generan en segundo plano con `generate_steps()`; si no
+    terminan antes del plazo, o fallan, se usa `fallback`. `closing` va después
+    de los pasos (disclaimer, pregunta de cita).
+
+    Cada respuesta genera en un thread propio (sin cola compartida, el plazo mide
+    solo la generación) con el contexto copiado y el plazo de los pasos activo,
+    así que las llamadas a Bedrock adentro se cortan al vencer.
+    """
+
+    def __init__(self, findings, generate_steps, fallback, closing="",
+                 deadline_seconds=DEFAULT_STEPS_DEADLINE_SECONDS):
+        self.findings = findings
+        self.fallback = fallback
+        self.closing = closing
+        self._deadline = time.monotonic() + deadline_seconds
+        self._future = Future()
+        self._future.set_running_or_notify_cancel()
+        self._steps = None
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._run, generate_steps), name="bianca-steps", daemon=True).start()
+
+    def _run(self, generate_steps):
+        try:
+            with narrowed_deadline(max(self._deadline - time.monotonic(), 0)):
+                self._future.set_result(generate_steps())
+        except BaseException as e:
+            self._future.set_exception(e)
+
+    def steps(self):
+        """Espera los pasos hasta el plazo (una sola vez) y los retorna, o el respaldo"""
+        if self._steps is None:
+            try:
+                self._steps = self._future.result(timeout=max(self._deadline - time.monotonic(), 0))
+            except Exception:
+                self._steps = self.fallback
+        return self._steps
+
+    def ready(self):
+        """True si los pasos ya están listos (o ya se resolvieron) y `text()` no espera"""
+        return self._steps is not None or self._future.done()
+
+    def follow_up(self):
+        """Segunda fase como mensaje independiente"""
+        return (self.steps() + self.closing).strip()
+
+    def text(self):
+        """Respuesta completa, igual a la de una sola fase"""
+        return self.findings + self.steps() + self.closing
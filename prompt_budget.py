@@ -0,0 +1,161 @@
+import math
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Promedio conservador para español con el tokenizador de Claude
+CHARS_PER_TOKEN = 3.5
+DEFAULT_PROMPT_TOKEN_BUDGET = 1500
+# Reserva para "Resumen de la conversación anterior:", "Mensajes recientes:" y saltos de línea
+HEADER_OVERHEAD_TOKENS = 24
+MIN_USER_MESSAGE_TOKENS = 50
+
+# Pool compartido para generar resúmenes fuera del camino crítico del turno
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bianca-summary")
+
+BudgetedPrompt = namedtuple('BudgetedPrompt', ['text', 'estimated_tokens', 'included_messages', 'summary_used'])
+
+
+def estimate_tokens(text):
+    """Estimación local de tokens (sin llamar a Bedrock)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Recorta el texto para que quepa en `max_tokens` estimados"""
+    if max_tokens <= 0:
+        return ""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 3, 0)] + "..."
+
+
+def format_history_line(message):
+    role = "Usuario" if message['role'] == 'user' else "Bianca"
+    return f"{role}: {message['content']}"
+
+
+def extractive_summary(previous_summary, messages, max_chars=600):
+    """Resumen local de respaldo: primeras palabras de cada mensaje del usuario"""
+    points = [previous_summary] if previous_summary else []
+    for message in messages:
+        if message['role'] == 'user':
+            points.append(message['content'][:80])
+    summary = "; ".join(points)
+    return summary[-max_chars:]
+
+
+class RollingSummary:
+    """
+    Resumen acumulado de los mensajes que ya no caben en el prompt.
+
+    `covered` indica cuántos mensajes (desde el inicio) están representados en
+    `text`. Las actualizaciones se ejecutan en segundo plano; mientras tanto el
+    prompt usa el último resumen disponible.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.covered = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def request_update(self, messages, upto, summarize_fn):
+        """Agenda el resumen de messages[covered:upto] si no hay uno en curso"""
+        with self._lock:
+            if upto <= self.covered or (self._pending is not None and not self._pending.done()):
+                return
+            previous = self.text
+            chunk = list(messages[self.covered:upto])
+            self._pending = _SUMMARY_EXECUTOR.submit(self._summarize, previous, chunk, upto, summarize_fn)
+
+    def _summarize(self, previous, chunk, upto, summarize_fn):
+        try:
+            text = summarize_fn(previous, chunk)
+        except Exception:
+            text = extractive_summary(previous, chunk)
+        with self._lock:
+            self.text = text
+            self.covered = upto
+
+    def wait(self, timeout=None):
+        """Espera el resumen en curso (útil en scripts y benchmarks)"""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+
+class PromptBudgetBuilder:
+    """
+    Construye prompts contextuales que nunca superan `budget_tokens`.
+
+    Las partes fijas (prompt de sistema, instrucciones, mensaje del usuario)
+    tienen prioridad; el espacio restante se llena con los mensajes más
+    recientes y, si sobra, con el resumen acumulado de los anteriores.
+    """
+
+    def __init__(self, budget_tokens=DEFAULT_PROMPT_TOKEN_BUDGET, summarize_fn=extractive_summary,
+                 max_message_chars=400):
+        self.budget_tokens = budget_tokens
+        self.summarize_fn = summarize_fn
+        self.max_message_chars = max_message_chars
+
+    def build(self, template, system_prompt, user_message, messages, summary, context_header=""):
+        """
+        `template` recibe system_prompt, context y user_message.
+        `messages` es el historial; si el último es el mensaje actual del usuario se omite.
+        Si el template no incluye {system_prompt} (se envía aparte como prefijo `system`),
+        igual se descuenta del presupuesto. Con `summary=None` (clasificaciones) solo van
+        los mensajes recientes que caben: no se pide un resumen al modelo.
+        """
+        history = messages
+        if history and history[-1]['role'] == 'user' and history[-1]['content'] == user_message:
+            history = history[:-1]
+
+        # Encabezados y saltos de línea que agrega el armado del contexto
+        overhead = HEADER_OVERHEAD_TOKENS + estimate_tokens(template.format(system_prompt="", context="", user_message=""))
+        if estimate_tokens(system_prompt) + overhead > self.budget_tokens - MIN_USER_MESSAGE_TOKENS:
+            system_prompt = truncate_to_tokens(system_prompt, self.budget_tokens - MIN_USER_MESSAGE_TOKENS - overhead)
+        fixed_tokens = overhead + estimate_tokens(system_prompt)
+        # Si el mensaje del usuario por sí solo rompe el presupuesto, se recorta
+        user_message = truncate_to_tokens(user_message, self.budget_tokens - fixed_tokens)
+        remaining = self.budget_tokens - fixed_tokens - estimate_tokens(user_message)
+        context_header = truncate_to_tokens(context_header, remaining)
+        remaining -= estimate_tokens(context_header)
+
+        recent_lines = []
+        first_included = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            line = format_history_line(history[index])
+            if len(line) > self.max_message_chars:
+                line = line[:self.max_message_chars] + "..."
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                break
+            recent_lines.append(line)
+            remaining -= cost
+            first_included = index
+        recent_lines.reverse()
+
+        summary_used = False
+        summary_line = ""
+        if first_included > 0 and summary is not None:
+            # Lo que quedó fuera se resume en segundo plano para los próximos turnos
+            summary.request_update(history, first_included, self.summarize_fn)
+            if summary.text and remaining > 20:
+                summary_line = "Resumen de la conversación anterior: " + truncate_to_tokens(summary.text, remaining)
+                summary_used = True
+
+        context_parts = [part for part in [context_header, summary_line] if part]
+        if recent_lines:
+            context_parts.append("Mensajes recientes:\n" + "\n".join(recent_lines))
+        context = "\n".join(context_parts)
+
+        text = template.format(system_prompt=system_prompt, context=context, user_message=user_message)
+        estimated = estimate_tokens(text)
+        if '{system_prompt}' not in template:
+            estimated += estimate_tokens(system_prompt)
+        return BudgetedPrompt(text, estimated, len(recent_lines), summary_used)
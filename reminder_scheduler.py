@@ -0,0 +1,286 @@
+import heapq
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from admission_control import TokenBucket
+
+DEFAULT_REMINDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reminders.db")
+# Solo los recordatorios que vencen dentro de esta ventana viven en memoria; el resto espera en disco
+DEFAULT_WINDOW_SECONDS = 3600.0
+DEFAULT_BATCH_SIZE = 50
+# Mensajes por segundo hacia Twilio (con ráfaga corta) y envíos simultáneos
+DEFAULT_SEND_RATE_PER_SECOND = 10.0
+DEFAULT_SEND_BURST = 20
+DEFAULT_SENDER_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_BACKOFF_SECONDS = 30.0
+DEFAULT_MAX_BACKOFF_SECONDS = 1800.0
+# Si un proceso muere con recordatorios tomados, otro los retoma pasado este plazo
+CLAIM_LEASE_SECONDS = 300
+# Cada cuánto se buscan en disco los tomados cuyo lease venció (fuera de la recarga de la ventana)
+DEFAULT_RECOVERY_INTERVAL_SECONDS = 60.0
+
+STATUS_PENDING = 'pending'
+STATUS_IN_FLIGHT = 'in_flight'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+# La cita ya pasó (ej. el servicio estuvo caído): no se envía
+STATUS_EXPIRED = 'expired'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    reminder_key TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminders_due ON reminders (status, due_at);
+"""
+
+
+class ReminderScheduler:
+    """
+    Recordatorios persistentes (SQLite) con una rueda de dos niveles.
+
+    El nivel grueso es la tabla en disco, indexada por vencimiento: agendar es
+    un insert O(log n) y aguanta millones de recordatorios. El nivel fino es un
+    heap en memoria con solo los que vencen dentro de `window_seconds`; un
+    thread lo recarga desde disco al avanzar la ventana (y al reiniciar, así se
+    recuperan los pendientes y los que vencieron mientras el proceso estaba
+    abajo). Aparte, cada `recovery_interval_seconds` se recargan los tomados
+    por un proceso que murió (lease vencido), caigan o no en la ventana nueva.
+
+    Los vencidos se toman por lotes en una transacción (con lease, igual que
+    el outbox de citas) y se envían por `send(recipient, body)` respetando un
+    token bucket global. Un envío fallido se reintenta con backoff; uno cuya
+    cita ya pasó (`expires_at`) se descarta.
+    """
+
+    def __init__(self, path=DEFAULT_REMINDER_PATH, send=None, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 batch_size=DEFAULT_BATCH_SIZE, rate_per_second=DEFAULT_SEND_RATE_PER_SECOND,
+                 burst=DEFAULT_SEND_BURST, workers=DEFAULT_SENDER_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_backoff_seconds=DEFAULT_BASE_BACKOFF_SECONDS, max_backoff_seconds=DEFAULT_MAX_BACKOFF_SECONDS,
+                 recovery_interval_seconds=DEFAULT_RECOVERY_INTERVAL_SECONDS):
+        self.path = path
+        self.send = send
+        self.window_seconds = window_seconds
+        self.batch_size = batch_size
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.recovery_interval_seconds = recovery_interval_seconds
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reminder-send")
+        self._cond = threading.Condition()
+        self._heap = []
+        # Todo recordatorio pendiente con due_at < _horizon está (o estuvo) en el heap
+        self._horizon = float('-inf')
+        self._next_recovery = float('-inf')
+        self._thread = None
+        self._stats = {'scheduled': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'expired': 0, 'refills': 0,
+                       'recovered': 0}
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def schedule(self, key, recipient, due_at, body, expires_at=None):
+        """Agenda un recordatorio (epoch); True si es nuevo, False si la clave ya existía"""
+        return self.schedule_many([(key, recipient, due_at, body, expires_at)]) == 1
+
+    def schedule_many(self, reminders):
+        """Agenda en una sola transacción (key, recipient, due_at, body, expires_at); retorna cuántos eran nuevos"""
+        now = time.time()
+        added = []
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for key, recipient, due_at, body, expires_at in reminders:
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO reminders
+                           (reminder_key, recipient, body, status, due_at, expires_at, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (key, recipient, body, STATUS_PENDING, due_at, expires_at, now, now)
+                )
+                if cursor.rowcount:
+                    added.append((due_at, key))
+            conn.execute("COMMIT")
+        with self._cond:
+            self._stats['scheduled'] += len(added)
+            self._push(added)
+        return len(added)
+
+    def _push(self, entries):
+        """Lleva al heap los que caen dentro de la ventana (con el lock tomado)"""
+        head = self._heap[0][0] if self._heap else None
+        for due_at, key in entries:
+            if due_at < self._horizon:
+                heapq.heappush(self._heap, (due_at, key))
+        if self._heap and (head is None or self._heap[0][0] < head):
+            self._cond.notify_all()
+
+    def _recover_expired_claims(self, now):
+        """Lleva al heap los en curso con lease vencido, que ya quedaron detrás de la ventana (con el lock tomado)"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT due_at, reminder_key FROM reminders WHERE status = ? AND due_at <= ?", (STATUS_IN_FLIGHT, now)
+            ).fetchall()
+        self._next_recovery = now + self.recovery_interval_seconds
+        for row in rows:
+            heapq.heappush(self._heap, (row['due_at'], row['reminder_key']))
+        if rows:
+            self._stats['recovered'] += len(rows)
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        """Avanza la ventana y carga desde disco lo que vence dentro de ella"""
+        horizon = now + self.window_seconds
+        with self._cond:
+            if now >= self._next_recovery:
+                self._recover_expired_claims(now)
+            if now + self.window_seconds / 2 < self._horizon:
+                return
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    """SELECT due_at, reminder_key FROM reminders
+                       WHERE status IN (?, ?) AND due_at >= ? AND due_at < ?""",
+                    (STATUS_PENDING, STATUS_IN_FLIGHT, max(self._horizon, 0.0), horizon)
+                ).fetchall()
+            self._horizon = horizon
+            self._push([(row['due_at'], row['reminder_key']) for row in rows])
+            self._stats['refills'] += 1
+
+    def _pop_due(self, now):
+        with self._cond:
+            entries = []
+            while self._heap and self._heap[0][0] <= now and len(entries) < self.batch_size:
+                entries.append(heapq.heappop(self._heap))
+            return entries
+
+    def _claim(self, keys, now):
+        """Toma los que siguen pendientes (otro proceso pudo enviarlos) con un lease"""
+        placeholders = ",".join("?" * len(keys))
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"""SELECT * FROM reminders
+                    WHERE reminder_key IN ({placeholders}) AND status IN (?, ?) AND due_at <= ?""",
+                (*keys, STATUS_PENDING, STATUS_IN_FLIGHT, now)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE reminders SET status = ?, due_at = ?, updated_at = ? WHERE reminder_key = ?",
+                [(STATUS_IN_FLIGHT, now + CLAIM_LEASE_SECONDS, now, row['reminder_key']) for row in rows]
+            )
+            conn.execute("COMMIT")
+        return rows
+
+    def _acquire(self):
+        while not self._bucket.try_acquire():
+            time.sleep(1.0 / self.rate_per_second)
+
+    def _send_one(self, row):
+        try:
+            self.send(row['recipient'], row['body'])
+            return None
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def deliver_due(self, now=None):
+        """Envía un lote de recordatorios vencidos; retorna cuántos se tomaron"""
+        now = time.time() if now is None else now
+        entries = self._pop_due(now)
+        if not entries:
+            return 0
+        try:
+            rows = self._claim([key for _, key in entries], now)
+        except sqlite3.Error:
+            with self._cond:
+                self._push(entries)
+            raise
+        sending, updates, retries = [], [], []
+        for row in rows:
+            if row['expires_at'] is not None and row['expires_at'] <= now:
+                updates.append((STATUS_EXPIRED, row['attempts'], now, None, now, row['reminder_key']))
+                continue
+            self._acquire()
+            sending.append((row, self._pool.submit(self._send_one, row)))
+
+        counts = {'sent': 0, 'retried': 0, 'failed': 0, 'expired': len(updates)}
+        for row, future in sending:
+            error = future.result()
+            attempts = row['attempts'] + 1
+            finished = time.time()
+            if error is None:
+                status, due_at = STATUS_SENT, finished
+            elif attempts >= self.max_attempts:
+                status, due_at = STATUS_FAILED, finished
+            else:
+                status, due_at = STATUS_PENDING, finished + self._backoff(attempts)
+                retries.append((due_at, row['reminder_key']))
+            counts[{STATUS_SENT: 'sent', STATUS_FAILED: 'failed', STATUS_PENDING: 'retried'}[status]] += 1
+            updates.append((status, attempts, due_at, error, finished, row['reminder_key']))
+
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                """UPDATE reminders SET status = ?, attempts = ?, due_at = ?, last_error = ?, updated_at = ?
+                   WHERE reminder_key = ?""",
+                updates
+            )
+            conn.execute("COMMIT")
+        with self._cond:
+            for field, count in counts.items():
+                self._stats[field] += count
+            self._push(retries)
+        return len(entries)
+
+    def start(self):
+        """Recupera desde disco los pendientes de la ventana e inicia el thread de despacho (idempotente)"""
+        self._refill(time.time())
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            now = time.time()
+            try:
+                self._refill(now)
+                if self.deliver_due(now):
+                    continue
+            except sqlite3.Error:
+                pass
+            with self._cond:
+                wake_at = min(self._horizon - self.window_seconds / 2, self._next_recovery)
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = wake_at - time.time()
+                if timeout > 0:
+                    self._cond.wait(min(timeout, self.window_seconds))
+
+    def snapshot(self):
+        """Contadores, recordatorios en memoria y por estado"""
+        with closing(self._connect()) as conn:
+            by_status = dict(conn.execute("SELECT status, COUNT(*) FROM reminders GROUP BY status").fetchall())
+        with self._cond:
+            return dict(self._stats, in_memory=len(self._heap), by_status=by_status)
@@ -0,0 +1,113 @@
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# TTL de respaldo cuando el servidor no envía ETag/Last-Modified ni max-age
+DEFAULT_FALLBACK_TTL_SECONDS = 30
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'etag', 'last_modified', 'fresh_until'])
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class ConditionalResponseCache:
+    """
+    Caché de respuestas con semántica HTTP para GETs de la API GoMind.
+
+    Guarda el valor ya parseado junto a ETag/Last-Modified. Mientras la entrada
+    está fresca (Cache-Control max-age, o el TTL de respaldo si no hay
+    validadores) se responde sin red; después se envía un GET condicional y un
+    304 reutiliza el valor parseado. `no-store` no se cachea.
+    """
+
+    def __init__(self, fallback_ttl_seconds=DEFAULT_FALLBACK_TTL_SECONDS, max_entries=2048):
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, endpoint, field):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {'fresh': 0, 'revalidated': 0, 'miss': 0, 'no_store': 0})
+            stats[field] += 1
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def fetch(self, endpoint, key, send, parse):
+        """
+        `send(extra_headers)` hace el GET; `parse(response)` valida el status y
+        retorna el valor (o lanza, como las funciones de la API). `key` debe
+        identificar URL + usuario (token).
+        """
+        entry = self._get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.fresh_until:
+            self._count(endpoint, 'fresh')
+            return entry.value
+
+        conditional = {}
+        if entry is not None:
+            if entry.etag:
+                conditional['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                conditional['If-Modified-Since'] = entry.last_modified
+
+        response = send(conditional)
+        if response.status_code == 304 and entry is not None:
+            self._count(endpoint, 'revalidated')
+            self._store(key, entry._replace(fresh_until=self._fresh_until(response, entry.etag or entry.last_modified)))
+            return entry.value
+
+        value = parse(response)
+        cache_control = response.headers.get('Cache-Control', '')
+        if 'no-store' in cache_control:
+            self._count(endpoint, 'no_store')
+            self.invalidate(key)
+            return value
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        self._count(endpoint, 'miss')
+        self._store(key, CacheEntry(value, etag, last_modified, self._fresh_until(response, etag or last_modified)))
+        return value
+
+    def _fresh_until(self, response, has_validators):
+        cache_control = response.headers.get('Cache-Control', '')
+        if 'no-cache' in cache_control:
+            # Nunca se sirve sin preguntar al servidor, tenga o no validadores
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return time.monotonic() + int(match.group(1))
+        if has_validators:
+            # Con validadores se revalida en cada uso (un 304 es barato)
+            return 0
+        return time.monotonic() + self.fallback_ttl_seconds
+
+    def snapshot(self):
+        """Aciertos (frescos + 304) sobre el total por endpoint"""
+        with self._lock:
+            report = {}
+            for endpoint, stats in self._stats.items():
+                total = sum(stats.values())
+                hits = stats['fresh'] + stats['revalidated']
+                report[endpoint] = dict(stats, hit_rate=round(hits / total, 3) if total else 0.0)
+            return report
@@ -0,0 +1,77 @@
+import threading
+
+from turn_deadline import DEADLINE_STATS, DeadlineExceeded, remaining_seconds
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas concurrentes: la primera ejecuta la función y las
+    demás con la misma clave esperan y reciben su resultado.
+
+    Con `share_if`, los que esperan solo reutilizan el resultado si el
+    predicado lo acepta (ej. status 200); si no, hacen su propia llamada. Así un
+    401 del token de un usuario no se propaga a los demás.
+
+    Dentro de un turno con plazo, los que esperan lo hacen solo hasta que vence
+    y luego lanzan DeadlineExceeded, aunque el líder siga en curso.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, endpoint, field):
+        stats = self._stats.setdefault(endpoint, {'issued': 0, 'coalesced': 0})
+        stats[field] += 1
+
+    def do(self, endpoint, key, fn, share_if=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._count(endpoint, 'issued')
+            else:
+                self._count(endpoint, 'coalesced')
+
+        if not leader:
+            if not call.done.wait(timeout=remaining_seconds()):
+                DEADLINE_STATS.add('expired_calls')
+                raise DeadlineExceeded("Se agotó el tiempo del turno esperando una llamada en curso")
+            if call.error is None and (share_if is None or share_if(call.result)):
+                return call.result
+            # El resultado del líder no sirve para este llamador: llamada propia
+            with self._lock:
+                self._stats[endpoint]['coalesced'] -= 1
+                self._count(endpoint, 'issued')
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def snapshot(self):
+        """Llamadas emitidas vs. agrupadas por endpoint"""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+
+# Instancia compartida para los GET de la API GoMind
+API_SINGLEFLIGHT = SingleFlight()
@@ -0,0 +1,131 @@
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+
+# Horas de atención ofrecidas (una cita por hora): 9:00 a 18:00
+DEFAULT_SLOT_HOURS = tuple(range(9, 19))
+DEFAULT_HORIZON_DAYS = 60
+
+
+def parse_slot_datetime(date_time_iso):
+    """'2026-05-20T14:00:00.000Z' (hora local, como la arma convert_spanish_date_to_iso) → datetime"""
+    return datetime.strptime(date_time_iso[:16], '%Y-%m-%dT%H:%M')
+
+
+def format_slot_datetime(when):
+    """Inverso de parse_slot_datetime: el formato que espera la API de citas"""
+    return when.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class SlotAvailabilityIndex:
+    """
+    Disponibilidad por proveedor de salud: un bitmap por día (bit = hora
+    ocupada) en un `array` que cubre `horizon_days` desde hoy.
+
+    Consultar o reservar una hora es un acceso al array y una operación de
+    bits; listar las horas libres de un día recorre solo los bits de ese día.
+    Se carga en bloque (`load`) y se actualiza con cada reserva (`book`).
+    Fuera del horizonte todo se considera libre.
+    """
+
+    def __init__(self, slot_hours=DEFAULT_SLOT_HOURS, horizon_days=DEFAULT_HORIZON_DAYS, today=None):
+        self.slot_hours = tuple(slot_hours)
+        self.horizon_days = horizon_days
+        self._slot_of_hour = {hour: slot for slot, hour in enumerate(self.slot_hours)}
+        self._full_mask = (1 << len(self.slot_hours)) - 1
+        self._typecode = 'H' if len(self.slot_hours) <= 16 else 'Q'
+        self._base = today or date.today()
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def _rebase(self, today):
+        """Avanza la ventana al cambiar el día: descarta los días pasados"""
+        shift = (today - self._base).days
+        if shift <= 0:
+            return
+        for provider_id, days in self._providers.items():
+            kept = days[shift:] if shift < self.horizon_days else array(self._typecode)
+            kept.extend([0] * (self.horizon_days - len(kept)))
+            self._providers[provider_id] = kept
+        self._base = today
+
+    def _locate(self, day, hour):
+        index = (day - self._base).days
+        slot = self._slot_of_hour.get(hour)
+        if slot is None or not 0 <= index < self.horizon_days:
+            return None, None
+        return index, slot
+
+    def _days(self, provider_id):
+        days = self._providers.get(provider_id)
+        if days is None:
+            days = self._providers[provider_id] = array(self._typecode, [0]) * self.horizon_days
+        return days
+
+    def load(self, bookings, today=None):
+        """Carga en bloque citas existentes: iterable de (provider_id, datetime)"""
+        with self._lock:
+            self._rebase(today or date.today())
+            for provider_id, when in bookings:
+                index, slot = self._locate(when.date(), when.hour)
+                if index is not None:
+                    self._days(provider_id)[index] |= 1 << slot
+
+    def book(self, provider_id, when):
+        """Marca la hora como ocupada; False si ya lo estaba (otra reserva ganó)"""
+        with self._lock:
+            index, slot = self._locate(when.date(), when.hour)
+            if index is None:
+                return True
+            days = self._days(provider_id)
+            if days[index] >> slot & 1:
+                return False
+            days[index] |= 1 << slot
+            return True
+
+    def release(self, provider_id, when):
+        """Libera una hora (la reserva falló en la API)"""
+        with self._lock:
+            index, slot = self._locate(when.date(), when.hour)
+            days = self._providers.get(provider_id)
+            if index is not None and days is not None:
+                days[index] &= ~(1 << slot)
+
+    def is_free(self, provider_id, day, hour):
+        index, slot = self._locate(day, hour)
+        days = self._providers.get(provider_id)
+        if index is None or days is None:
+            return hour in self._slot_of_hour
+        return not days[index] >> slot & 1
+
+    def free_hours(self, provider_id, day):
+        """Horas libres del día, en orden"""
+        index, _ = self._locate(day, self.slot_hours[0])
+        days = self._providers.get(provider_id)
+        mask = days[index] if index is not None and days is not None else 0
+        return [hour for slot, hour in enumerate(self.slot_hours) if not mask >> slot & 1]
+
+    def next_available_days(self, provider_id, n, is_open_day=None, after=None):
+        """Próximos `n` días (desde mañana) con al menos una hora libre; `is_open_day` filtra feriados/fines de semana"""
+        with self._lock:
+            self._rebase(date.today())
+        days = self._providers.get(provider_id)
+        current = after or date.today()
+        found = []
+        for _ in range(self.horizon_days * 2):
+            if len(found) == n:
+                break
+            current += timedelta(days=1)
+            if is_open_day is not None and not is_open_day(current):
+                continue
+            index = (current - self._base).days
+            if days is None or index >= self.horizon_days or days[index] != self._full_mask:
+                found.append(current)
+        return found
+
+    def snapshot(self):
+        with self._lock:
+            booked = sum(bin(mask).count('1') for days in self._providers.values() for mask in days)
+            bitmap_bytes = sum(days.itemsize * len(days) for days in self._providers.values())
+            return {'providers': len(self._providers), 'horizon_days': self.horizon_days,
+                    'booked_slots': booked, 'bitmap_bytes': bitmap_bytes}
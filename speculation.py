@@ -0,0 +1,64 @@
+import contextvars
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+
+from turn_deadline import DEADLINE_STATS, DeadlineExceeded
+
+
+class SpeculationStats:
+    """Contadores de especulaciones iniciadas, usadas y descartadas"""
+
+    def __init__(self):
+        self.started = 0
+        self.confirmed = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+
+    def add(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {'started': self.started, 'confirmed': self.confirmed, 'discarded': self.discarded}
+
+
+SPECULATION_STATS = SpeculationStats()
+
+
+class SpeculativeCall:
+    """
+    Ejecuta `fn(*args)` en segundo plano mientras el turno decide si lo necesita.
+
+    `confirm()` espera y retorna el resultado (o relanza su excepción) y lanza
+    DeadlineExceeded si vence `timeout`; `discard()` ignora el resultado. Cada
+    especulación corre en un thread propio, así que arranca de inmediato aunque
+    haya muchos turnos a la vez (no hay pool compartido donde hacer cola). La
+    función no debe tocar estado de sesión: recibe todo por argumentos.
+    """
+
+    def __init__(self, fn, *args, stats=SPECULATION_STATS):
+        self.stats = stats
+        self._future = Future()
+        self._future.set_running_or_notify_cancel()
+        # Copia el contexto: la llamada respeta el plazo del turno que la inició
+        context = contextvars.copy_context()
+        threading.Thread(target=self._run, args=(context, fn, args), name="bianca-speculative", daemon=True).start()
+        stats.add('started')
+
+    def _run(self, context, fn, args):
+        try:
+            self._future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            self._future.set_exception(e)
+
+    def confirm(self, timeout=None):
+        self.stats.add('confirmed')
+        try:
+            return self._future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            DEADLINE_STATS.add('expired_calls')
+            raise DeadlineExceeded("Se agotó el tiempo del turno esperando una llamada especulativa") from None
+
+    def discard(self):
+        self.stats.add('discarded')
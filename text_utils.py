@@ -0,0 +1,11 @@
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fold_text(text):
+    """Normaliza texto para comparaciones: minúsculas, sin tildes y espacios colapsados"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _WHITESPACE_RE.sub(" ", without_accents.casefold()).strip()
@@ -0,0 +1,78 @@
+"""
+Job batch: precalcula la biblioteca de pasos a seguir por perfil fuera de rango.
+
+Genera con Bedrock los pasos del perfil saludable y de todas las combinaciones
+de hasta --max-params parámetros de RANGES (alto/bajo). Los perfiles que ya
+están en la biblioteca se omiten, así que el job se puede reanudar. Revisar el
+JSON resultante antes de desplegarlo.
+
+Uso: python tools/build_action_steps_library.py [--max-params 2] [--workers 4] [--output ruta]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+from action_steps_library import (DEFAULT_LIBRARY_PATH, HEALTHY_STEPS_INSTRUCTIONS,  # noqa: E402
+                                  UNHEALTHY_STEPS_INSTRUCTIONS, ActionStepsLibrary,
+                                  describe_profile, enumerate_profiles)
+from bedrock_gateway import BedrockGateway  # noqa: E402
+from conversation_engine import SHARED_INSTRUCTIONS  # noqa: E402
+from medical_ranges import RANGES  # noqa: E402
+from model_router import TASK_SHORT_GENERATION, ModelRouter, build_routes  # noqa: E402
+
+
+def generate_steps(gateway, profile):
+    if not profile:
+        return gateway.invoke_text(HEALTHY_STEPS_INSTRUCTIONS, "Resultados de laboratorio SALUDABLES.", 150,
+                                   task=TASK_SHORT_GENERATION).strip()
+    prompt = f"Problemas detectados en sus exámenes:\n{describe_profile(profile, RANGES)}"
+    return gateway.invoke_text(UNHEALTHY_STEPS_INSTRUCTIONS, prompt, 150, task=TASK_SHORT_GENERATION).strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-params", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", default=DEFAULT_LIBRARY_PATH)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = boto3.client(
+        service_name='bedrock-runtime',
+        region_name=os.getenv("AWS_REGION"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+    )
+    routes = build_routes(lambda key, default: os.getenv(f"BEDROCK_{key}", default))
+    # Mismo prefijo compartido que el bot: las instrucciones de pasos solas no alcanzan el mínimo de caché
+    gateway = BedrockGateway(client, routes[TASK_SHORT_GENERATION].models[0], router=ModelRouter(routes),
+                             shared_instructions=SHARED_INSTRUCTIONS)
+
+    library = ActionStepsLibrary(RANGES, path=args.output)
+    pending = [p for p in enumerate_profiles(RANGES, args.max_params) if library.lookup(p) is None]
+    print(f"Biblioteca: {len(library)} perfiles; por generar: {len(pending)}")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(generate_steps, gateway, profile): profile for profile in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            profile = futures[future]
+            try:
+                library.add(profile, future.result(), source='batch')
+            except Exception as e:
+                failed += 1
+                print(f"Error en perfil {profile}: {e}")
+            if done % 50 == 0:
+                print(f"{done}/{len(pending)} perfiles procesados")
+
+    print(f"Listo: {len(library)} perfiles en {args.output} ({failed} con error)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Carga masiva de exámenes (PDF) enviados por laboratorios asociados.
+
+Sube todos los PDF de la carpeta (recursivo) a /api/examinations en tubería:
+subidas en paralelo, un solo loop que consulta todos los jobs pendientes con
+intervalos adaptativos, y descarga de análisis en paralelo. Cada análisis
+queda en --output como <ruta del PDF>.json.
+
+El manifest (JSONL) registra el estado de cada archivo: re-ejecutar el
+comando salta lo completado y retoma los jobs ya subidos sin volver a
+subirlos. Los PDF que obviamente no son exámenes (firma, tamaño, páginas o
+sin marcadores de laboratorio) se descartan sin subirlos, salvo --no-precheck.
+Al final escribe un reporte JSON con el throughput (archivos/min).
+
+Uso: python tools/ingest_exams.py carpeta/ [--output analisis/] [--manifest ruta.jsonl]
+         [--upload-workers 4] [--api-workers 8] [--max-outstanding 64] [--report reporte.json] [--no-precheck]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from exam_ingestion import (DEFAULT_API_WORKERS, DEFAULT_MAX_OUTSTANDING_JOBS,  # noqa: E402
+                            DEFAULT_UPLOAD_WORKERS, BulkExamIngestor, ExaminationsClient, IngestionManifest)
+from medical_ranges import PARAMETER_ALIASES, RANGES  # noqa: E402
+from pdf_precheck import PdfPrecheck  # noqa: E402
+
+
+def find_pdfs(folder):
+    """[(ruta relativa, ruta)] de los PDF de la carpeta, en orden estable"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith('.pdf'):
+                path = os.path.join(root, name)
+                files.append((os.path.relpath(path, folder), path))
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--output", help="carpeta de análisis (por defecto <carpeta>_analisis)")
+    parser.add_argument("--manifest", help="por defecto <output>/manifest.jsonl")
+    parser.add_argument("--upload-workers", type=int, default=DEFAULT_UPLOAD_WORKERS)
+    parser.add_argument("--api-workers", type=int, default=DEFAULT_API_WORKERS)
+    parser.add_argument("--max-outstanding", type=int, default=DEFAULT_MAX_OUTSTANDING_JOBS)
+    parser.add_argument("--report", help="por defecto <output>/report.json")
+    parser.add_argument("--no-precheck", action="store_true", help="sube todos los PDF sin el chequeo local")
+    args = parser.parse_args()
+
+    load_dotenv()
+    token = os.getenv("EXAM_INGESTION_TOKEN")
+    if not token:
+        parser.error("EXAM_INGESTION_TOKEN no está definido")
+
+    output = args.output or os.path.normpath(args.folder) + "_analisis"
+    os.makedirs(output, exist_ok=True)
+    files = find_pdfs(args.folder)
+    manifest = IngestionManifest(args.manifest or os.path.join(output, "manifest.jsonl"))
+    client = ExaminationsClient(os.getenv("API_BASE_URL"), token, pool_size=args.upload_workers + args.api_workers)
+    ingestor = BulkExamIngestor(client, manifest, output, upload_workers=args.upload_workers,
+                                api_workers=args.api_workers, max_outstanding=args.max_outstanding,
+                                precheck=None if args.no_precheck else PdfPrecheck(RANGES.keys(), PARAMETER_ALIASES.keys()))
+    print(f"{len(files)} PDF en {args.folder}")
+    try:
+        report = ingestor.run(files)
+    finally:
+        manifest.close()
+
+    report_path = args.report or os.path.join(output, "report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Listo: {report['completed']} completados, {report['failed']} con error "
+          f"({report['rejected']} descartados localmente), {report['skipped']} ya estaban; "
+          f"{report['files_per_minute']} archivos/min en {report['elapsed_seconds']} s")
+    print(f"Reporte: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
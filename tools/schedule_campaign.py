@@ -0,0 +1,128 @@
+"""
+Agenda en bloque las citas de una campaña preventiva de empresa.
+
+Lee los empleados y sus preferencias (CSV o JSONL, ver
+bulk_scheduling.load_employees), reparte las horas entre las clínicas de la
+empresa en los próximos --days días hábiles respetando --slot-capacity citas
+por clínica y hora (descontando las citas ya registradas en el outbox del
+bot), crea las citas con --workers POSTs simultáneos y escribe un reporte CSV.
+
+Cada cita creada se registra en el outbox como enviada, así el bot no ofrece
+esa hora y re-ejecutar la campaña (aunque sea otro día, con otro --start) se
+salta a los empleados que ya tienen una cita futura del producto. La API no
+documenta deduplicar por Idempotency-Key: una cita cuyo POST quedó sin
+respuesta (error sin status_code en el reporte) conviene revisarla antes de
+re-ejecutar.
+
+Uso: python tools/schedule_campaign.py empleados.csv --company-id 12 [--start 2026-11-02] [--days 20]
+         [--slot-capacity 4] [--workers 16] [--report reporte.csv] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+from appointment_outbox import DEFAULT_OUTBOX_PATH, AppointmentOutbox  # noqa: E402
+from bulk_scheduling import (DEFAULT_CAMPAIGN_WORKERS, DEFAULT_PRODUCT_ID, DEFAULT_SLOT_CAPACITY,  # noqa: E402
+                             RESULT_SENT, CampaignSlotAssigner, already_booked, already_booked_results,
+                             assigned_results, load_employees, submit_appointments, unassigned_results,
+                             write_report)
+from business_calendar import BusinessCalendar  # noqa: E402
+from slot_index import parse_slot_datetime  # noqa: E402
+
+API_TIMEOUT = 30
+
+
+def fetch_health_providers(api_base_url, company_id, token):
+    response = requests.get(f"{api_base_url}/api/companies/{company_id}/health-providers",
+                            headers={"Authorization": f"Bearer {token}"}, timeout=API_TIMEOUT)
+    if response.status_code != 200:
+        raise Exception(f"Error obteniendo proveedores de salud: {response.status_code} - {response.text}")
+    return response.json().get('healthProviders', [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("employees")
+    parser.add_argument("--company-id", required=True)
+    parser.add_argument("--providers", help="JSON con las clínicas (por defecto, las de la empresa en la API)")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today() + timedelta(days=1))
+    parser.add_argument("--days", type=int, default=20)
+    parser.add_argument("--slot-capacity", type=int, default=DEFAULT_SLOT_CAPACITY)
+    parser.add_argument("--workers", type=int, default=DEFAULT_CAMPAIGN_WORKERS)
+    parser.add_argument("--product-id", type=int, default=DEFAULT_PRODUCT_ID)
+    parser.add_argument("--report", default=f"campaign_report_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    parser.add_argument("--dry-run", action="store_true", help="solo asigna y escribe el reporte, sin crear citas")
+    args = parser.parse_args()
+    if args.days < 1:
+        parser.error("--days debe ser al menos 1")
+
+    load_dotenv()
+    api_base_url = os.getenv("API_BASE_URL")
+    token = os.getenv("CAMPAIGN_API_TOKEN")
+    if not args.dry_run and not token:
+        parser.error("CAMPAIGN_API_TOKEN no está definido")
+
+    employees = load_employees(args.employees)
+    if args.providers:
+        with open(args.providers, encoding='utf-8') as f:
+            providers = json.load(f)
+    else:
+        providers = fetch_health_providers(api_base_url, args.company_id, token)
+    regions = [region.strip() for region in os.getenv("CALENDAR_REGIONS", "").split(",") if region.strip()]
+    days = BusinessCalendar(regions=regions).next_business_days(args.days, after=args.start - timedelta(days=1))
+    outbox = AppointmentOutbox(os.getenv("APPOINTMENT_OUTBOX_PATH", DEFAULT_OUTBOX_PATH))
+    booked = [(pid, parse_slot_datetime(date_time)) for pid, date_time in outbox.booked_slots()]
+    # Re-ejecución: quienes ya tienen una cita futura del producto no se vuelven a agendar
+    employees, skipped = already_booked(
+        employees, outbox.upcoming_user_ids(args.product_id, date.today().isoformat())
+    )
+    if skipped:
+        print(f"{len(skipped)} empleados ya tienen cita registrada y se omiten")
+
+    start = time.perf_counter()
+    assigner = CampaignSlotAssigner(providers, days, capacity=args.slot_capacity, booked=booked)
+    assignments, unassigned = assigner.assign_all(employees)
+    print(f"{len(employees)} empleados, {len(providers)} clínicas, {len(days)} días hábiles "
+          f"({days[0]} a {days[-1]}): {len(assignments)} asignados, {len(unassigned)} sin hora "
+          f"en {time.perf_counter() - start:.2f} s")
+
+    if args.dry_run:
+        results = assigned_results(assignments)
+    else:
+        def send(payload, idempotency_key):
+            return requests.post(f"{api_base_url}/api/appointments", json=payload, timeout=API_TIMEOUT,
+                                 headers={"Authorization": f"Bearer {token}", "Idempotency-Key": idempotency_key})
+
+        done = []
+
+        def progress(result):
+            done.append(result)
+            if len(done) % 500 == 0:
+                print(f"{len(done)}/{len(assignments)} citas procesadas")
+
+        start = time.perf_counter()
+
+        def record_sent(payload, status_code, idempotency_key):
+            outbox.record_sent(payload, context={'campaign_company_id': args.company_id},
+                               status_code=status_code, idempotency_key=idempotency_key)
+
+        results = submit_appointments(assignments, send, workers=args.workers, product_id=args.product_id,
+                                      on_result=progress, record_sent=record_sent)
+        sent = sum(1 for result in results if result.status == RESULT_SENT)
+        print(f"{sent}/{len(assignments)} citas creadas en {time.perf_counter() - start:.0f} s "
+              f"({len(assignments) - sent} con error)")
+
+    write_report(args.report, results + unassigned_results(unassigned) + already_booked_results(skipped))
+    print(f"Reporte: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
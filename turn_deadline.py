@@ -0,0 +1,143 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+
+# Presupuesto total de un turno: el webhook de Twilio corta a los 15 s
+DEFAULT_TURN_BUDGET_SECONDS = 12.0
+
+_ABANDON_LOCK = threading.Lock()
+_CURRENT_DEADLINE = contextvars.ContextVar('turn_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Se agotó el presupuesto del turno: el llamador debe usar su respuesta de respaldo"""
+
+
+class DeadlineStats:
+    """
+    Turnos con plazo, llamadas cortadas por el plazo, turnos que terminaron en
+    respaldo y llamadas abandonadas que aún siguen corriendo
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.expired_calls = 0
+        self.degraded_turns = 0
+        self.abandoned_running = 0
+        self._lock = threading.Lock()
+
+    def add(self, field, delta=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {'turns': self.turns, 'expired_calls': self.expired_calls, 'degraded_turns': self.degraded_turns,
+                    'abandoned_running': self.abandoned_running}
+
+
+DEADLINE_STATS = DeadlineStats()
+
+
+class TurnDeadline:
+    def __init__(self, budget_seconds):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+
+@contextmanager
+def turn_deadline(budget_seconds=DEFAULT_TURN_BUDGET_SECONDS, stats=DEADLINE_STATS):
+    """
+    Plazo del turno actual. Las llamadas hechas dentro del bloque (y en los
+    threads que copian el contexto, ej. SpeculativeCall) lo consultan con
+    `call_timeout()` / `run_within_deadline()`.
+    """
+    deadline = TurnDeadline(budget_seconds)
+    token = _CURRENT_DEADLINE.set(deadline)
+    stats.add('turns')
+    try:
+        yield deadline
+    finally:
+        _CURRENT_DEADLINE.reset(token)
+
+
+@contextmanager
+def narrowed_deadline(budget_seconds):
+    """
+    Plazo de `budget_seconds` para un bloque, sin pasarse del turno en curso si lo hay.
+    No cuenta como turno: es para trabajo en segundo plano que copia el contexto.
+    """
+    remaining = remaining_seconds()
+    deadline = TurnDeadline(budget_seconds if remaining is None else min(budget_seconds, remaining))
+    token = _CURRENT_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT_DEADLINE.reset(token)
+
+
+def remaining_seconds():
+    """Segundos que le quedan al turno, o None si no hay plazo activo"""
+    deadline = _CURRENT_DEADLINE.get()
+    return None if deadline is None else max(deadline.remaining(), 0.0)
+
+
+def call_timeout(default, stats=DEADLINE_STATS):
+    """
+    Timeout para una llamada: el menor entre `default` y lo que queda del turno.
+    Lanza DeadlineExceeded si el turno ya no tiene presupuesto.
+    """
+    remaining = remaining_seconds()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        stats.add('expired_calls')
+        raise DeadlineExceeded("Se agotó el tiempo del turno")
+    return min(default, remaining)
+
+
+def run_within_deadline(fn, *args, stats=DEADLINE_STATS):
+    """
+    Ejecuta `fn(*args)` esperando como máximo lo que queda del turno (sin plazo,
+    la llama directo).
+
+    Es para clientes que no aceptan timeout por llamada (boto3): la llamada corre
+    en un thread propio, así que arranca de inmediato y el plazo mide solo la
+    llamada, sin cola. Si el plazo vence el turno sigue con su respaldo y la
+    llamada abandonada termina sola al cortar el read_timeout del cliente.
+    """
+    remaining = remaining_seconds()
+    if remaining is None:
+        return fn(*args)
+    timeout = call_timeout(remaining, stats=stats)
+    future = Future()
+    future.set_running_or_notify_cancel()
+    state = {'finished': False, 'abandoned': False}
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _ABANDON_LOCK:
+                state['finished'] = True
+                if state['abandoned']:
+                    stats.add('abandoned_running', -1)
+
+    threading.Thread(target=run, name="bianca-deadline", daemon=True).start()
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        with _ABANDON_LOCK:
+            # Si terminó justo ahora no queda nada corriendo
+            if not state['finished']:
+                state['abandoned'] = True
+                stats.add('abandoned_running')
+        stats.add('expired_calls')
+        raise DeadlineExceeded("Se agotó el tiempo del turno") from None